@@ -0,0 +1,79 @@
+# Время сериализации ответа /getLessons для курса из 500 уроков: от данных слоя методов до готового тела ответа.
+# До: без response_model - обход jsonable_encoder и JSONResponse (stdlib json).
+# После: response_model маршрута (проверка и сериализация в pydantic-core) и ORJSONResponse.
+#   python -m bench.serialization_bench [-n 200] [--lessons 500]
+import argparse
+import asyncio
+import json
+import time
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse
+from fastapi.routing import serialize_response
+from src.api.v1 import responses
+from src.api.v1.entry.run import app
+from src.database.dto import LessonDTO
+from src.database.pagination import page
+
+
+def summary_rows(number: int) -> list:
+    # Как в get_lessons_in_course: словари только с полями краткой выдачи
+    return [{"id": index, "course_id": 1, "lesson_title": f"Урок {index}", "lesson_type": "Лекция",
+             "desc": "Описание урока для проверки сериализации", "question_lesson": None, "attempts": None,
+             "lesson_num_success_peoples": index * 3, "level": index % 3 + 1, "pos": index * 1024}
+            for index in range(1, number + 1)]
+
+
+def dto_rows(number: int) -> list:
+    # Полные снимки уроков вместе с материалом
+    return [LessonDTO(**row, material="Материал урока. " * 64, answer_lesson=None) for row in summary_rows(number)]
+
+
+def route(path: str):
+    return next(item for item in app.routes if getattr(item, "path", None) == path)
+
+
+def before(content) -> bytes:
+    return JSONResponse(content=jsonable_encoder(content)).body
+
+
+async def after(content, field, exclude_unset: bool) -> bytes:
+    return ORJSONResponse(content=await serialize_response(field=field, response_content=content,
+                                                           exclude_unset=exclude_unset)).body
+
+
+async def per_call(render, number: int) -> float:
+    await render()
+    started = time.perf_counter()
+    for _ in range(number):
+        await render()
+    return (time.perf_counter() - started) / number * 1e3
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", type=int, default=200)
+    parser.add_argument("--lessons", type=int, default=500)
+    args = parser.parse_args()
+    lessons = route("/api/v1/lesson/getLessons")
+    payloads = {
+        "краткие поля": responses.success_response(data=page(summary_rows(args.lessons), None)),
+        "полные DTO": responses.success_response(data=page(dto_rows(args.lessons), None)),
+    }
+    print(f"Сериализация {args.lessons} уроков")
+    print(f"{'данные':<16}{'до, мс':>10}{'после, мс':>12}{'ускорение':>12}{'тело, КБ':>10}")
+    for name, content in payloads.items():
+        async def old():
+            return before(content)
+
+        async def new():
+            return await after(content, lessons.secure_cloned_response_field, lessons.response_model_exclude_unset)
+
+        # Оба пути отдают одинаковые данные
+        body = await new()
+        assert json.loads(body) == json.loads(await old())
+        old_ms, new_ms = await per_call(old, args.n), await per_call(new, args.n)
+        print(f"{name:<16}{old_ms:>10.2f}{new_ms:>12.2f}{old_ms / new_ms:>11.1f}x{len(body) / 1024:>10.0f}")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
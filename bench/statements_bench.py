@@ -0,0 +1,83 @@
+# Накладные расходы Python на один вызов горячего запроса: построение выражения и ключа кэша компиляции
+# (именно это выполняется при каждом session.execute до обращения к базе).
+# С флагом --db дополнительно выполняет запросы на одном соединении с базой из .env.
+#   python -m bench.statements_bench [--db] [-n 20000]
+import argparse
+import asyncio
+import time
+from sqlalchemy import select, exists
+from sqlalchemy.orm import load_only
+from src.database.model import engine, Users, Course, Lesson, UserProgress, RefreshTokens
+from src.database import statements
+from src.api.v1.enums import TokenStatus, MaterialTypes
+
+# Те же запросы в прежнем виде: выражение строится заново при каждом вызове
+BEFORE = {
+    "user_credentials": lambda: select(Users.id, Users.password, Users.role).where(Users.username == "user"),
+    "user_by_id": lambda: select(Users).where(Users.id == 1),
+    "user_id_by_name": lambda: select(Users.id).where(Users.username == "user"),
+    "course_author": lambda: select(Course.author).where(Course.id == 1).where(Course.deleted_at.is_(None)),
+    "lesson_by_id": lambda: select(Lesson).where(Lesson.id == 1).options(
+        load_only(Lesson.id, Lesson.attempts, raiseload=True)),
+    "progress_status": lambda: select(UserProgress.status).where(UserProgress.user_id == 1).where(
+        UserProgress.material_id == 1),
+    "progress": lambda: select(UserProgress).where(UserProgress.user_id == 1).where(
+        UserProgress.material_id == 1).where(UserProgress.material_type == MaterialTypes.LECTURE),
+    "family_revoked": lambda: select(exists().where(RefreshTokens.family_id == "family").where(
+        RefreshTokens.status == TokenStatus.REVOKED)),
+}
+
+AFTER = {
+    "user_credentials": lambda: statements.user_credentials("user"),
+    "user_by_id": lambda: statements.user_by_id(1),
+    "user_id_by_name": lambda: statements.user_id_by_name("user"),
+    "course_author": lambda: statements.course_author(1),
+    "lesson_by_id": lambda: statements.lesson_by_id(1, ("id", "attempts")),
+    "progress_status": lambda: statements.progress_status(1, 1),
+    "progress": lambda: statements.progress(1, 1, MaterialTypes.LECTURE),
+    "family_revoked": lambda: statements.family_revoked("family"),
+}
+
+
+def per_call(build, number: int) -> float:
+    build()._generate_cache_key()
+    started = time.perf_counter()
+    for _ in range(number):
+        build()._generate_cache_key()
+    return (time.perf_counter() - started) / number * 1e6
+
+
+async def per_execute(build, number: int) -> float:
+    async with engine.connect() as conn:
+        await conn.execute(build())
+        started = time.perf_counter()
+        for _ in range(number):
+            await conn.execute(build())
+        return (time.perf_counter() - started) / number * 1e6
+
+
+def report(title: str, before: dict, after: dict):
+    print(title)
+    print(f"{'запрос':<20}{'до, мкс':>12}{'после, мкс':>12}{'ускорение':>12}")
+    for name in before:
+        print(f"{name:<20}{before[name]:>12.1f}{after[name]:>12.1f}{before[name] / after[name]:>11.1f}x")
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", type=int, default=20000)
+    parser.add_argument("--db", action="store_true")
+    args = parser.parse_args()
+    report("Построение запроса и ключа кэша",
+           {name: per_call(build, args.n) for name, build in BEFORE.items()},
+           {name: per_call(build, args.n) for name, build in AFTER.items()})
+    if args.db:
+        number = max(args.n // 10, 1)
+        before = {name: await per_execute(build, number) for name, build in BEFORE.items()}
+        after = {name: await per_execute(build, number) for name, build in AFTER.items()}
+        report("\nВыполнение на одном соединении", before, after)
+    await engine.dispose()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -1,11 +1,46 @@
 from fastapi import FastAPI, Request, status
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
 from src.api.v1.routes import get_routers
-from src.database import model as dbs
+from src.database.migrations import migrate
+from src.database.model import db_config, replica_router
 from fastapi.exceptions import RequestValidationError
+from contextlib import asynccontextmanager
+from src.api.v1.methods.hasher import hasher
+from src.api.v1.methods.revocation import revocation_filter
+from src.database.counters import counters
+from src.database.purge import purger
+from src.database.statements import check_cache_size
+from src.badges.catalog import badge_catalog
 import asyncio
 
-app = FastAPI(title="Бэкенд для образовательной платформы с AI-репетитором")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if db_config.MIGRATE_ON_STARTUP:
+        await migrate()
+    check_cache_size(db_config.STATEMENT_CACHE_SIZE)
+    # Фильтр отозванных токенов заполняется до приема первых запросов
+    await revocation_filter.rebuild()
+    # Справочник достижений нужен правилам выдачи и выдаче достижений пользователя
+    await badge_catalog.reload()
+    background_tasks = [asyncio.create_task(revocation_filter.run()), asyncio.create_task(counters.run()),
+                        asyncio.create_task(purger.run()), asyncio.create_task(badge_catalog.run())]
+    if replica_router.enabled:
+        # Недоступные при старте реплики сразу исключаются из чтения
+        await replica_router.check()
+        background_tasks.append(asyncio.create_task(replica_router.run()))
+    yield
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    # Накопленные приращения счетчиков не должны потеряться при остановке
+    await counters.flush()
+    hasher.shutdown()
+
+
+# Ответы маршрутов проверяются и сериализуются по response_model, готовые данные кодируются в JSON через orjson
+app = FastAPI(title="Бэкенд для образовательной платформы с AI-репетитором", lifespan=lifespan,
+              default_response_class=ORJSONResponse)
 
 
 @app.exception_handler(RequestValidationError)
@@ -27,7 +62,7 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
             "input": error.get("input", None)
         })
 
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=status.HTTP_400_BAD_REQUEST,
         content={
             "success": False,
@@ -41,19 +76,9 @@ def add_routers(routs: list):
     return [app.include_router(router) for router in routs]
 
 
-async def create_tables():
-    await dbs.Users.create_table()
-    await dbs.Course.create_table()
-    await dbs.Lesson.create_table()
-    await dbs.UserProgress.create_table()
-    await dbs.AiTasks.create_table()
-    await dbs.Badges.create_table()
-    await dbs.UserBadges.create_table()
-
-
 # Инициализация роутеров
 routers = get_routers()
 add_routers(routers)
 
 if __name__ == '__main__':
-    asyncio.run(create_tables())
+    asyncio.run(migrate())
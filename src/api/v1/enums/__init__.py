@@ -19,3 +19,9 @@ class MaterialTypes(StrEnum):
 class ProgressTypes(StrEnum):
     PROGRESS = "В процессе"
     COMPLETED = "Завершен"
+
+
+class TokenStatus(StrEnum):
+    ACTIVE = "active"
+    ROTATED = "rotated"
+    REVOKED = "revoked"
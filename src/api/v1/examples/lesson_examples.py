@@ -15,3 +15,8 @@ UPDATE_LESSON = {
         "lesson_title": "Мой измененный урок"
     }
 }
+REORDER_LESSONS = {
+    "course_id": 1,
+    "lesson_ids": [5, 3],
+    "after_id": 1
+}
@@ -0,0 +1,56 @@
+import hashlib
+import os
+from typing import Optional
+from dotenv import load_dotenv
+from fastapi import Request, Response
+from src.database.entity_cache import entity_cache
+from .__init__ import env_path
+
+load_dotenv(dotenv_path=env_path)
+
+# Политика по умолчанию: ответ можно хранить только на клиенте и перед использованием нужно перепроверить
+CACHE_CONTROL_DEFAULT = os.getenv("CACHE_CONTROL_DEFAULT", "private, no-cache")
+
+
+def make_etag(request: Request, versions: list) -> str:
+    # Сильный ETag: тот же путь, параметры и версии данных дают тот же ответ
+    query = sorted(request.query_params.multi_items())
+    digest = hashlib.sha1(repr((entity_cache.store.epoch, request.url.path, query, versions)).encode()).hexdigest()
+    return f'"{digest}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    # Для If-None-Match используется слабое сравнение: W/"x" совпадает с "x". "*" (любое текущее представление)
+    # не учитывается: проверка идет до чтения данных, когда еще неизвестно, существует ли ресурс
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return etag in tags
+
+
+class CachePolicy:
+    # Условные GET для маршрута: ETag считается по версиям данных до обращения к БД. Cache-Control маршрута
+    # задается переменной окружения CACHE_CONTROL_<NAME>, иначе берется CACHE_CONTROL_DEFAULT
+    def __init__(self, name: str):
+        self.cache_control = os.getenv(f"CACHE_CONTROL_{name.upper()}", CACHE_CONTROL_DEFAULT)
+        self.not_modified = 0
+
+    async def check(self, request: Request, response: Response, *entities: str) -> Optional[Response]:
+        # Версии читаются раньше данных: изменение во время чтения даст новый ETag при следующем запросе
+        etag = make_etag(request, await entity_cache.store.get_many(list(entities)))
+        headers = {"ETag": etag, "Cache-Control": self.cache_control}
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            self.not_modified += 1
+            return Response(status_code=304, headers=headers)
+        response.headers.update(headers)
+        return None
+
+
+lessons_policy = CachePolicy("lessons")
+courses_policy = CachePolicy("courses")
+material_policy = CachePolicy("material")
+
+
+def stats() -> dict:
+    return {policy: instance.not_modified for policy, instance in
+            (("lessons", lessons_policy), ("courses", courses_policy), ("material", material_policy))}
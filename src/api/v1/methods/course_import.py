@@ -0,0 +1,68 @@
+from typing import AsyncIterator
+from pydantic import ValidationError
+from src.api.v1.schemas.course_schema import CourseInput, CourseImport, MAX_IMPORT_LESSONS
+from src.api.v1.schemas.lesson_schema import LessonData
+
+NDJSON_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+
+
+def validation_errors(e: ValidationError, **position) -> list:
+    return [{**position, "field": ".".join(map(str, error["loc"])), "message": error["msg"]} for error in e.errors()]
+
+
+def type_errors(lesson: LessonData, **position) -> list:
+    try:
+        lesson.resolve_type()
+    except ValueError as e:
+        return [{**position, "field": None, "message": str(e)}]
+    return []
+
+
+def too_many(line: int) -> dict:
+    return {"line": line, "field": None, "message": f"Уроков в импорте не может быть больше {MAX_IMPORT_LESSONS}"}
+
+
+def parse_json(body: bytes):
+    # Весь импорт одним JSON-документом: {"course_title": ..., "lessons": [...]}
+    try:
+        data = CourseImport.model_validate_json(body)
+    except ValidationError as e:
+        return None, [], validation_errors(e)
+    errors = [error for index, lesson in enumerate(data.lessons) for error in type_errors(lesson, index=index)]
+    return CourseInput.model_validate(data.model_dump(exclude={"lessons"})), data.lessons, errors
+
+
+async def parse_ndjson(stream: AsyncIterator[bytes]):
+    # Первая строка - курс, каждая следующая - урок. Строки разбираются по мере получения тела запроса
+    course, lessons, errors = None, [], []
+    number, buffer = 0, b""
+
+    def parse_line(line: bytes):
+        nonlocal course
+        if not line.strip():
+            return
+        try:
+            if course is None and not lessons and not errors:
+                course = CourseInput.model_validate_json(line)
+            else:
+                lesson = LessonData.model_validate_json(line)
+                errors.extend(type_errors(lesson, line=number))
+                lessons.append(lesson)
+        except ValidationError as e:
+            errors.extend(validation_errors(e, line=number))
+
+    async for chunk in stream:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            number += 1
+            parse_line(line)
+        if len(lessons) > MAX_IMPORT_LESSONS:
+            return None, [], [too_many(number)]
+    number += 1
+    parse_line(buffer)
+    if len(lessons) > MAX_IMPORT_LESSONS:
+        return None, [], [too_many(number)]
+    if course is None and not errors:
+        errors.append({"line": 1, "field": None, "message": "Не передан курс"})
+    return course, lessons, errors
@@ -0,0 +1,80 @@
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from passlib.context import CryptContext
+from src.utils.metrics import Histogram
+from .__init__ import env_path
+
+load_dotenv(dotenv_path=env_path)
+
+# Количество потоков для bcrypt (bcrypt отпускает GIL, поэтому хватает потоков)
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", 4))
+# Сколько операций может ждать свободный поток, прежде чем запросы начнут отклоняться
+HASH_QUEUE_SIZE = int(os.getenv("HASH_QUEUE_SIZE", 64))
+
+
+class HasherOverloaded(Exception):
+    ...
+
+
+class PasswordHasher:
+    def __init__(self, context: CryptContext, workers: int, queue_size: int):
+        self.context = context
+        self.workers = workers
+        self.queue_size = queue_size
+        # Пул создается при первой операции и заново после остановки приложения
+        self._executor = None
+        # Операции в работе и в очереди
+        self.pending = 0
+        self.rejected = 0
+        self.wait_time = Histogram()
+        self.hash_time = Histogram()
+
+    def _timed(self, func, args, queued_at):
+        started_at = time.perf_counter()
+        self.wait_time.observe(started_at - queued_at)
+        try:
+            return func(*args)
+        finally:
+            self.hash_time.observe(time.perf_counter() - started_at)
+
+    async def _submit(self, func, *args):
+        if self.pending >= self.workers + self.queue_size:
+            self.rejected += 1
+            raise HasherOverloaded()
+        self.pending += 1
+        try:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="password-hasher")
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, self._timed, func, args, time.perf_counter())
+        finally:
+            self.pending -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self._submit(self.context.hash, password)
+
+    async def verify(self, password: str, hash_pass: str) -> bool:
+        return await self._submit(self.context.verify, password, hash_pass)
+
+    def shutdown(self):
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "queue_size": self.queue_size,
+            "in_flight": min(self.pending, self.workers),
+            "queue_depth": max(self.pending - self.workers, 0),
+            "rejected": self.rejected,
+            "wait_time": self.wait_time.snapshot(),
+            "hash_time": self.hash_time.snapshot()
+        }
+
+
+hasher = PasswordHasher(CryptContext(schemes=['bcrypt'], deprecated="auto"),
+                        workers=HASH_WORKERS, queue_size=HASH_QUEUE_SIZE)
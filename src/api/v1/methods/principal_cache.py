@@ -0,0 +1,74 @@
+import os
+import time
+from typing import Optional
+from dotenv import load_dotenv
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.utils.cache import TTLCache, MISSING
+from src.api.v1.schemas import user_schema as user_m
+from .__init__ import env_path
+
+load_dotenv(dotenv_path=env_path)
+
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", 10000))
+# Максимальное время жизни записи, даже если токен живет дольше
+PRINCIPAL_CACHE_MAX_TTL = int(os.getenv("PRINCIPAL_CACHE_MAX_TTL", 900))
+# Кэш несуществующих логинов, чтобы перебор по чужим логинам не нагружал БД. Регистрация сбрасывает запись
+# только в своем воркере, в остальных она живет до истечения TTL, поэтому TTL короткий
+UNKNOWN_USER_CACHE_SIZE = int(os.getenv("UNKNOWN_USER_CACHE_SIZE", 10000))
+UNKNOWN_USER_TTL = int(os.getenv("UNKNOWN_USER_TTL", 5))
+
+
+class PrincipalCache:
+    # Кэш пользователей, уже проверенных по токену. Ключ - (username, token)
+    def __init__(self, maxsize: int, max_ttl: int):
+        self.max_ttl = max_ttl
+        self._cache = TTLCache(maxsize=maxsize)
+
+    def get(self, username: str, token: str) -> Optional[user_m.UserResponse]:
+        principal = self._cache.get((username, token))
+        return None if principal is MISSING else principal
+
+    def set(self, username: str, token: str, principal: user_m.UserResponse, token_exp: Optional[float]):
+        expires_at = time.time() + self.max_ttl
+        if token_exp is not None:
+            expires_at = min(expires_at, float(token_exp))
+        self._cache.set((username, token), principal, expires_at=expires_at)
+
+    def invalidate(self, username: Optional[str] = None, user_id: Optional[int] = None) -> int:
+        return self._cache.invalidate_where(
+            lambda key, principal: principal.username == username or principal.user_id == user_id
+        )
+
+    def clear(self):
+        self._cache.clear()
+
+    def stats(self) -> dict:
+        return self._cache.stats()
+
+
+principal_cache = PrincipalCache(maxsize=PRINCIPAL_CACHE_SIZE, max_ttl=PRINCIPAL_CACHE_MAX_TTL)
+unknown_users = TTLCache(maxsize=UNKNOWN_USER_CACHE_SIZE, ttl=UNKNOWN_USER_TTL)
+
+
+def is_unknown_user(username: str) -> bool:
+    return unknown_users.get(username) is not MISSING
+
+
+def invalidate_user(session: Optional[AsyncSession], username: Optional[str] = None, user_id: Optional[int] = None):
+    # Вызывается при изменении или удалении пользователя. Внутри единицы работы сброс откладывается
+    # до фиксации транзакции, иначе параллельный запрос успеет закэшировать старые данные
+    if session is not None and session.info.get("unit_of_work"):
+        session.info.setdefault("principals", []).append((username, user_id))
+    else:
+        forget(username, user_id)
+
+
+def accept(session: AsyncSession):
+    for username, user_id in session.info.pop("principals", ()):
+        forget(username, user_id)
+
+
+def forget(username: Optional[str], user_id: Optional[int]):
+    principal_cache.invalidate(username=username, user_id=user_id)
+    if username is not None:
+        unknown_users.pop(username)
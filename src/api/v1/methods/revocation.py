@@ -0,0 +1,108 @@
+import asyncio
+import os
+from typing import Callable
+from dotenv import load_dotenv
+from src.database.methods import RefreshTokenMethods
+from src.database.responses import FailedResponse
+from src.utils.bloom import BloomFilter
+from src.utils.cache import TTLCache, MISSING
+from src.utils.logger import logger
+from .__init__ import env_path
+
+load_dotenv(dotenv_path=env_path)
+
+REVOCATION_FILTER_CAPACITY = int(os.getenv("REVOCATION_FILTER_CAPACITY", 100000))
+REVOCATION_FILTER_ERROR_RATE = float(os.getenv("REVOCATION_FILTER_ERROR_RATE", 0.001))
+# Как часто фильтр пересобирается из БД (сек.), это же предел рассинхронизации между воркерами
+REVOCATION_REBUILD_INTERVAL = int(os.getenv("REVOCATION_REBUILD_INTERVAL", 30))
+
+
+class LocalRevocationBus:
+    # Локальная замена общей шины (Redis Pub/Sub, LISTEN/NOTIFY) для рассылки отзывов между воркерами.
+    # В одном процессе сообщение доходит сразу, остальные воркеры узнают об отзыве при пересборке фильтра.
+    def __init__(self):
+        self._subscribers: list[Callable[[str], None]] = []
+
+    def subscribe(self, callback: Callable[[str], None]):
+        self._subscribers.append(callback)
+
+    async def publish(self, family_id: str):
+        for callback in self._subscribers:
+            callback(family_id)
+
+
+class RevocationFilter:
+    def __init__(self, bus: LocalRevocationBus, capacity: int, error_rate: float):
+        self.bus = bus
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self._bloom = BloomFilter(capacity=capacity, error_rate=error_rate)
+        # Подтвержденные через БД ответы, чтобы ложные срабатывания не ходили в БД на каждый запрос
+        self._confirmed = TTLCache(maxsize=10000, ttl=REVOCATION_REBUILD_INTERVAL)
+        self.checks = 0
+        self.suspected = 0
+        self.false_positives = 0
+        self.rebuilds = 0
+        bus.subscribe(self._on_revoked)
+
+    def _on_revoked(self, family_id: str):
+        self._bloom.add(family_id)
+        self._confirmed.set(family_id, True)
+
+    async def is_revoked(self, family_id: str) -> bool:
+        self.checks += 1
+        if family_id not in self._bloom:
+            return False
+        self.suspected += 1
+        revoked = self._confirmed.get(family_id)
+        if revoked is MISSING:
+            response = await RefreshTokenMethods.is_family_revoked(family_id)
+            if isinstance(response, FailedResponse):
+                # Если БД недоступна, считаем токен отозванным
+                return True
+            revoked = response.data
+            self._confirmed.set(family_id, revoked)
+        if not revoked:
+            self.false_positives += 1
+        return revoked
+
+    async def revoke(self, family_id: str):
+        response = await RefreshTokenMethods.revoke_family(family_id)
+        if isinstance(response, FailedResponse):
+            return response
+        await self.bus.publish(family_id)
+        return response
+
+    async def rebuild(self):
+        response = await RefreshTokenMethods.get_revoked_families()
+        if isinstance(response, FailedResponse):
+            logger.error(f"Не удалось пересобрать фильтр отозванных токенов: {response.detail}")
+            return
+        families = response.data
+        capacity = max(self.capacity, len(families) * 2)
+        # Подмена целиком, чтобы проверки не видели наполовину заполненный фильтр
+        self._bloom = BloomFilter.from_items(families, capacity=capacity, error_rate=self.error_rate)
+        self._confirmed.clear()
+        self.rebuilds += 1
+
+    async def run(self, interval: int = REVOCATION_REBUILD_INTERVAL):
+        while True:
+            await asyncio.sleep(interval)
+            await RefreshTokenMethods.delete_expired()
+            await self.rebuild()
+
+    def stats(self) -> dict:
+        return {
+            "items": self._bloom.count,
+            "bits": self._bloom.num_bits,
+            "hashes": self._bloom.num_hashes,
+            "checks": self.checks,
+            "suspected": self.suspected,
+            "false_positives": self.false_positives,
+            "rebuilds": self.rebuilds
+        }
+
+
+revocation_bus = LocalRevocationBus()
+revocation_filter = RevocationFilter(revocation_bus, capacity=REVOCATION_FILTER_CAPACITY,
+                                     error_rate=REVOCATION_FILTER_ERROR_RATE)
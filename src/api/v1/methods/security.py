@@ -1,6 +1,5 @@
 import os
 
-from passlib.context import CryptContext
 from fastapi.security import OAuth2PasswordRequestForm, OAuth2PasswordBearer
 from fastapi import Depends, HTTPException, Body
 from src.database.responses import SuccessResponse, FailedResponse
@@ -8,71 +7,125 @@ from jose import jwt
 from jose.exceptions import JWTError, ExpiredSignatureError
 from datetime import datetime, timedelta, timezone
 from dotenv import load_dotenv
-from src.database.methods import UserMethods
+from src.database.methods import UserMethods, RefreshTokenMethods
 from src.api.v1.schemas import auth_schema as auth_m, user_schema as user_m
 from .__init__ import env_path
 from src.utils.logger import logger
 from src.api.v1.examples import auth_examples
+from src.api.v1.enums import Roles
+from src.api.v1.methods.principal_cache import principal_cache, unknown_users, is_unknown_user
+from src.api.v1.methods.hasher import hasher, HasherOverloaded
+from src.api.v1.methods.revocation import revocation_filter
+from uuid import uuid4
 
 load_dotenv(dotenv_path=env_path)
 
-pwd = CryptContext(schemes=['bcrypt'], deprecated="auto")
 SECRET = os.getenv("SECRET_KEY")
 ALGORITHM = "HS256"
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/login")
 
 
-def generate_access_token(sub, user_id, expires_min=15):
+def generate_access_token(sub, user_id, expires_min=15, family_id=None):
     utc_exp = datetime.now(tz=timezone.utc) + timedelta(minutes=expires_min)
-    data = {"sub": sub, "exp": utc_exp.timestamp(), "user_id": user_id}
+    data = {"sub": sub, "exp": utc_exp.timestamp(), "user_id": user_id, "fam": family_id}
     return jwt.encode(data, SECRET, algorithm=ALGORITHM)
 
 
-def generate_refresh_token(sub, user_id, expires_hours=24):
+def generate_refresh_token(sub, user_id, expires_hours=24, family_id=None, jti=None):
     utc_exp = datetime.now(tz=timezone.utc) + timedelta(hours=expires_hours)
-    data = {"sub": sub, "exp": utc_exp.timestamp(), "user_id": user_id}
+    data = {"sub": sub, "exp": utc_exp.timestamp(), "user_id": user_id, "fam": family_id, "jti": jti}
     return jwt.encode(data, SECRET, algorithm=ALGORITHM)
 
 
-def hash_password(password: str):
-    return pwd.hash(password)
+async def issue_tokens(sub, user_id, family_id=None, rotated_jti=None, expires_hours=24):
+    # Новый вход создает семейство токенов, обновление заменяет refresh-токен внутри семейства
+    jti = uuid4().hex
+    expires_at = datetime.now(tz=timezone.utc) + timedelta(hours=expires_hours)
+    if rotated_jti:
+        response = await RefreshTokenMethods.rotate(rotated_jti, jti, expires_at)
+    else:
+        family_id = uuid4().hex
+        response = await RefreshTokenMethods.add_token(jti, family_id, user_id, expires_at)
+    if isinstance(response, FailedResponse):
+        if rotated_jti and family_id:
+            # Если семейство отозвано из-за повторного использования - сразу сообщаем фильтру
+            revoked = await RefreshTokenMethods.is_family_revoked(family_id)
+            if isinstance(revoked, SuccessResponse) and revoked.data:
+                await revocation_filter.bus.publish(family_id)
+        raise HTTPException(status_code=response.status_code, detail=response.detail)
+    return {
+        'access_token': generate_access_token(sub=sub, user_id=user_id, family_id=family_id),
+        'refresh_token': generate_refresh_token(sub=sub, user_id=user_id, expires_hours=expires_hours,
+                                                family_id=family_id, jti=jti)
+    }
+
+
+def overloaded_exception():
+    return HTTPException(status_code=503, detail="Сервис перегружен, повторите попытку позже",
+                         headers={"Retry-After": "1"})
+
+
+async def hash_password(password: str):
+    try:
+        return await hasher.hash(password)
+    except HasherOverloaded:
+        raise overloaded_exception()
+
+
+async def verify_password(password: str, hash_pass: str):
+    try:
+        return await hasher.verify(password, hash_pass)
+    except HasherOverloaded:
+        raise overloaded_exception()
 
 
-def verify_password(password: str, hash_pass: str):
-    return pwd.verify(password, hash_pass)
+async def get_credentials(username: str):
+    # Недавно не найденные логины отклоняются без запроса к БД
+    if is_unknown_user(username):
+        raise HTTPException(status_code=404, detail="Пользователя не существует")
+    response = await UserMethods.get_credentials(username=username)
+    if isinstance(response, FailedResponse):
+        if response.status_code == 404:
+            unknown_users.set(username, True)
+        raise HTTPException(status_code=response.status_code, detail=response.detail)
+    return response.data
 
 
 async def auth_user(form: OAuth2PasswordRequestForm = Depends()):
     username = form.username
     password = form.password
 
-    result = await UserMethods.get_hash_password(username=username)
-    if isinstance(result, FailedResponse):
-        raise HTTPException(status_code=result.status_code, detail=result.detail)
-    if not verify_password(password, result.data):
+    credentials = await get_credentials(username)
+    if not await verify_password(password, credentials["password"]):
         raise HTTPException(status_code=401, detail="Введены неверные данные")
-    response = await UserMethods.get_user_id(username=username)
-    if isinstance(response, FailedResponse):
-        raise HTTPException(status_code=response.status_code, detail=response.detail)
-    return {
-        'access_token': generate_access_token(sub=username, user_id=response.data),
-        'refresh_token': generate_refresh_token(sub=username, user_id=response.data)
-    }
+    return await issue_tokens(sub=username, user_id=credentials["id"])
 
 
-async def refresh_token(token: auth_m.RefreshToken = Body(..., example=auth_examples.REFRESH_TOKEN_FORM)):
+def decode_refresh_token(token: auth_m.RefreshToken):
     try:
         payload = jwt.decode(token.refresh_token, SECRET, ALGORITHM)
-        user: str = payload.get("sub")
-        if not user:
-            raise HTTPException(status_code=401, detail="Неверный токен доступа")
-        response = await UserMethods.get_user_id(username=user)
-        if isinstance(response, FailedResponse):
-            raise HTTPException(status_code=response.status_code, detail=response.detail)
-        access_token = generate_access_token(sub=user, user_id=response.data)
-        return {"access_token": access_token}
     except JWTError:
         raise HTTPException(status_code=400, detail="Невалидный токен")
+    if not payload.get("sub") or not payload.get("jti") or not payload.get("fam"):
+        raise HTTPException(status_code=401, detail="Неверный токен доступа")
+    return payload
+
+
+async def refresh_token(token: auth_m.RefreshToken = Body(..., example=auth_examples.REFRESH_TOKEN_FORM)):
+    payload = decode_refresh_token(token)
+    family_id = payload["fam"]
+    if await revocation_filter.is_revoked(family_id):
+        raise HTTPException(status_code=401, detail="Токен отозван")
+    return await issue_tokens(sub=payload["sub"], user_id=payload.get("user_id"), family_id=family_id,
+                              rotated_jti=payload["jti"])
+
+
+async def revoke_token(token: auth_m.RefreshToken = Body(..., example=auth_examples.REFRESH_TOKEN_FORM)):
+    payload = decode_refresh_token(token)
+    response = await revocation_filter.revoke(payload["fam"])
+    if isinstance(response, FailedResponse):
+        raise HTTPException(status_code=response.status_code, detail=response.detail)
+    return True
 
 
 async def get_user(token: str = Depends(oauth2_scheme)):
@@ -82,6 +135,14 @@ async def get_user(token: str = Depends(oauth2_scheme)):
         username = payload.get("sub")
         if not username:
             raise HTTPException(status_code=404, detail="Пользователя не существует")
+        # Проверка отзыва семейства токенов без обращения к БД
+        family_id = payload.get("fam")
+        if family_id and await revocation_filter.is_revoked(family_id):
+            raise HTTPException(status_code=401, detail="Токен отозван")
+        # Пользователь уже проверялся по этому токену
+        principal = principal_cache.get(username, token)
+        if principal:
+            return principal
         response = await UserMethods.get_user_id(username=username)
         if isinstance(response, FailedResponse):
             raise HTTPException(status_code=response.status_code, detail=response.detail)
@@ -89,10 +150,22 @@ async def get_user(token: str = Depends(oauth2_scheme)):
             "username": username,
             "user_id": response.data
         }
-        return user_m.UserResponse(**data)
+        principal = user_m.UserResponse(**data)
+        principal_cache.set(username, token, principal, token_exp=payload.get("exp"))
+        return principal
     except ExpiredSignatureError as e:
         logger.error(e)
         raise HTTPException(status_code=401, detail="Токен более недействителен")
     except JWTError as e:
         logger.error(e)
         raise HTTPException(status_code=401, detail="Невалидный токен")
+
+
+async def get_admin(user: user_m.UserResponse = Depends(get_user)):
+    # Роль не кэшируется вместе с токеном: проверяется по БД при каждом обращении
+    response = await UserMethods.get_user(user_id=user.user_id)
+    if isinstance(response, FailedResponse):
+        raise HTTPException(status_code=response.status_code, detail=response.detail)
+    if response.data.role != Roles.ADMIN:
+        raise HTTPException(status_code=403, detail="Недостаточно прав")
+    return user
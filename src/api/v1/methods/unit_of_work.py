@@ -0,0 +1,38 @@
+from typing import Callable
+from fastapi import Request, Response
+from fastapi.responses import ORJSONResponse
+from fastapi.routing import APIRoute
+from src.api.v1 import responses
+from src.database.session import finish
+from src.utils.logger import logger
+
+NOT_SAVED_DETAIL = "Не удалось сохранить изменения, повторите запрос"
+
+
+def not_saved() -> Response:
+    return ORJSONResponse(status_code=500, content={"detail": responses.fail_response(500, NOT_SAVED_DETAIL)})
+
+
+async def save(session) -> bool:
+    # Фиксация единицы работы запроса; ошибка фиксации, как и откат, означает, что запрос не сохранен
+    try:
+        return await finish(session)
+    except Exception as e:
+        logger.error(e)
+        return False
+
+
+class UnitOfWorkRoute(APIRoute):
+    # Единица работы запроса фиксируется после обработчика, но до отправки ответа: клиент получает успех
+    # только для сохраненных изменений, а откат или ошибка фиксации превращаются в 500
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+
+        async def route_handler(request: Request) -> Response:
+            response = await handler(request)
+            session = getattr(request.state, "session", None)
+            if session is None:
+                return response
+            return response if await save(session) else not_saved()
+
+        return route_handler
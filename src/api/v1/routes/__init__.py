@@ -4,6 +4,7 @@ from src.api.v1.routes.auth import router as auth_router
 from src.api.v1.routes.course import router as course_router
 from src.api.v1.routes.lesson import router as lesson_router
 from src.api.v1.routes.badges import router as badge_router
+from src.api.v1.routes.internal import router as internal_router
 
 
 def get_routers():
@@ -1,8 +1,11 @@
 from fastapi import APIRouter, HTTPException, Request, Depends, Body
-from fastapi.responses import JSONResponse
 from fastapi.exceptions import RequestValidationError
 from src.api.v1.schemas import auth_schema as auth_m, user_schema as user_m
+from src.api.v1.schemas.response_schema import Success
 from src.api.v1.enums import Roles
+from src.database.session import get_session
+from src.api.v1.methods.unit_of_work import UnitOfWorkRoute
+from sqlalchemy.ext.asyncio import AsyncSession
 from src.database.methods import UserMethods
 from src.database.responses import SuccessResponse, FailedResponse
 from src.utils.logger import logger
@@ -11,15 +14,16 @@ from pydantic import ValidationError
 from src.api.v1.methods import security
 from src.api.v1.examples import auth_examples
 
-router = APIRouter(prefix="/api/v1/auth", tags=['Authentication', 'Аутентификация'])
+router = APIRouter(prefix="/api/v1/auth", tags=['Authentication', 'Аутентификация'], route_class=UnitOfWorkRoute)
 
 
-@router.post("/register", response_model=auth_m.RegVisibleForm, description="Регистрация пользователя в системе")
-async def _(reg_form: auth_m.RegForm = Body(..., example=auth_examples.REG_FORM_EXAMPLE)):
+@router.post("/register", response_model=Success[auth_m.RegVisibleForm], description="Регистрация пользователя в системе")
+async def _(reg_form: auth_m.RegForm = Body(..., example=auth_examples.REG_FORM_EXAMPLE),
+            session: AsyncSession = Depends(get_session)):
     try:
         personal_info = {
             "username": reg_form.username,
-            "password": security.hash_password(reg_form.password),
+            "password": await security.hash_password(reg_form.password),
             "first_name": reg_form.first_name,
             "last_name": reg_form.last_name,
             "age": reg_form.age,
@@ -29,13 +33,13 @@ async def _(reg_form: auth_m.RegForm = Body(..., example=auth_examples.REG_FORM_
             # "success_in_a_row": 0
         }
         model_pi = auth_m.RegResponse(**personal_info)
-        created_user = await UserMethods.register_user(model_pi)
+        created_user = await UserMethods.register_user(model_pi, session=session)
         if isinstance(created_user, FailedResponse):
             details = created_user.detail
             status_code = created_user.status_code
             raise HTTPException(status_code=status_code, detail=responses.fail_response(status_code, details))
-        data = auth_m.RegVisibleForm(**created_user.data).model_dump()
-        return JSONResponse(content=responses.success_response(200, data=data))
+        data = auth_m.RegVisibleForm(**created_user.data)
+        return responses.success_response(200, data=data)
     except ValidationError as e:
         logger.error(e)
         raise HTTPException(
@@ -45,17 +49,25 @@ async def _(reg_form: auth_m.RegForm = Body(..., example=auth_examples.REG_FORM_
         )
 
 
-@router.post("/login", description="Авторизация пользователя через OAuth 2.0")
+@router.post("/login", response_model=auth_m.Tokens, description="Авторизация пользователя через OAuth 2.0")
 async def _(tokens: dict = Depends(security.auth_user)):
     return {"access_token": tokens.get("access_token", None),
             "refresh_token": tokens.get("refresh_token", None)}
 
 
-@router.post("/refresh", description="Энд-поинт для обновления истекшего токена доступа")
-async def _(new_access_token: str = Depends(security.refresh_token)):
-    return responses.success_response(status_code=200, data=new_access_token)
+@router.post("/refresh", response_model=Success[auth_m.Tokens],
+             description="Энд-поинт для обновления истекшего токена доступа. "
+                         "Refresh-токен одноразовый: в ответе выдается новая пара токенов")
+async def _(tokens: dict = Depends(security.refresh_token)):
+    return responses.success_response(status_code=200, data=tokens)
 
 
-@router.get("/me", description="Тестовый энд-поинт для проверки авторизации в системе")
+@router.post("/logout", response_model=Success[str],
+             description="Отзыв refresh-токена и всех токенов, выданных при этом входе")
+async def _(revoked: bool = Depends(security.revoke_token)):
+    return responses.success_response(status_code=200, data="Сессия завершена")
+
+
+@router.get("/me", response_model=Success[str], description="Тестовый энд-поинт для проверки авторизации в системе")
 async def _(me: user_m.UserResponse = Depends(security.get_user)):
     return responses.success_response(status_code=200, data=f"Привет, {me.username}!")
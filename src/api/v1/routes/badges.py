@@ -1,7 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException, Query, Path, Body
 from src.api.v1.schemas import lesson_schema as lesson_m, user_schema as user_m, tasks_schema as task_m
+from src.api.v1.schemas import page_schema as page_m, badge_schema as badge_m
+from src.api.v1.schemas.response_schema import Success
 from src.api.v1.methods import security
 from src.api.v1 import responses
+from src.database.session import get_session
+from src.api.v1.methods.unit_of_work import UnitOfWorkRoute
+from sqlalchemy.ext.asyncio import AsyncSession
 from src.database.methods import BadgeMethods
 from src.database.responses import FailedResponse
 from src.api.v1.enums import LessonTypes as lt, MaterialTypes, ProgressTypes
@@ -10,14 +15,20 @@ from src.api.v1.examples import lesson_examples
 import json
 from src.badges.dispatcher import BadgeDispatcher
 from src.badges.status import BadgeScanStatus
+from src.badges.catalog import badge_catalog
 
-router = APIRouter(prefix="/api/v1/badge", tags=['Достижения', 'Achievements'])
+router = APIRouter(prefix="/api/v1/badge", tags=['Достижения', 'Achievements'], route_class=UnitOfWorkRoute)
 
 
-@router.get("/myBadges")
-async def _(user: user_m.UserResponse = Depends(security.get_user)):
-    response = await BadgeMethods.get_user_badges(user.user_id)
+@router.get("/myBadges", response_model=Success[page_m.Page[badge_m.BadgeView]],
+            description="Получить свои достижения в порядке получения (постранично)")
+async def _(page: page_m.PageQuery = Depends(),
+            user: user_m.UserResponse = Depends(security.get_user),
+            session: AsyncSession = Depends(get_session)):
+    response = await BadgeMethods.get_user_badges(user.user_id, limit=page.limit, cursor=page.cursor, session=session)
     if isinstance(response, FailedResponse):
         detail = responses.fail_response(status_code=response.status_code, detail=response.detail)
         raise HTTPException(status_code=response.status_code, detail=detail)
-    return responses.success_response(data=response.data)
+    # Достижения собираются из справочника в памяти по айди из user_badges
+    badges = await badge_catalog.resolve(response.data["items"])
+    return responses.success_response(data={**response.data, "items": badges})
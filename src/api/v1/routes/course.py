@@ -1,26 +1,33 @@
-from fastapi import APIRouter, Depends, HTTPException, Query, Body
-from src.api.v1.schemas import course_schema as course_m, user_schema as user_m
-from src.api.v1.methods import security, patch_allow_attr
+from fastapi import APIRouter, Depends, HTTPException, Query, Body, Request, Response
+from src.api.v1.schemas import course_schema as course_m, user_schema as user_m, page_schema as page_m
+from src.api.v1.schemas.response_schema import Success
+from src.api.v1.methods import security, patch_allow_attr, course_import
+from src.api.v1.methods.conditional import courses_policy
 from src.api.v1 import responses
 from src.api.v1.enums import MaterialTypes, ProgressTypes
+from src.database.session import get_session
+from src.api.v1.methods.unit_of_work import UnitOfWorkRoute
+from src.database.entity_cache import course_key, stats_key, CATALOG_KEY
+from sqlalchemy.ext.asyncio import AsyncSession
 from src.database.methods import CourseMethods, ProgressMethods
 from src.database.responses import FailedResponse
 from pydantic import ValidationError
 from src.api.v1.examples import course_examples
 
-router = APIRouter(prefix="/api/v1/course", tags=['Курсы', 'Courses'])
+router = APIRouter(prefix="/api/v1/course", tags=['Курсы', 'Courses'], route_class=UnitOfWorkRoute)
 
 
-@router.post("/addCourse", description="Добавление курса")
+@router.post("/addCourse", response_model=Success[course_m.CourseAdded], description="Добавление курса")
 async def _(data: course_m.CourseInput = Body(..., example=course_examples.ADD_COURSE_EXAMPLE),
-            user: user_m.UserResponse = Depends(security.get_user)):
+            user: user_m.UserResponse = Depends(security.get_user),
+            session: AsyncSession = Depends(get_session)):
     course = course_m.CourseAddModel(
         course_title=data.course_title,
         author=user.username,
         desc=data.desc,
         course_categories=data.course_categories,
     )
-    response = await CourseMethods.add_course(course)
+    response = await CourseMethods.add_course(course, session=session)
     if isinstance(response, FailedResponse):
         detail = responses.fail_response(status_code=response.status_code, detail=response.detail)
         raise HTTPException(status_code=response.status_code, detail=detail)
@@ -28,43 +35,85 @@ async def _(data: course_m.CourseInput = Body(..., example=course_examples.ADD_C
     return responses.success_response(data={"message": "Курс успешно создан", "course": course})
 
 
-@router.get("/getCourse",
-            description="Получение курса в системе. Фильтрация идёт по названию курса и его идентификатору")
-async def _(name: str = Query(default=None, description="Название курса"),
+@router.post("/import", response_model=Success[course_m.CourseImported],
+             description="Импорт курса вместе с уроками одной транзакцией. Тело - JSON курса с массивом lessons "
+                         "(поля как в addLesson, без course_id) либо NDJSON (application/x-ndjson): "
+                         "первая строка - курс, каждая следующая - урок в порядке прохождения")
+async def _(request: Request, user: user_m.UserResponse = Depends(security.get_user),
+            session: AsyncSession = Depends(get_session)):
+    if request.headers.get("content-type", "").split(";")[0].strip() in course_import.NDJSON_TYPES:
+        data, lessons, errors = await course_import.parse_ndjson(request.stream())
+    else:
+        data, lessons, errors = course_import.parse_json(await request.body())
+    if errors:
+        detail = responses.fail_response(status_code=400, detail={"errors": errors})
+        raise HTTPException(status_code=400, detail=detail)
+    course = course_m.CourseAddModel(
+        course_title=data.course_title,
+        author=user.username,
+        desc=data.desc,
+        course_categories=data.course_categories,
+    )
+    response = await CourseMethods.import_course(course, lessons, session=session)
+    if isinstance(response, FailedResponse):
+        detail = responses.fail_response(status_code=response.status_code, detail=response.detail)
+        raise HTTPException(status_code=response.status_code, detail=detail)
+    return responses.success_response(data={"message": "Курс успешно импортирован", **response.data})
+
+
+@router.get("/getCourse", response_model=Success[course_m.CoursePage], response_model_exclude_unset=True,
+            description="Поиск курсов по названию, описанию и категориям с сортировкой по релевантности. "
+                        "Результат выдается постранично")
+async def _(request: Request, response: Response,
+            name: str = Query(default=None, description="Название курса"),
             id_: str = Query(default=None, description="Айди курса"),
-            user: user_m.UserResponse = Depends(security.get_user)):
+            page: page_m.PageQuery = Depends(),
+            fields: str = Query(default=None, description="Возвращаемые поля через запятую, например id,course_title"),
+            user: user_m.UserResponse = Depends(security.get_user),
+            session: AsyncSession = Depends(get_session)):
+    # Один курс сверяется по его версиям, поиск - по версии всего каталога
+    entities = (course_key(int(id_)), stats_key(int(id_))) if id_ and id_.isdigit() and not name else (CATALOG_KEY,)
+    not_modified = await courses_policy.check(request, response, *entities)
+    if not_modified:
+        return not_modified
     try:
-        search = course_m.SearchCourse(course_name=name, course_id=id_)
-        response = await CourseMethods.get_courses(course_search=search)
+        search = course_m.SearchCourse(course_name=name, course_id=id_, limit=page.limit, cursor=page.cursor,
+                                        fields=fields)
+        response = await CourseMethods.get_courses(course_search=search, session=session)
         if isinstance(response, FailedResponse):
             detail = responses.fail_response(status_code=response.status_code, detail=response.detail)
             raise HTTPException(status_code=response.status_code, detail=detail)
         return responses.success_response(data=response.data)
     except ValidationError as e:
-        return responses.fail_response(status_code=422,
-                                       detail='Ошибка при валидации данных. Убедитесь, что вводите всё в соответствии с формой')
+        detail = responses.fail_response(status_code=422,
+                                         detail='Ошибка при валидации данных. Убедитесь, что вводите всё в соответствии с формой')
+        raise HTTPException(status_code=422, detail=detail)
 
 
-@router.post("/sign", description="Подписка на курс для начала прогресса в системе")
-async def _(data: course_m.SignCourse, user: user_m.UserResponse = Depends(security.get_user)):
+@router.post("/sign", response_model=Success[user_m.UserProgressResponse], response_model_exclude_unset=True,
+             description="Подписка на курс для начала прогресса в системе")
+async def _(data: course_m.SignCourse, user: user_m.UserResponse = Depends(security.get_user),
+            session: AsyncSession = Depends(get_session)):
     material = user_m.UserAddProgress(
         user_id=user.user_id,
         material_id=data.course_id,
         material_type=MaterialTypes.COURSE,
         status=ProgressTypes.PROGRESS
     )
-    result = await ProgressMethods.start_material(material)
+    result = await ProgressMethods.start_material(material, session=session)
     if isinstance(result, FailedResponse):
         detail = responses.fail_response(status_code=result.status_code, detail=result.detail)
         raise HTTPException(status_code=result.status_code, detail=detail)
     return responses.success_response(data=result.data)
 
 
-@router.patch("/updateCourse", description="Изменение существующего курса")
+@router.patch("/updateCourse", response_model=Success[course_m.CourseView],
+              description="Изменение существующего курса")
 async def _(data: course_m.UpdateCourse = Body(..., example=course_examples.UPDATE_COURSE),
-            user: user_m.UserResponse = Depends(security.get_user)):
+            user: user_m.UserResponse = Depends(security.get_user),
+            session: AsyncSession = Depends(get_session)):
     # Проверка на автора
-    response = await CourseMethods.get_author(data.course_id)
+    response = await CourseMethods.get_author(data.course_id, session=session)
     if isinstance(response, FailedResponse):
         detail = responses.fail_response(response.status_code,
                                          detail=response.detail)
@@ -74,7 +123,7 @@ async def _(data: course_m.UpdateCourse = Body(..., example=course_examples.UPDA
                                          detail="Вы не являетесь автором этого курса")
         raise HTTPException(status_code=400, detail=detail)
     # Обновление материала
-    response = await CourseMethods.update_course(data.course_id, changes=data.changes)
+    response = await CourseMethods.update_course(data.course_id, changes=data.changes, session=session)
     if isinstance(response, FailedResponse):
         detail = responses.fail_response(response.status_code,
                                          detail=response.detail)
@@ -82,10 +131,11 @@ async def _(data: course_m.UpdateCourse = Body(..., example=course_examples.UPDA
     return responses.success_response(data=response.data)
 
 
-@router.delete("/deleteCourse", description="Удаление курса")
-async def _(data: course_m.DeleteCourse, user: user_m.UserResponse = Depends(security.get_user)):
+@router.delete("/deleteCourse", response_model=Success[str], description="Удаление курса")
+async def _(data: course_m.DeleteCourse, user: user_m.UserResponse = Depends(security.get_user),
+            session: AsyncSession = Depends(get_session)):
     # Проверка на автора
-    response = await CourseMethods.get_author(data.course_id)
+    response = await CourseMethods.get_author(data.course_id, session=session)
     if isinstance(response, FailedResponse):
         detail = responses.fail_response(response.status_code,
                                          detail=response.detail)
@@ -95,9 +145,11 @@ async def _(data: course_m.DeleteCourse, user: user_m.UserResponse = Depends(sec
                                          detail="Вы не являетесь автором этого курса")
         raise HTTPException(status_code=400, detail=detail)
     # Удаление курса
-    response = await CourseMethods.delete_course(data.course_id)
+    response = await CourseMethods.delete_course(data.course_id, session=session)
     if isinstance(response, FailedResponse):
         detail = responses.fail_response(response.status_code,
                                          detail=response.detail)
         raise HTTPException(response.status_code, detail=detail)
+    if not response.data["purged"]:
+        return responses.success_response(data="Курс удален, его уроки и прогресс будут удалены в фоне")
     return responses.success_response(data="Курс успешно удален!")
@@ -0,0 +1,39 @@
+from fastapi import APIRouter, Depends
+from typing import Any
+from src.api.v1.schemas import user_schema as user_m
+from src.api.v1.schemas.response_schema import Success
+from src.api.v1.methods import security
+from src.api.v1.methods.principal_cache import principal_cache, unknown_users
+from src.api.v1.methods.hasher import hasher
+from src.api.v1.methods.revocation import revocation_filter
+from src.database.counters import counters
+from src.database.purge import purger
+from src.database.entity_cache import entity_cache
+from src.badges.catalog import badge_catalog
+from src.api.v1.methods import conditional
+from src.database.model import engine, replica_router
+from src.database.pool import pool_stats
+from src.api.v1 import responses
+
+router = APIRouter(prefix="/api/v1/internal", tags=['Служебное', 'Internal'])
+
+
+@router.get("/metrics", response_model=Success[dict[str, Any]],
+            description="Служебные метрики кэшей и пулов, только для администраторов")
+async def _(user: user_m.UserResponse = Depends(security.get_admin)):
+    metrics = {
+        "principal_cache": principal_cache.stats(),
+        "unknown_users_cache": unknown_users.stats(),
+        "password_hasher": hasher.stats(),
+        "revocation_filter": revocation_filter.stats(),
+        "counters": counters.stats(),
+        "course_purge": purger.stats(),
+        "entity_cache": entity_cache.stats(),
+        "badge_catalog": badge_catalog.stats(),
+        "not_modified": conditional.stats(),
+        "db_pool": pool_stats(engine),
+        "replicas": {**replica_router.stats(),
+                     "pools": {f"{replica.url.host}:{replica.url.port}": pool_stats(replica)
+                               for replica in replica_router.replicas}}
+    }
+    return responses.success_response(data=metrics)
@@ -1,25 +1,36 @@
-from fastapi import APIRouter, Depends, HTTPException, Query, Path, Body
+from fastapi import APIRouter, Depends, HTTPException, Query, Path, Body, Request, Response
+from typing import Any, Union
 from src.api.v1.schemas import lesson_schema as lesson_m, user_schema as user_m, tasks_schema as task_m
+from src.api.v1.schemas import page_schema as page_m
+from src.api.v1.schemas.response_schema import Success
 from src.api.v1.methods import security
+from src.api.v1.methods.conditional import lessons_policy, material_policy
 from src.api.v1 import responses
-from src.database.methods import LessonMethods, CourseMethods, ProgressMethods, AiTaskMethods, UserMethods
+from src.database.session import get_session
+from src.api.v1.methods.unit_of_work import UnitOfWorkRoute, save, NOT_SAVED_DETAIL
+from src.database.entity_cache import course_key, stats_key
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.database.methods import LessonMethods, CourseMethods, ProgressMethods, AiTaskMethods
+from src.database.answer_engine import AnswerEngine
 from src.database.responses import FailedResponse
-from src.api.v1.enums import LessonTypes as lt, MaterialTypes, ProgressTypes
+from src.api.v1.enums import MaterialTypes, ProgressTypes
 from src.ai_agent.yandex_gpt import get_answer_ai, generate_task, compare_answers
 from src.api.v1.examples import lesson_examples
 import json
 from src.badges.dispatcher import BadgeDispatcher
 from src.badges.status import BadgeScanStatus
 
-router = APIRouter(prefix="/api/v1/lesson", tags=['Лекции/Уроки', 'Lessons'])
+router = APIRouter(prefix="/api/v1/lesson", tags=['Лекции/Уроки', 'Lessons'], route_class=UnitOfWorkRoute)
 
 
-@router.post("/addLesson", description="Добавление урока и прикрепление его к определенному курсу.\n"
-                                       "Для создания лекционного урока, требуется убрать ключи question_lesson, answer_lesson, attempts.")
+@router.post("/addLesson", response_model=Success[lesson_m.LessonAdded], response_model_exclude_unset=True,
+             description="Добавление урока и прикрепление его к определенному курсу.\n"
+                         "Для создания лекционного урока, требуется убрать ключи question_lesson, answer_lesson, attempts.")
 async def _(data: lesson_m.LessonInput = Body(..., example=lesson_examples.ADD_LESSON_EXAMPLE),
-            user: user_m.UserResponse = Depends(security.get_user)):
+            user: user_m.UserResponse = Depends(security.get_user),
+            session: AsyncSession = Depends(get_session)):
     # Проверка на автора
-    response = await CourseMethods.get_author(data.course_id)
+    response = await CourseMethods.get_author(data.course_id, session=session)
     if isinstance(response, FailedResponse):
         detail = responses.fail_response(response.status_code,
                                          detail=response.detail)
@@ -29,18 +40,10 @@ async def _(data: lesson_m.LessonInput = Body(..., example=lesson_examples.ADD_L
                                          detail="Вы не являетесь автором этого курса")
         raise HTTPException(status_code=400, detail=detail)
     # Тип урока
-    if data.question_lesson and data.answer_lesson:
-        lesson_type = lt.PRACTICAL
-    elif data.question_lesson or data.answer_lesson:
-        detail = responses.fail_response(status_code=400,
-                                         detail="Практическая лекция не может иметь вопрос без ответа и ответ без вопроса")
-        raise HTTPException(status_code=400, detail=detail)
-    else:
-        lesson_type = lt.LECTURE
-    # Проверка на указание попыток в практической лекции
-    if lesson_type == lt.PRACTICAL and not data.attempts:
-        detail = responses.fail_response(status_code=400,
-                                         detail="Практическая лекция должна иметь попытки на выполнение")
+    try:
+        lesson_type = data.resolve_type()
+    except ValueError as e:
+        detail = responses.fail_response(status_code=400, detail=str(e))
         raise HTTPException(status_code=400, detail=detail)
     lesson = lesson_m.LessonAddModel(
         lesson_title=data.lesson_title,
@@ -53,7 +56,7 @@ async def _(data: lesson_m.LessonInput = Body(..., example=lesson_examples.ADD_L
         level=data.level,
         lesson_type=lesson_type
     )
-    response = await LessonMethods.add_lesson(lesson)
+    response = await LessonMethods.add_lesson(lesson, session=session)
     if isinstance(response, FailedResponse):
         detail = responses.fail_response(status_code=response.status_code, detail=response.detail)
         raise HTTPException(status_code=response.status_code, detail=detail)
@@ -61,23 +64,70 @@ async def _(data: lesson_m.LessonInput = Body(..., example=lesson_examples.ADD_L
     return responses.success_response(data={"message": "Урок успешно добавлен", "lesson": response.data})
 
 
-@router.get("/getLessons", description="Получить все уроки из курса")
-async def _(course_id: int = Query(..., description="Айди курса"),
-            user: user_m.UserResponse = Depends(security.get_user)):
-    result = await LessonMethods.get_lessons_in_course(course_id=course_id)
+@router.get("/getLessons", response_model=Success[page_m.Page[lesson_m.LessonView]], response_model_exclude_unset=True,
+            description="Получить уроки курса в порядке прохождения (постранично)")
+async def _(request: Request, response: Response,
+            course_id: int = Query(..., description="Айди курса"),
+            page: page_m.PageQuery = Depends(),
+            fields: str = Query(default=None, description="Возвращаемые поля через запятую, например id,lesson_title"),
+            user: user_m.UserResponse = Depends(security.get_user),
+            session: AsyncSession = Depends(get_session)):
+    # Если у клиента актуальная версия, ответ 304 отдается без обращения к БД
+    not_modified = await lessons_policy.check(request, response, course_key(course_id), stats_key(course_id))
+    if not_modified:
+        return not_modified
+    result = await LessonMethods.get_lessons_in_course(course_id=course_id, limit=page.limit, cursor=page.cursor,
+                                                       fields=fields, session=session)
+    if isinstance(result, FailedResponse):
+        detail = responses.fail_response(status_code=result.status_code, detail=result.detail)
+        raise HTTPException(status_code=result.status_code, detail=detail)
+    return responses.success_response(data=result.data)
+
+
+@router.get("/{lesson_id}/material", response_model=Success[lesson_m.LessonMaterial],
+            description="Получить материал урока")
+async def _(request: Request, response: Response,
+            lesson_id: int = Path(..., description="Айди урока"),
+            user: user_m.UserResponse = Depends(security.get_user),
+            session: AsyncSession = Depends(get_session)):
+    # Курс урока берется из кэша уроков, материал меняется вместе с версией курса
+    result = await LessonMethods.get_lesson(lesson_id, fields=("id",), session=session)
+    if isinstance(result, FailedResponse):
+        detail = responses.fail_response(status_code=result.status_code, detail=result.detail)
+        raise HTTPException(status_code=result.status_code, detail=detail)
+    not_modified = await material_policy.check(request, response, course_key(result.data.course_id))
+    if not_modified:
+        return not_modified
+    result = await LessonMethods.get_lesson_material(lesson_id, session=session)
     if isinstance(result, FailedResponse):
         detail = responses.fail_response(status_code=result.status_code, detail=result.detail)
         raise HTTPException(status_code=result.status_code, detail=detail)
     return responses.success_response(data=result.data)
 
 
-@router.post("/sign", description="Подписаться на урок для начала прогресса в системе")
-async def _(data: lesson_m.SignLesson, user: user_m.UserResponse = Depends(security.get_user)):
-    response = await LessonMethods.get_lesson(data.lesson_id)
+@router.get("/{lesson_id}/answers", response_model=Success[page_m.Page[user_m.AnswerView]],
+            description="История ответов пользователя по уроку, начиная с последних (постранично)")
+async def _(lesson_id: int = Path(..., description="Айди урока"),
+            page: page_m.PageQuery = Depends(),
+            user: user_m.UserResponse = Depends(security.get_user),
+            session: AsyncSession = Depends(get_session)):
+    result = await ProgressMethods.get_answers(user.user_id, lesson_id, limit=page.limit, cursor=page.cursor,
+                                               session=session)
+    if isinstance(result, FailedResponse):
+        detail = responses.fail_response(status_code=result.status_code, detail=result.detail)
+        raise HTTPException(status_code=result.status_code, detail=detail)
+    return responses.success_response(data=result.data)
+
+
+@router.post("/sign", response_model=Success[user_m.UserProgressResponse], response_model_exclude_unset=True,
+             description="Подписаться на урок для начала прогресса в системе")
+async def _(data: lesson_m.SignLesson, user: user_m.UserResponse = Depends(security.get_user),
+            session: AsyncSession = Depends(get_session)):
+    response = await LessonMethods.get_lesson(data.lesson_id, fields=("id", "attempts"), session=session)
     if isinstance(response, FailedResponse):
         detail = responses.fail_response(status_code=response.status_code, detail=response.detail)
         raise HTTPException(status_code=response.status_code, detail=detail)
-    attempts = vars(response.data).get("attempts")
+    attempts = response.data.attempts
     material = user_m.UserAddProgress(
         user_id=user.user_id,
         material_id=data.lesson_id,
@@ -86,18 +136,19 @@ async def _(data: lesson_m.SignLesson, user: user_m.UserResponse = Depends(secur
         attempts=attempts
 
     )
-    result = await ProgressMethods.start_material(material)
+    result = await ProgressMethods.start_material(material, session=session)
     if isinstance(result, FailedResponse):
         detail = responses.fail_response(status_code=result.status_code, detail=result.detail)
         raise HTTPException(status_code=result.status_code, detail=detail)
     return responses.success_response(data=result.data)
 
 
-@router.patch("/updateLesson", description="Изменение урока в курсе")
+@router.patch("/updateLesson", response_model=Success[lesson_m.LessonView], description="Изменение урока в курсе")
 async def _(data: lesson_m.UpdateLesson = Body(..., example=lesson_examples.UPDATE_LESSON),
-            user: user_m.UserResponse = Depends(security.get_user)):
+            user: user_m.UserResponse = Depends(security.get_user),
+            session: AsyncSession = Depends(get_session)):
     # Проверка на автора
-    response = await CourseMethods.get_author(data.course_id)
+    response = await CourseMethods.get_author(data.course_id, session=session)
     if isinstance(response, FailedResponse):
         detail = responses.fail_response(response.status_code,
                                          detail=response.detail)
@@ -107,7 +158,31 @@ async def _(data: lesson_m.UpdateLesson = Body(..., example=lesson_examples.UPDA
                                          detail="Вы не являетесь автором этого курса")
         raise HTTPException(status_code=400, detail=detail)
     # Обновление материала урока
-    response = await LessonMethods.update_lesson(data.lesson_id, changes=data.changes)
+    response = await LessonMethods.update_lesson(data.lesson_id, changes=data.changes, session=session)
+    if isinstance(response, FailedResponse):
+        detail = responses.fail_response(response.status_code,
+                                         detail=response.detail)
+        raise HTTPException(response.status_code, detail=detail)
+    return responses.success_response(data=response.data)
+
+
+@router.patch("/reorder", response_model=Success[list[lesson_m.LessonPosition]],
+              description="Перестановка уроков: переданные уроки встают подряд в указанном порядке "
+                                     "сразу после урока after_id (без after_id - в начало курса)")
+async def _(data: lesson_m.ReorderLessons = Body(..., example=lesson_examples.REORDER_LESSONS),
+            user: user_m.UserResponse = Depends(security.get_user),
+            session: AsyncSession = Depends(get_session)):
+    # Проверка на автора
+    response = await CourseMethods.get_author(data.course_id, session=session)
+    if isinstance(response, FailedResponse):
+        detail = responses.fail_response(response.status_code,
+                                         detail=response.detail)
+        raise HTTPException(response.status_code, detail=detail)
+    if user.username != response.data:
+        detail = responses.fail_response(status_code=400,
+                                         detail="Вы не являетесь автором этого курса")
+        raise HTTPException(status_code=400, detail=detail)
+    response = await LessonMethods.reorder_lessons(data.course_id, data.lesson_ids, data.after_id, session=session)
     if isinstance(response, FailedResponse):
         detail = responses.fail_response(response.status_code,
                                          detail=response.detail)
@@ -115,10 +190,11 @@ async def _(data: lesson_m.UpdateLesson = Body(..., example=lesson_examples.UPDA
     return responses.success_response(data=response.data)
 
 
-@router.delete("/deleteLesson", description="Удаление урока в курсе")
-async def _(data: lesson_m.DeleteLesson, user: user_m.UserResponse = Depends(security.get_user)):
+@router.delete("/deleteLesson", response_model=Success[str], description="Удаление урока в курсе")
+async def _(data: lesson_m.DeleteLesson, user: user_m.UserResponse = Depends(security.get_user),
+            session: AsyncSession = Depends(get_session)):
     # Проверка на автора
-    response = await CourseMethods.get_author(data.course_id)
+    response = await CourseMethods.get_author(data.course_id, session=session)
     if isinstance(response, FailedResponse):
         detail = responses.fail_response(response.status_code,
                                          detail=response.detail)
@@ -128,7 +204,7 @@ async def _(data: lesson_m.DeleteLesson, user: user_m.UserResponse = Depends(sec
                                          detail="Вы не являетесь автором этого курса")
         raise HTTPException(status_code=400, detail=detail)
     # Удаление урока из курса
-    response = await LessonMethods.delete_lesson(data.lesson_id, data.course_id)
+    response = await LessonMethods.delete_lesson(data.lesson_id, data.course_id, session=session)
     if isinstance(response, FailedResponse):
         detail = responses.fail_response(response.status_code,
                                          detail=response.detail)
@@ -136,83 +212,66 @@ async def _(data: lesson_m.DeleteLesson, user: user_m.UserResponse = Depends(sec
     return responses.success_response(data="Урок успешно удален!")
 
 
-@router.post("/answerLesson", description="Завершить практический урок. (потратить попытку на ответ)")
-async def _(data: lesson_m.AnswerLesson, user: user_m.UserResponse = Depends(security.get_user)):
-    dispatcher = BadgeDispatcher(user.user_id)
-    # Проверка на то, выполнено ли задание
-    response = await ProgressMethods.get_status(user.user_id, data.lesson_id)
+@router.post("/answerLesson", response_model=Success[Union[user_m.AnswerResult, str]],
+             description="Завершить практический урок. (потратить попытку на ответ)")
+async def _(data: lesson_m.AnswerLesson, user: user_m.UserResponse = Depends(security.get_user),
+            session: AsyncSession = Depends(get_session)):
+    # Сверка ответа, списание попытки, серия решений и счетчик урока - одним запросом
+    response = await AnswerEngine.submit(user.user_id, data.lesson_id, data.answer, session=session)
+    # Ответ сверх лимита попыток записан в журнал: фиксируем его, хотя запрос завершится ошибкой
+    if isinstance(response, FailedResponse) and response.status_code == 403 and not await save(session):
+        raise HTTPException(status_code=500, detail=responses.fail_response(500, NOT_SAVED_DETAIL))
     if isinstance(response, FailedResponse):
         detail = responses.fail_response(status_code=response.status_code, detail=response.detail)
         raise HTTPException(status_code=response.status_code, detail=detail)
-    if response.data == ProgressTypes.COMPLETED:
-        detail = responses.fail_response(status_code=400, detail="Урок уже завершен")
-        raise HTTPException(status_code=400, detail=detail)
-    # Сверка ответа с правильным
-    result = await LessonMethods.check_answer_lesson(data)
-    if isinstance(result, FailedResponse):
-        detail = responses.fail_response(status_code=result.status_code, detail=result.detail)
-        raise HTTPException(status_code=result.status_code, detail=detail)
-    right = True if result.data else False
+    submission = response.data
+    right = submission["right"]
     if not right:
-        # Обнуление решенных задач подряд
-        response = await UserMethods.update_success_in_a_row(user_id=user.user_id, reset=True)
-        if isinstance(response, FailedResponse):
-            detail = responses.fail_response(status_code=response.status_code, detail=response.detail)
-            raise HTTPException(status_code=result.status_code, detail=detail)
-        # Отнятие попыток
-        response = await ProgressMethods.update_attempts(user.user_id, data.lesson_id, 1)
-        if isinstance(response, FailedResponse):
-            detail = responses.fail_response(status_code=response.status_code, detail=response.detail)
-            raise HTTPException(status_code=result.status_code, detail=detail)
-        model = response.data
-        # Добавление в список ответов
-        response = await ProgressMethods.update_user_answers(user.user_id, data.lesson_id, data.answer)
-        # print("RESPONSE", response)
-        if isinstance(response, FailedResponse):
-            detail = responses.fail_response(status_code=response.status_code, detail=response.detail)
-            raise HTTPException(status_code=result.status_code, detail=detail)
-        # print("DATA", response.data)
-        model = model.model_copy(update={"user_answers": response.data, "status": ProgressTypes.PROGRESS}).model_dump()
+        model = user_m.UserUpdateProgress(
+            user_id=user.user_id,
+            material_id=data.lesson_id,
+            status=submission["status"],
+            attempts=submission["attempts"],
+            user_answers=submission["user_answers"]
+        ).model_dump()
         return responses.success_response(data={"right": right, 'message': model})
-    # Изменение статуса выполнения задания
-    response = await ProgressMethods.update_status(user.user_id, data.lesson_id, ProgressTypes.COMPLETED)
-    if isinstance(response, FailedResponse):
-        detail = responses.fail_response(status_code=response.status_code, detail=response.detail)
-        raise HTTPException(status_code=result.status_code, detail=detail)
-    # Изменение числа участников, которые выполнили урок
-    response = await LessonMethods.add_success_lesson_people(data.lesson_id)
-    if isinstance(response, FailedResponse):
-        detail = responses.fail_response(status_code=response.status_code, detail=response.detail)
-        raise HTTPException(status_code=result.status_code, detail=detail)
-    # Добавление задачи в ряд
-    response = await UserMethods.update_success_in_a_row(user_id=user.user_id, bias=1)
-    if isinstance(response, FailedResponse):
-        detail = responses.fail_response(status_code=response.status_code, detail=response.detail)
-        raise HTTPException(status_code=result.status_code, detail=detail)
-    # Проверка выдачи достижений
-    scan_result = await dispatcher.scan()
+    # Ответ фиксируется до проверки достижений: ошибка при их выдаче не откатывает ответ
+    if not await save(session):
+        raise HTTPException(status_code=500, detail=responses.fail_response(500, NOT_SAVED_DETAIL))
+    # Проверка выдачи достижений - отдельной единицей работы
+    scan_result = await BadgeDispatcher(user.user_id).scan()
     state_message = "Урок успешно выполнен!"
-    final_message = state_message + " У Вас новое достижение." if BadgeScanStatus.SUCCESS in scan_result.values() \
-        else state_message
+    if BadgeDispatcher.failed(scan_result):
+        final_message = state_message + (" Не удалось проверить достижения, "
+                                         "они будут выданы при следующем верном ответе.")
+    elif BadgeScanStatus.SUCCESS in scan_result.values():
+        final_message = state_message + " У Вас новое достижение."
+    else:
+        final_message = state_message
     return responses.success_response(data=final_message)
 
 
-@router.post("/completeLesson", description="Завершить лекционный урок")
-async def _(body: user_m.BasicProgressModel, user: user_m.UserResponse = Depends(security.get_user)):
+@router.post("/completeLesson", response_model=Success[user_m.UserProgressResponse], response_model_exclude_unset=True,
+             description="Завершить лекционный урок")
+async def _(body: user_m.BasicProgressModel, user: user_m.UserResponse = Depends(security.get_user),
+            session: AsyncSession = Depends(get_session)):
     # Отметка лекционного урока как пройденного
-    result = await ProgressMethods.complete_lesson(user.user_id, body.material_id)
+    result = await ProgressMethods.complete_lesson(user.user_id, body.material_id, session=session)
     if isinstance(result, FailedResponse):
         detail = responses.fail_response(status_code=result.status_code, detail=result.detail)
         raise HTTPException(status_code=result.status_code, detail=detail)
     # Изменение числа участников, которые выполнили урок
-    response = await LessonMethods.add_success_lesson_people(body.material_id)
+    response = await LessonMethods.add_success_lesson_people(body.material_id, session=session)
     if isinstance(response, FailedResponse):
         detail = responses.fail_response(status_code=response.status_code, detail=response.detail)
         raise HTTPException(status_code=response.status_code, detail=detail)
     return responses.success_response(data=result.data)
 
 
-@router.post("/{lesson_id}/ask", tags=['AI-Tasks', 'ИИ-Задачи'], description="Задать вопрос по уроку AI-помощнику")
+# Маршруты с обращением к ИИ используют короткие сессии методов, чтобы не держать соединение из пула
+# на время ответа модели
+@router.post("/{lesson_id}/ask", response_model=Success[str], tags=['AI-Tasks', 'ИИ-Задачи'],
+             description="Задать вопрос по уроку AI-помощнику")
 async def _(lesson_id: int = Path(..., description="Айди урока"), q_body: task_m.TaskQuestionLesson = Body(...),
             user: user_m.UserResponse = Depends(security.get_user)):
     response = await LessonMethods.get_lesson(lesson_id)
@@ -228,7 +287,7 @@ async def _(lesson_id: int = Path(..., description="Айди урока"), q_bod
     return responses.success_response(data=ai_answer)
 
 
-@router.post("/{lesson_id}/generate-task", tags=['AI-Tasks', 'ИИ-Задачи'],
+@router.post("/{lesson_id}/generate-task", response_model=Success[Any], tags=['AI-Tasks', 'ИИ-Задачи'],
              description="Сгенерировать задачу по контексту урока")
 async def _(lesson_id: int = Path(..., description="Айди урока"),
             user: user_m.UserResponse = Depends(security.get_user)):
@@ -245,6 +304,7 @@ async def _(lesson_id: int = Path(..., description="Айди урока"),
     json_ai_task = json.loads(ai_task)
     model = task_m.AddTaskModel(
         user_id=user.user_id,
+        lesson_id=lesson_id,
         task=json_ai_task['task'],
         answer=json_ai_task['answer']
     )
@@ -256,7 +316,8 @@ async def _(lesson_id: int = Path(..., description="Айди урока"),
     return responses.success_response(data=json_ai_task['task'])
 
 
-@router.post("/{task_id}/answer-ai-task", tags=['AI-Tasks', 'ИИ-Задачи'], description="Ответить на задачу от ИИ")
+@router.post("/{task_id}/answer-ai-task", response_model=Success[Union[task_m.TaskCompleted, str]],
+             tags=['AI-Tasks', 'ИИ-Задачи'], description="Ответить на задачу от ИИ")
 async def _(task_id: int = Path(..., description="Айди задания, которое сгенерировала нейросеть"),
             answer: task_m.TaskAnswerLesson = Body(...),
             user: user_m.UserResponse = Depends(security.get_user)):
@@ -284,11 +345,18 @@ async def _(task_id: int = Path(..., description="Айди задания, ко
         return responses.success_response(data="К сожалению, ответ неверный.")
 
 
-@router.get("/get-ai-tasks", tags=['AI-Tasks', 'ИИ-Задачи'],
-            description="Получить список задач, которые сгенерировала нейросеть лично для пользователя")
-async def _(user: user_m.UserResponse = Depends(security.get_user)):
+@router.get("/get-ai-tasks", response_model=Success[page_m.Page[task_m.TaskItem]], response_model_exclude_unset=True,
+            tags=['AI-Tasks', 'ИИ-Задачи'],
+            description="Получить список задач, которые сгенерировала нейросеть лично для пользователя (постранично)")
+async def _(page: page_m.PageQuery = Depends(),
+            fields: str = Query(default=None,
+                                description="Возвращаемые поля через запятую, например id,status. Отдельные ключи "
+                                            "задачи запрашиваются через точку: task.text"),
+            user: user_m.UserResponse = Depends(security.get_user),
+            session: AsyncSession = Depends(get_session)):
     # Получение тасок пользователя
-    response = await AiTaskMethods.get_user_tasks(user.user_id)
+    response = await AiTaskMethods.get_user_tasks(user.user_id, limit=page.limit, cursor=page.cursor, fields=fields,
+                                                  session=session)
     if isinstance(response, FailedResponse):
         detail = responses.fail_response(status_code=response.status_code, detail=response.detail)
         raise HTTPException(status_code=response.status_code, detail=detail)
@@ -28,3 +28,8 @@ class RegVisibleForm(BaseModel):
 
 class RefreshToken(BaseModel):
     refresh_token: str
+
+
+class Tokens(BaseModel):
+    access_token: Optional[str] = None
+    refresh_token: Optional[str] = None
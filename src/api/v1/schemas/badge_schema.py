@@ -0,0 +1,13 @@
+from pydantic import BaseModel, Field, ConfigDict
+from typing import Optional
+
+
+class BadgeView(BaseModel):
+    id: int = Field(..., description="Айди достижения")
+    code: str = Field(..., description="Код достижения")
+    badge_name: str = Field(..., description="Название достижения")
+    badge_type: str = Field(..., description="Тип достижения")
+    desc: str = Field(..., description="Описание достижения")
+    emoji: Optional[str] = Field(default=None, description="Смайлик достижения")
+
+    model_config = ConfigDict(from_attributes=True)
@@ -1,5 +1,10 @@
 from pydantic import BaseModel, Field, ConfigDict
 from typing import Optional
+from src.api.v1.schemas.lesson_schema import LessonData
+from src.api.v1.schemas.page_schema import Page
+
+# Максимальное количество уроков в одном импорте
+MAX_IMPORT_LESSONS = 1000
 
 
 class CourseInput(BaseModel):
@@ -26,9 +31,17 @@ class CourseAddModel(CourseInput):
     course_num_peoples: int = Field(default=0, description="Количество людей, записанных на курс")
 
 
+class CourseImport(CourseInput):
+    lessons: list[LessonData] = Field(default_factory=list, description="Уроки курса в порядке прохождения",
+                                      max_length=MAX_IMPORT_LESSONS)
+
+
 class SearchCourse(BaseModel):
     course_name: Optional[str] = Field(default=None, description="Поиск по названию курса")
     course_id: Optional[int] = Field(default=None, description="Поиск по айди курса")
+    limit: Optional[int] = Field(default=None, description="Количество курсов на странице")
+    cursor: Optional[str] = Field(default=None, description="Курсор следующей страницы")
+    fields: Optional[str] = Field(default=None, description="Возвращаемые поля через запятую")
 
 
 class UpdateNumLessons(BaseModel):
@@ -47,3 +60,36 @@ class UpdateCourse(BaseModel):
 
 class DeleteCourse(BaseModel):
     course_id: int
+
+
+class CourseView(BaseModel):
+    # Курс в ответах. Поиск отдает только запрошенные поля, поэтому остальные необязательны
+    id: int = Field(..., description='Идентификатор курса')
+    course_title: Optional[str] = Field(default=None, description='Название курса')
+    author: Optional[str] = Field(default=None, description="Автор курса")
+    desc: Optional[str] = Field(default=None, description="Описание курса")
+    course_categories: Optional[str] = Field(default=None, description="Категории курса")
+    course_num_peoples: Optional[int] = Field(default=None, description="Количество людей, записанных на курс")
+    num_lessons: Optional[int] = Field(default=None, description="Количество уроков в курсе")
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class CourseTotal(BaseModel):
+    count: int = Field(..., description="Количество найденных курсов")
+    exact: bool = Field(..., description="Точное ли количество (иначе - оценка планировщика)")
+
+
+class CoursePage(Page[CourseView]):
+    total: Optional[CourseTotal] = Field(default=None, description="Всего найдено, только на первой странице")
+
+
+class CourseAdded(BaseModel):
+    message: str
+    course: CourseAddModel
+
+
+class CourseImported(BaseModel):
+    message: str
+    course_id: int
+    num_lessons: int
@@ -1,10 +1,10 @@
 from pydantic import BaseModel, Field, ConfigDict
 from typing import Optional
+from src.api.v1.enums import LessonTypes
 
 
-class LessonInput(BaseModel):
+class LessonData(BaseModel):
     lesson_title: str = Field(..., description='Название урока')
-    course_id: int = Field(..., description='Айди курса, к которому относится урок')
     desc: str = Field(..., description="Описание урока", min_length=12, max_length=256)
     material: str = Field(..., description="Материал урока", min_length=32, max_length=6096)
     level: int = Field(..., description="Уровень сложности", ge=1, le=3)
@@ -12,6 +12,20 @@ class LessonInput(BaseModel):
     answer_lesson: Optional[str] = Field(default=None, description='Ответ урока')
     attempts: Optional[int] = Field(default=None, description='Сколько попыток дается на ответ', le=100)
 
+    def resolve_type(self) -> str:
+        # Тип урока определяется наличием вопроса и ответа
+        if self.question_lesson and self.answer_lesson:
+            if not self.attempts:
+                raise ValueError("Практическая лекция должна иметь попытки на выполнение")
+            return LessonTypes.PRACTICAL
+        if self.question_lesson or self.answer_lesson:
+            raise ValueError("Практическая лекция не может иметь вопрос без ответа и ответ без вопроса")
+        return LessonTypes.LECTURE
+
+
+class LessonInput(LessonData):
+    course_id: int = Field(..., description='Айди курса, к которому относится урок')
+
 
 class LessonAddModel(LessonInput):
     lesson_type: str = Field(default=..., description='Тип урока')
@@ -35,6 +49,47 @@ class UpdateLesson(BaseModel):
                           description='Словарь в формате {"attr": "new_value"}, где в ключе подается атрибут, а в значении новая информация об объекте')
 
 
+class ReorderLessons(BaseModel):
+    course_id: int
+    lesson_ids: list[int] = Field(..., description="Перемещаемые уроки в новом порядке", min_length=1,
+                                  max_length=1000)
+    after_id: Optional[int] = Field(default=None, description="Урок, после которого встают перемещаемые уроки")
+
+
 class DeleteLesson(BaseModel):
     course_id: int
     lesson_id: int
+
+
+class LessonView(BaseModel):
+    # Урок в ответах. Списки отдают только запрошенные поля, поэтому остальные необязательны
+    id: int = Field(..., description="Айди урока")
+    course_id: Optional[int] = Field(default=None, description="Айди курса")
+    lesson_title: Optional[str] = Field(default=None, description="Название урока")
+    lesson_type: Optional[str] = Field(default=None, description="Тип урока")
+    desc: Optional[str] = Field(default=None, description="Описание урока")
+    material: Optional[str] = Field(default=None, description="Материал урока")
+    question_lesson: Optional[str] = Field(default=None, description="Вопрос урока")
+    answer_lesson: Optional[str] = Field(default=None, description="Ответ урока")
+    attempts: Optional[int] = Field(default=None, description="Сколько попыток дается на ответ")
+    lesson_num_success_peoples: Optional[int] = Field(default=None, description="Количество людей, прошедших урок")
+    level: Optional[int] = Field(default=None, description="Уровень сложности")
+    pos: Optional[int] = Field(default=None, description="Позиция урока в курсе")
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class LessonMaterial(BaseModel):
+    id: int
+    lesson_title: str
+    material: str
+
+
+class LessonAdded(BaseModel):
+    message: str
+    lesson: LessonAddModel
+
+
+class LessonPosition(BaseModel):
+    id: int
+    pos: int
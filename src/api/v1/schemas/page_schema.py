@@ -0,0 +1,16 @@
+from pydantic import BaseModel, Field
+from typing import Generic, Optional, TypeVar
+from src.database.pagination import DEFAULT_PAGE_LIMIT, MAX_PAGE_LIMIT
+
+T = TypeVar("T")
+
+
+class PageQuery(BaseModel):
+    limit: int = Field(default=DEFAULT_PAGE_LIMIT, ge=1, le=MAX_PAGE_LIMIT, description="Количество записей на странице")
+    cursor: Optional[str] = Field(default=None, description="Курсор следующей страницы из предыдущего ответа")
+
+
+class Page(BaseModel, Generic[T]):
+    # Формат страницы из pagination.page
+    items: list[T] = Field(..., description="Записи страницы")
+    next_cursor: Optional[str] = Field(default=None, description="Курсор следующей страницы, на последней - null")
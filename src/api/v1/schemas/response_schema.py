@@ -0,0 +1,12 @@
+from pydantic import BaseModel, Field
+from typing import Generic, TypeVar
+
+T = TypeVar("T")
+
+
+class Success(BaseModel, Generic[T]):
+    # Конверт успешного ответа (responses.success_response). Модель данных задается маршрутом: FastAPI проверяет
+    # и сериализует ответ через pydantic-core, без обхода jsonable_encoder
+    success: bool = Field(default=True, description="Признак успешного ответа")
+    status_code: int = Field(default=200, description="Код ответа")
+    data: T
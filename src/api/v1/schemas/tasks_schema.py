@@ -1,6 +1,6 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, ConfigDict
 from src.api.v1.enums import ProgressTypes
-from typing import Optional
+from typing import Any, Optional
 
 
 class TaskQuestionLesson(BaseModel):
@@ -13,6 +13,32 @@ class TaskAnswerLesson(BaseModel):
 
 class AddTaskModel(BaseModel):
     user_id: int
+    lesson_id: Optional[int] = None
     task: str
     answer: str
     status: str = Field(default=ProgressTypes.PROGRESS)
+
+
+class TaskView(BaseModel):
+    id: int
+    task: Any = Field(..., description="Задача от ИИ")
+    answer: Any = Field(..., description="Правильный ответ")
+    user_id: int
+    lesson_id: Optional[int] = None
+    status: str
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class TaskItem(BaseModel):
+    # Задача в списке: только запрошенные поля, ключи документа задачи ("task.text") приходят отдельными полями
+    id: int
+    task: Any = Field(default=None, description="Задача от ИИ")
+    status: Optional[str] = None
+
+    model_config = ConfigDict(extra="allow")
+
+
+class TaskCompleted(BaseModel):
+    status: str
+    body: TaskView
@@ -1,4 +1,5 @@
 from pydantic import BaseModel, Field
+from datetime import datetime
 from src.api.v1.examples import auth_examples
 from typing import Optional
 
@@ -21,7 +22,7 @@ class UserUpdateProgress(BaseModel):
     material_id: int = Field(..., description="Айди курса/лекции")
     status: Optional[str] = Field(default=None, description="Статус выполнения материала (in progress/completed)")
     attempts: Optional[int] = Field(default=None, description="Количество попыток")
-    user_answers: Optional[list[str]] = Field(default=None, description="Список ответов пользователя")
+    user_answers: Optional[list[str]] = Field(default=None, description="Последние ответы пользователя")
 
 
 class UserProgressResponse(BaseModel):
@@ -35,3 +36,15 @@ class UserProgressResponse(BaseModel):
 
 class BasicProgressModel(BaseModel):
     material_id: int
+
+
+class AnswerView(BaseModel):
+    id: int = Field(..., description="Айди ответа")
+    answer: str = Field(..., description="Ответ пользователя")
+    is_right: bool = Field(..., description="Верен ли ответ")
+    created_at: datetime = Field(..., description="Время ответа")
+
+
+class AnswerResult(BaseModel):
+    right: bool = Field(..., description="Верен ли ответ")
+    message: UserUpdateProgress = Field(..., description="Прогресс после ответа")
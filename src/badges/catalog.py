@@ -0,0 +1,66 @@
+import asyncio
+from types import MappingProxyType
+from typing import Optional
+from src.database.dto import BadgeDTO
+from src.database.methods import BadgeMethods
+from src.database.model import db_config
+from src.database.responses import FailedResponse
+from src.utils.logger import logger
+
+
+class BadgeCodes:
+    # Коды достижений, на которые ссылаются правила выдачи
+    STREAK_10: str = "streak_10"
+    FIRST_SOLVE: str = "first_solve"
+
+
+class BadgeCatalog:
+    # Справочник достижений в памяти воркера: загружается при старте и перечитывается раз в интервал.
+    # Новый снимок подменяет старый целиком, поэтому чтения без блокировок видят согласованный справочник
+    def __init__(self):
+        self._snapshot = (MappingProxyType({}), MappingProxyType({}))
+        # Айди, которых не оказалось и после перечитывания: по ним БД не опрашивается до следующей загрузки
+        self._unknown = frozenset()
+        self.reloads = 0
+        self.misses = 0
+
+    async def reload(self) -> bool:
+        response = await BadgeMethods.get_catalog()
+        if isinstance(response, FailedResponse):
+            logger.error(f"Не удалось загрузить справочник достижений: {response.detail}")
+            return False
+        badges = response.data
+        by_id, _ = self._snapshot
+        if tuple(badges) != tuple(by_id.values()):
+            self._snapshot = (MappingProxyType({badge.id: badge for badge in badges}),
+                              MappingProxyType({badge.code: badge for badge in badges}))
+            self.reloads += 1
+        self._unknown = frozenset()
+        return True
+
+    def get(self, badge_id: int) -> Optional[BadgeDTO]:
+        return self._snapshot[0].get(badge_id)
+
+    def by_code(self, code: str) -> Optional[BadgeDTO]:
+        return self._snapshot[1].get(code)
+
+    async def resolve(self, badge_ids: list) -> list:
+        # Достижение, добавленное после загрузки, подтягивается одним перечитыванием справочника
+        missing = {badge_id for badge_id in badge_ids if self.get(badge_id) is None}
+        if missing - self._unknown:
+            self.misses += 1
+            await self.reload()
+            self._unknown = frozenset(badge_id for badge_id in missing if self.get(badge_id) is None)
+        by_id = self._snapshot[0]
+        return [by_id[badge_id] for badge_id in badge_ids if badge_id in by_id]
+
+    async def run(self, interval: float = db_config.BADGE_CATALOG_REFRESH_INTERVAL):
+        while True:
+            await asyncio.sleep(interval)
+            await self.reload()
+
+    def stats(self) -> dict:
+        return {"badges": len(self._snapshot[0]), "reloads": self.reloads, "misses": self.misses}
+
+
+badge_catalog = BadgeCatalog()
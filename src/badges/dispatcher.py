@@ -1,32 +1,50 @@
 from src.database.methods import BadgeMethods
 from src.database.responses import FailedResponse
-from src.badges.achievments import Achievement
-import asyncio
 from src.badges.status import BadgeScanStatus
-from src.badges.rules import BadgeRules
+from src.badges.rules import BADGE_RULES, BadgeRule
+from src.badges.catalog import badge_catalog
 
 
 class BadgeDispatcher:
-    def __init__(self, user_id):
+    def __init__(self, user_id, session=None, rules: tuple[BadgeRule, ...] = BADGE_RULES):
         self.user_id = user_id
+        self.session = session
+        self.rules = rules
 
     @staticmethod
-    async def check_rule(achievement, total_badges):
-        if isinstance(achievement, Achievement):
-            response = await BadgeMethods.give(achievement)
-            if isinstance(response, FailedResponse):
-                total_badges[achievement.achievement_name] = BadgeScanStatus.FAILED, response.detail
-            else:
-                total_badges[achievement.achievement_name] = BadgeScanStatus.SUCCESS
-        else:
-            total_badges[achievement] = BadgeScanStatus.NO_SUCCESS
+    def failed(total_badges: dict) -> bool:
+        # Ошибки проверки записываются парой (статус, причина)
+        return any(isinstance(status, tuple) and status[0] == BadgeScanStatus.FAILED
+                   for status in total_badges.values())
 
     async def scan(self):
         total_badges = dict()
-        # Проверка всех достижений
-        await self.check_rule(await BadgeRules.first_rule(user_id=self.user_id), total_badges)
-        await self.check_rule(await BadgeRules.second_rule(user_id=self.user_id), total_badges)
+        # Показатели пользователя и его достижения - один запрос на все правила
+        response = await BadgeMethods.get_context(self.user_id, session=self.session)
+        if isinstance(response, FailedResponse):
+            return {rule.code: (BadgeScanStatus.FAILED, response.detail) for rule in self.rules}
+        context = response.data
+        earned = dict()
+        for rule in self.rules:
+            badge = badge_catalog.by_code(rule.code)
+            if badge is None:
+                total_badges[rule.code] = BadgeScanStatus.FAILED, "Достижения нет в справочнике"
+            elif badge.id in context.badge_ids:
+                # Выданные достижения не проверяются
+                total_badges[badge.badge_name] = BadgeScanStatus.HELD
+            elif rule.condition(context):
+                earned[badge.id] = badge
+            else:
+                total_badges[badge.badge_name] = BadgeScanStatus.NO_SUCCESS
+        if not earned:
+            return total_badges
+        # Все новые достижения выдаются одним запросом
+        response = await BadgeMethods.give_many(self.user_id, list(earned), session=self.session)
+        if isinstance(response, FailedResponse):
+            total_badges.update({badge.badge_name: (BadgeScanStatus.FAILED, response.detail)
+                                 for badge in earned.values()})
+            return total_badges
+        given = set(response.data)
+        total_badges.update({badge.badge_name: BadgeScanStatus.SUCCESS if badge_id in given else BadgeScanStatus.HELD
+                             for badge_id, badge in earned.items()})
         return total_badges
-
-
-
@@ -1,31 +1,19 @@
-from src.database.methods import UserMethods
-from src.database.responses import FailedResponse
-from src.database.model import Users
-from src.badges.achievments import Achievement
-from typing import Union
+from dataclasses import dataclass
+from typing import Callable
+from src.badges.catalog import BadgeCodes
+from src.database.dto import BadgeContext
 
 
-class BadgeRules:
-    @staticmethod
-    async def first_rule(user_id) -> Union[str, Achievement]:
-        achievement_name = "Всемогущий"
-        response = await UserMethods.get_user(user_id)
-        if isinstance(response, FailedResponse):
-            return achievement_name
-        user: Users = response.data
-        success_in_a_row = user.success_in_a_row
-        if success_in_a_row >= 10:
-            return Achievement(user_id=user_id, badge_id=1, achievement_name=achievement_name)
-        return achievement_name
+@dataclass(frozen=True, slots=True)
+class BadgeRule:
+    # Правило выдачи: код достижения из справочника и условие над снимком показателей пользователя
+    code: str
+    condition: Callable[[BadgeContext], bool]
 
-    @staticmethod
-    async def second_rule(user_id) -> Union[str, Achievement]:
-        achievement_name = "Все с чего-то начинали"
-        response = await UserMethods.get_user(user_id)
-        if isinstance(response, FailedResponse):
-            return achievement_name
-        user: Users = response.data
-        success_in_a_row = user.success_in_a_row
-        if success_in_a_row >= 1:
-            return Achievement(user_id=user_id, badge_id=2, achievement_name=achievement_name)
-        return achievement_name
+
+# Новое правило - еще одна строка: показатели загружаются одним запросом на всю проверку,
+# недостающий показатель добавляется в BadgeContext и BadgeMethods.get_context
+BADGE_RULES = (
+    BadgeRule(BadgeCodes.STREAK_10, lambda context: context.success_in_a_row >= 10),
+    BadgeRule(BadgeCodes.FIRST_SOLVE, lambda context: context.success_in_a_row >= 1),
+)
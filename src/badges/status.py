@@ -2,3 +2,4 @@ class BadgeScanStatus:
     FAILED: str = "Ошибка"
     SUCCESS: str = "Выдано"
     NO_SUCCESS: str = "Не выдано"
+    HELD: str = "Уже выдано"
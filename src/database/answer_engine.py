@@ -0,0 +1,120 @@
+from typing import Optional
+from sqlalchemy import select, update, insert, case, func, true, literal, String
+from sqlalchemy.exc import ProgrammingError
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.database.model import Users, Course, Lesson, UserProgress, ProgressAnswers, db_config
+from src.database.responses import SuccessResponse, FailedResponse
+from src.database.session import session_scope, commit, rollback
+from src.database.counters import counters
+from src.api.v1.enums import MaterialTypes, ProgressTypes
+from src.utils.logger import logger
+
+
+class AnswerEngine:
+    # Проверка ответа, списание попытки, запись ответа в журнал и серия решений - одним запросом.
+    # Счетчик прошедших урок копится в агрегаторе счетчиков и пишется в БД пакетно.
+    # Условие attempts > 0 в самом UPDATE не дает параллельным ответам уйти в минус по попыткам.
+    @staticmethod
+    def build_submit_statement(user_id: int, lesson_id: int, answer: str):
+        right = Lesson.answer_lesson == answer
+        submit = (
+            update(UserProgress)
+            .where(UserProgress.user_id == user_id)
+            .where(UserProgress.material_id == lesson_id)
+            .where(UserProgress.material_type == MaterialTypes.LECTURE)
+            .where(UserProgress.status == ProgressTypes.PROGRESS)
+            .where(UserProgress.attempts > 0)
+            .where(Lesson.id == UserProgress.material_id)
+            .where(Lesson.answer_lesson.is_not(None))
+            .where(Course.id == Lesson.course_id)
+            .where(Course.deleted_at.is_(None))
+            .values(
+                status=case((right, ProgressTypes.COMPLETED), else_=UserProgress.status),
+                attempts=case((right, UserProgress.attempts), else_=UserProgress.attempts - 1)
+            )
+            .returning(UserProgress.id, UserProgress.status, UserProgress.attempts, right.label("right"))
+            .cte("submit")
+        )
+        # Ответ дописывается в журнал, массив ответов в строке прогресса не переписывается
+        logged = (
+            insert(ProgressAnswers)
+            .from_select(["progress_id", "answer", "is_right"],
+                         select(submit.c.id, literal(answer, String), submit.c.right))
+            .returning(ProgressAnswers.id)
+            .cte("logged")
+        )
+        # Предыдущие ответы: вставленная в этом же запросе строка в них еще не видна
+        previous = (
+            select(ProgressAnswers.answer)
+            .where(ProgressAnswers.progress_id == submit.c.id)
+            .order_by(ProgressAnswers.id.desc())
+            .limit(max(db_config.ANSWERS_INLINE_LIMIT - 1, 0))
+            .subquery()
+        )
+        recent = select(func.array_agg(previous.c.answer)).scalar_subquery()
+        submitted_right = select(submit.c.right).scalar_subquery()
+        streak = (
+            update(Users)
+            .where(Users.id == user_id)
+            .where(submitted_right.is_not(None))
+            .values(success_in_a_row=case((submitted_right, Users.success_in_a_row + 1), else_=0))
+            .returning(Users.success_in_a_row)
+            .cte("streak")
+        )
+        return (
+            select(submit.c.right, submit.c.status, submit.c.attempts, recent.label("previous_answers"),
+                   streak.c.success_in_a_row, logged.c.id.label("answer_id"))
+            .select_from(submit.outerjoin(streak, true()).outerjoin(logged, true()))
+        )
+
+    @staticmethod
+    async def explain_rejection(session: AsyncSession, user_id: int, lesson_id: int, answer: str):
+        # Выполняется только если ответ не был принят, чтобы вернуть понятную ошибку
+        query = select(UserProgress.id, UserProgress.status, UserProgress.attempts, Lesson.answer_lesson,
+                       Course.deleted_at, Lesson.id.label("lesson_id")).outerjoin(
+            Lesson, Lesson.id == UserProgress.material_id).outerjoin(Course, Course.id == Lesson.course_id).where(
+            UserProgress.user_id == user_id).where(UserProgress.material_id == lesson_id).where(
+            UserProgress.material_type == MaterialTypes.LECTURE)
+        state = await session.execute(query)
+        progress = state.one_or_none()
+        if not progress:
+            return FailedResponse(status_code=404, detail="Прогресс не начат")
+        if progress.lesson_id is None or progress.deleted_at is not None:
+            return FailedResponse(status_code=404, detail=f'Урока с айди {lesson_id} не существует')
+        if progress.status == ProgressTypes.COMPLETED:
+            return FailedResponse(status_code=400, detail="Урок уже завершен")
+        if not progress.answer_lesson:
+            return FailedResponse(status_code=404, detail="У лекционного урока нет вопроса")
+        if progress.attempts is None:
+            return FailedResponse(status_code=400,
+                                  detail="У данного материала не предусмотрены попытки на ответ, либо вы не подписаны на урок")
+        # Попытки кончились (в том числе на параллельном ответе): ответ не засчитывается, но остается в журнале
+        await session.execute(insert(ProgressAnswers).values(progress_id=progress.id, answer=answer, is_right=False))
+        await commit(session)
+        return FailedResponse(status_code=403, detail="Количество попыток превысило лимит")
+
+    @classmethod
+    async def submit(cls, user_id: int, lesson_id: int, answer: str, session: Optional[AsyncSession] = None):
+        async with session_scope(session) as session:
+            try:
+                state = await session.execute(cls.build_submit_statement(user_id, lesson_id, answer))
+                submission = state.mappings().one_or_none()
+                if not submission:
+                    return await cls.explain_rejection(session, user_id, lesson_id, answer)
+                submission = dict(submission)
+                # Последние ответы от старых к новым, включая текущий
+                answers = list(reversed(submission.pop("previous_answers") or [])) + [answer]
+                limit = db_config.ANSWERS_INLINE_LIMIT
+                submission["user_answers"] = answers[-limit:] if limit > 0 else []
+                await commit(session)
+                if submission["right"]:
+                    await counters.record(session, Lesson, "lesson_num_success_peoples", lesson_id)
+                return SuccessResponse(status_code=200, data=submission)
+            except ProgrammingError as e:
+                logger.error(e)
+                await rollback(session)
+                return FailedResponse(status_code=500, detail="Ошибка при получении данных")
+            except Exception as e:
+                logger.error(e)
+                await rollback(session)
+                return FailedResponse(status_code=500, detail="Произошла непредвиденная ошибка")
@@ -8,5 +8,37 @@ class DBConfig(BaseSettings):
     HOST: str
     PORT: str
     DBNAME: str
+    # Пул соединений
+    POOL_SIZE: int = 5
+    POOL_MAX_OVERFLOW: int = 10
+    POOL_TIMEOUT: float = 30.0
+    POOL_RECYCLE: int = 1800
+    # Проверка соединения перед выдачей из пула. Без нее разорванные соединения отсеиваются только по POOL_RECYCLE
+    POOL_PRE_PING: bool = True
+    # Размер кэша подготовленных выражений на соединение (0 - отключить, например за PgBouncer)
+    STATEMENT_CACHE_SIZE: int = 100
+    # Размер кэша скомпилированных SQLAlchemy запросов на движок
+    QUERY_CACHE_SIZE: int = 500
+    # Применять миграции при запуске приложения (параллельные воркеры ждут друг друга на advisory-блокировке)
+    MIGRATE_ON_STARTUP: bool = True
+    # Пакетная запись счетчиков: окно согласованности (сек.) и порог немедленного сброса
+    COUNTER_FLUSH_INTERVAL: float = 2.0
+    COUNTER_MAX_PENDING: int = 1000
+    # Реплики для чтения через запятую (host:port), стратегия выбора (round_robin, least_connections)
+    # и интервал проверки их доступности (сек.)
+    REPLICA_HOSTS: str = ""
+    REPLICA_SELECTION: str = "round_robin"
+    REPLICA_CHECK_INTERVAL: float = 5.0
+    # Курсы с большим числом уроков удаляются в фоне: порог уроков, размер пачки удаления и период проверки (сек.)
+    COURSE_PURGE_THRESHOLD: int = 500
+    PURGE_BATCH_SIZE: int = 1000
+    PURGE_INTERVAL: float = 30.0
+    # Сколько последних ответов по уроку возвращается вместе с результатом ответа
+    ANSWERS_INLINE_LIMIT: int = 10
+    # Кэш уроков и авторства курсов в каждом воркере: число записей и предельное время жизни записи (сек.)
+    ENTITY_CACHE_SIZE: int = 10000
+    ENTITY_CACHE_TTL: float = 300.0
+    # Как часто справочник достижений перечитывается из БД (сек.)
+    BADGE_CATALOG_REFRESH_INTERVAL: float = 300.0
 
     model_config = SettingsConfigDict(env_file=env_path, extra="allow")
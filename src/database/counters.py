@@ -0,0 +1,110 @@
+import asyncio
+from collections import defaultdict
+from typing import Awaitable, Callable
+from sqlalchemy import bindparam
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.database.model import session_maker, db_config
+from src.utils.logger import logger
+
+
+class CounterAggregator:
+    # Накопление приращений горячих счетчиков в памяти процесса и их пакетная запись в БД.
+    # Вместо блокировки строки на каждый запрос - один UPDATE x = x + delta на строку раз в flush_interval.
+    def __init__(self, flush_interval: float, max_pending: int):
+        # Окно согласованности: сколько секунд приращение может не доходить до БД
+        self.flush_interval = flush_interval
+        # При таком числе ожидающих строк сброс выполняется сразу, не дожидаясь окна
+        self.max_pending = max_pending
+        self._pending: dict = defaultdict(int)
+        self._inflight: dict = {}
+        self._lock = asyncio.Lock()
+        self.flushes = 0
+        self.flushed_rows = 0
+        self.failed_flushes = 0
+        # Вызываются после каждой записи приращений в БД с айди измененных строк по (модель, колонка)
+        self.listeners: list[Callable[[dict], Awaitable]] = []
+
+    async def increment(self, model, column: str, row_id: int, delta: int = 1):
+        self._pending[(model, column, row_id)] += delta
+        if self.flush_interval <= 0 or len(self._pending) >= self.max_pending:
+            await self.flush()
+
+    async def record(self, session: AsyncSession, model, column: str, row_id: int, delta: int = 1):
+        # Внутри единицы работы приращение попадает в агрегатор только после фиксации транзакции запроса
+        if session.info.get("unit_of_work"):
+            session.info.setdefault("counter_deltas", []).append((model, column, row_id, delta))
+        else:
+            await self.increment(model, column, row_id, delta)
+
+    async def accept(self, session: AsyncSession):
+        for model, column, row_id, delta in session.info.pop("counter_deltas", []):
+            await self.increment(model, column, row_id, delta)
+
+    def pending(self, model, column: str, row_id: int) -> int:
+        key = (model, column, row_id)
+        return self._pending.get(key, 0) + self._inflight.get(key, 0)
+
+    def merge(self, model, row: dict, *columns: str) -> dict:
+        # Подмешивает еще не записанные приращения в прочитанную строку (словарь колонок), на месте
+        for column in columns:
+            if row.get(column) is not None:
+                row[column] += self.pending(model, column, row["id"])
+        return row
+
+    async def flush(self):
+        async with self._lock:
+            if not self._pending:
+                return
+            self._inflight, self._pending = self._pending, defaultdict(int)
+            batches = defaultdict(list)
+            for (model, column, row_id), delta in sorted(self._inflight.items(), key=lambda item: item[0][2]):
+                if delta:
+                    batches[(model, column)].append({"row_id": row_id, "delta": delta})
+            try:
+                async with session_maker() as session:
+                    for (model, column), params in batches.items():
+                        table = model.__table__
+                        query = table.update().where(table.c.id == bindparam("row_id")).values(
+                            {column: table.c[column] + bindparam("delta")})
+                        await session.execute(query, params)
+                    await session.commit()
+                    # Приращения уже в БД: чтения во время уведомления не должны учитывать их второй раз
+                    self._inflight = {}
+            except Exception as e:
+                logger.error(e)
+                # Ошибка после фиксации (при закрытии сессии) не отменяет записи
+                if self._inflight:
+                    self.failed_flushes += 1
+                    # Приращения возвращаются в очередь и будут записаны при следующем сбросе
+                    for key, delta in self._inflight.items():
+                        self._pending[key] += delta
+                    self._inflight = {}
+                    return
+            self.flushes += 1
+            self.flushed_rows += sum(len(params) for params in batches.values())
+            await self.notify({key: [param["row_id"] for param in params] for key, params in batches.items()})
+
+    async def notify(self, rows: dict):
+        for listener in self.listeners:
+            try:
+                await listener(rows)
+            except Exception as e:
+                logger.error(e)
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(max(self.flush_interval, 0.1))
+            await self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._pending),
+            "flush_interval": self.flush_interval,
+            "flushes": self.flushes,
+            "flushed_rows": self.flushed_rows,
+            "failed_flushes": self.failed_flushes
+        }
+
+
+counters = CounterAggregator(flush_interval=db_config.COUNTER_FLUSH_INTERVAL,
+                             max_pending=db_config.COUNTER_MAX_PENDING)
@@ -0,0 +1,70 @@
+from dataclasses import dataclass, fields
+from typing import Any, Optional
+
+
+# Неизменяемые снимки строк, которые возвращает слой методов. Строятся прямо из кортежей результата,
+# не попадают в карту идентичности сессии и остаются валидными после commit без копирования
+
+
+@dataclass(frozen=True, slots=True)
+class CourseDTO:
+    id: int
+    course_title: str
+    author: str
+    desc: Optional[str]
+    course_categories: str
+    course_num_peoples: int
+    num_lessons: int
+
+
+@dataclass(frozen=True, slots=True)
+class LessonDTO:
+    # Урок может быть прочитан частично (только запрошенные поля), остальные поля тогда None
+    id: int
+    course_id: Optional[int] = None
+    lesson_title: Optional[str] = None
+    lesson_type: Optional[str] = None
+    desc: Optional[str] = None
+    material: Optional[str] = None
+    question_lesson: Optional[str] = None
+    answer_lesson: Optional[str] = None
+    attempts: Optional[int] = None
+    lesson_num_success_peoples: Optional[int] = None
+    level: Optional[int] = None
+    pos: Optional[int] = None
+
+
+@dataclass(frozen=True, slots=True)
+class TaskDTO:
+    id: int
+    task: Any
+    answer: Any
+    user_id: int
+    lesson_id: Optional[int]
+    status: str
+
+
+@dataclass(frozen=True, slots=True)
+class BadgeDTO:
+    id: int
+    code: str
+    badge_name: str
+    badge_type: str
+    desc: str
+    emoji: Optional[str]
+
+
+@dataclass(frozen=True, slots=True)
+class BadgeContext:
+    # Снимок показателей пользователя, по которому проверяются все правила выдачи достижений
+    user_id: int
+    success_in_a_row: int
+    completed_lessons: int
+    started_courses: int
+    completed_tasks: int
+    badge_ids: frozenset
+
+
+def columns(dto, model, names: Optional[tuple] = None) -> list:
+    # Колонки модели в порядке полей DTO (или только перечисленные)
+    return [getattr(model, name) for name in names or tuple(field.name for field in fields(dto))]
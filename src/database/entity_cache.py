@@ -0,0 +1,108 @@
+import uuid
+from typing import Any, Hashable, Optional
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.database.model import session_maker, db_config, Course, Lesson
+from src.database.counters import counters
+from src.utils.cache import TTLCache, MISSING
+
+# Версия каталога меняется при любом изменении курсов, по ней проверяется актуальность поисковой выдачи
+CATALOG_KEY = "catalog"
+
+
+def course_key(course_id: int) -> str:
+    # Данные курса и всех его уроков
+    return f"course:{course_id}"
+
+
+def lesson_key(lesson_id: int) -> str:
+    return f"lesson:{lesson_id}"
+
+
+def stats_key(course_id: int) -> str:
+    # Счетчики курса и его уроков, меняется при записи накопленных приращений в БД
+    return f"stats:{course_id}"
+
+
+class LocalVersionStore:
+    # Версии сущностей в памяти процесса - замена общего хранилища (Redis: MGET/INCR), через которое кэши
+    # всех воркеров узнают об изменениях. Другой бэкенд должен реализовать те же методы и epoch
+    def __init__(self):
+        self._versions: dict[str, int] = {}
+        # Версии начинаются заново с каждым процессом, epoch отличает их от версий прошлого запуска
+        self.epoch = uuid.uuid4().hex
+
+    async def get_many(self, keys: list) -> list:
+        return [self._versions.get(key, 0) for key in keys]
+
+    async def bump_many(self, keys: list):
+        for key in keys:
+            self._versions[key] = self._versions.get(key, 0) + 1
+
+
+class EntityCache:
+    # Кэш чтения перед БД: локальный LRU с TTL в каждом воркере. Запись хранит версии сущностей, из которых
+    # собрана, и отдается, только пока они совпадают с версиями в общем хранилище. Изменение сущности
+    # увеличивает ее версию после фиксации транзакции, поэтому старые записи во всех воркерах перестают отдаваться
+    def __init__(self, store: LocalVersionStore, maxsize: int, ttl: float):
+        self.store = store
+        self._local = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.stale = 0
+        self.invalidations = 0
+
+    async def get(self, key: Hashable, session: Optional[AsyncSession] = None):
+        entry = self._local.get(key)
+        if entry is MISSING:
+            return MISSING
+        versions, value = entry
+        # Запрос, который сам изменил сущность, до фиксации читает ее из своей транзакции
+        pending = session.info.get("cache_entities", ()) if session is not None else ()
+        current = await self.store.get_many([entity for entity, _ in versions])
+        if any(entity in pending for entity, _ in versions) or current != [version for _, version in versions]:
+            self._local.pop(key)
+            self.stale += 1
+            return MISSING
+        return value
+
+    async def versions(self, *entities: str) -> tuple:
+        # Версии берутся до чтения из БД: если сущность изменится во время чтения, запись сразу будет устаревшей
+        return tuple(zip(entities, await self.store.get_many(list(entities))))
+
+    def set(self, key: Hashable, value: Any, versions: tuple):
+        self._local.set(key, (versions, value))
+
+    async def invalidate(self, session: Optional[AsyncSession], *entities: str):
+        # Внутри единицы работы версии увеличиваются только после фиксации транзакции запроса
+        if session is not None and session.info.get("unit_of_work"):
+            session.info.setdefault("cache_entities", set()).update(entities)
+        else:
+            await self.bump(entities)
+
+    async def accept(self, session: AsyncSession):
+        entities = session.info.pop("cache_entities", None)
+        if entities:
+            await self.bump(entities)
+
+    async def bump(self, entities):
+        await self.store.bump_many(list(entities))
+        self.invalidations += len(entities)
+
+    def stats(self) -> dict:
+        return {**self._local.stats(), "stale": self.stale, "invalidations": self.invalidations}
+
+
+async def counters_flushed(rows: dict):
+    course_ids = set()
+    for (model, _), row_ids in rows.items():
+        if model is Course:
+            course_ids.update(row_ids)
+        elif model is Lesson:
+            async with session_maker() as session:
+                query = select(Lesson.course_id).where(Lesson.id.in_(row_ids)).distinct()
+                course_ids.update((await session.execute(query)).scalars())
+    if course_ids:
+        await entity_cache.bump([stats_key(course_id) for course_id in course_ids] + [CATALOG_KEY])
+
+
+entity_cache = EntityCache(LocalVersionStore(), maxsize=db_config.ENTITY_CACHE_SIZE, ttl=db_config.ENTITY_CACHE_TTL)
+counters.listeners.append(counters_flushed)
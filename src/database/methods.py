@@ -1,6 +1,18 @@
-from src.database.model import session_maker
-from src.database.model import Users, Course, Lesson, UserProgress, AiTasks, Badges, UserBadges
-from sqlalchemy import select, exists, cast, String, update, ARRAY, delete
+from src.database.session import session_scope, commit, rollback
+from src.database.counters import counters
+from src.database import ordering, statements
+from src.database.dto import CourseDTO, LessonDTO, TaskDTO, BadgeDTO, BadgeContext, columns
+from src.database.entity_cache import entity_cache, course_key, lesson_key, stats_key, CATALOG_KEY
+from src.utils.cache import MISSING
+from src.database.purge import purger, cascade_delete
+from src.database.pagination import paginate, page, estimate_count, InvalidCursor
+from src.database.projections import (COURSE_FIELDS, LESSON_SUMMARY_FIELDS, TASK_FIELDS, TASK_JSON_FIELDS,
+                                      InvalidFields, parse_fields, select_fields, project)
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.database.model import (Users, Course, Lesson, UserProgress, ProgressAnswers, AiTasks, Badges, UserBadges,
+                                 RefreshTokens, db_config)
+from sqlalchemy import select, update, insert, ARRAY, delete, func, REAL
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from src.utils.logger import logger
 from src.api.v1.schemas import auth_schema as auth_m
 from src.api.v1.schemas import course_schema as course_m
@@ -9,61 +21,65 @@ from src.api.v1.schemas import lesson_schema as lesson_m
 from src.api.v1.schemas import tasks_schema as task_m
 from sqlalchemy.exc import IntegrityError, ProgrammingError
 from src.database.responses import SuccessResponse, FailedResponse
-from src.api.v1.enums import MaterialTypes, ProgressTypes, LessonTypes
-from src.badges.achievments import Achievement
+from src.api.v1.enums import MaterialTypes, ProgressTypes, LessonTypes, TokenStatus
 from src.api.v1.methods.patch_allow_attr import COURSE_PATCH_ALLOW_ATTR, LESSON_PATCH_ALLOW_ATTR
+from src.api.v1.methods.principal_cache import invalidate_user
 from typing import Optional
-from copy import deepcopy
+from datetime import datetime
+import re
 
 
 class UserMethods:
     @classmethod
-    async def register_user(cls, personal_info: auth_m.RegResponse):
-        async with session_maker() as session:
+    async def register_user(cls, personal_info: auth_m.RegResponse, session: Optional[AsyncSession] = None):
+        async with session_scope(session) as session:
             try:
                 dumped_model = personal_info.model_dump()
                 new_user = Users(**dumped_model)
                 session.add(new_user)
-                await session.commit()
+                await commit(session)
+                # Сброс закэшированных данных о пользователе с таким же логином
+                invalidate_user(session, username=new_user.username)
                 return SuccessResponse(status_code=200, data=dumped_model)
 
             except IntegrityError as e:
                 logger.error(e)
-                await session.rollback()
+                await rollback(session)
                 return FailedResponse(status_code=409, detail="Пользователь уже существует")
             except ProgrammingError as e:
                 logger.error(e)
-                await session.rollback()
+                await rollback(session)
                 return FailedResponse(status_code=500, detail="Ошибка при получении данных")
             except Exception as e:
                 logger.error(e)
-                await session.rollback()
+                await rollback(session)
                 return FailedResponse(status_code=500, detail="Произошла непредвиденная ошибка")
 
     @classmethod
-    async def get_hash_password(cls, username: str):
-        async with session_maker() as session:
+    async def get_credentials(cls, username: str, session: Optional[AsyncSession] = None):
+        async with session_scope(session) as session:
             try:
-                query = select(Users.password).where(Users.username == str(username))
-                password = await session.execute(query)
-                scalar = password.scalar()
-                if scalar:
-                    return SuccessResponse(status_code=200, data=scalar)
+                # Хеш пароля, айди и роль одним запросом
+                query = statements.user_credentials(str(username))
+                state = await session.execute(query)
+                credentials = state.mappings().one_or_none()
+                if credentials:
+                    return SuccessResponse(status_code=200, data=credentials)
                 return FailedResponse(status_code=404, detail="Пользователя не существует")
             except ProgrammingError as e:
                 logger.error(e)
-                await session.rollback()
+                await rollback(session)
                 return FailedResponse(status_code=500, detail="Ошибка при получении данных")
             except Exception as e:
                 logger.error(e)
-                await session.rollback()
+                await rollback(session)
                 return FailedResponse(status_code=500, detail="Произошла непредвиденная ошибка")
 
     @classmethod
-    async def get_user(cls, user_id: int):
-        async with session_maker() as session:
+    async def get_user(cls, user_id: int, session: Optional[AsyncSession] = None):
+        async with session_scope(session) as session:
             try:
-                query = select(Users).where(Users.id == user_id)
+                query = statements.user_by_id(user_id)
                 state = await session.execute(query)
                 user = state.scalar_one_or_none()
                 if user:
@@ -71,18 +87,18 @@ class UserMethods:
                 return FailedResponse(status_code=404, detail="Пользователя не существует")
             except ProgrammingError as e:
                 logger.error(e)
-                await session.rollback()
+                await rollback(session)
                 return FailedResponse(status_code=500, detail="Ошибка при получении данных")
             except Exception as e:
                 logger.error(e)
-                await session.rollback()
+                await rollback(session)
                 return FailedResponse(status_code=500, detail="Произошла непредвиденная ошибка")
 
     @classmethod
-    async def get_user_id(cls, username: str):
-        async with session_maker() as session:
+    async def get_user_id(cls, username: str, session: Optional[AsyncSession] = None):
+        async with session_scope(session) as session:
             try:
-                query = select(Users.id).where(Users.username == str(username))
+                query = statements.user_id_by_name(str(username))
                 user_id = await session.execute(query)
                 scalar = user_id.scalar()
                 if scalar:
@@ -90,107 +106,126 @@ class UserMethods:
                 return FailedResponse(status_code=404, detail="Пользователя не существует")
             except ProgrammingError as e:
                 logger.error(e)
-                await session.rollback()
+                await rollback(session)
                 return FailedResponse(status_code=500, detail="Ошибка при получении данных")
             except Exception as e:
                 logger.error(e)
-                await session.rollback()
+                await rollback(session)
                 return FailedResponse(status_code=500, detail="Произошла непредвиденная ошибка")
 
+
+class CourseMethods:
     @classmethod
-    async def update_success_in_a_row(cls, user_id: int, bias: Optional[int] = 1, reset: bool = False):
-        async with session_maker() as session:
+    async def add_course(cls, course: course_m.CourseAddModel, session: Optional[AsyncSession] = None):
+        async with session_scope(session) as session:
             try:
-                query = select(Users).where(Users.id == user_id)
-                state = await session.execute(query)
-                user = state.scalar_one_or_none()
-                if not user:
-                    return FailedResponse(status_code=404, detail="Пользователь не найден")
-                if not reset:
-                    user.success_in_a_row = user.success_in_a_row + bias
-                else:
-                    user.success_in_a_row = 0
-                await session.commit()
-                return SuccessResponse(status_code=200, data=True)
+                dumped_model = course.model_dump()
+                new_course = Course(**dumped_model)
+                session.add(new_course)
+                await commit(session)
+                await entity_cache.invalidate(session, CATALOG_KEY)
+                return SuccessResponse(status_code=200, data=dumped_model)
             except ProgrammingError as e:
                 logger.error(e)
-                await session.rollback()
+                await rollback(session)
                 return FailedResponse(status_code=500, detail="Ошибка при получении данных")
             except Exception as e:
                 logger.error(e)
-                await session.rollback()
+                await rollback(session)
                 return FailedResponse(status_code=500, detail="Произошла непредвиденная ошибка")
 
-
-class CourseMethods:
     @classmethod
-    async def add_course(cls, course: course_m.CourseAddModel):
-        async with session_maker() as session:
+    async def import_course(cls, course: course_m.CourseAddModel, lessons: list[lesson_m.LessonData],
+                            session: Optional[AsyncSession] = None):
+        async with session_scope(session) as session:
             try:
-                dumped_model = course.model_dump()
-                new_course = Course(**dumped_model)
-                session.add(new_course)
-                await session.commit()
-                return SuccessResponse(status_code=200, data=dumped_model)
+                # Все уроки проверяются за один проход, чтобы вернуть сразу все ошибки
+                rows, errors = [], []
+                for index, lesson in enumerate(lessons):
+                    try:
+                        rows.append({**lesson.model_dump(), "lesson_type": lesson.resolve_type(),
+                                     "pos": (index + 1) * ordering.POS_GAP, "lesson_num_success_peoples": 0})
+                    except ValueError as e:
+                        errors.append({"index": index, "field": None, "message": str(e)})
+                if errors:
+                    return FailedResponse(status_code=400, detail={"errors": errors})
+                # Курс создается сразу с итоговым количеством уроков, позиции уроков - по порядку в импорте
+                query = insert(Course).values(**course.model_dump(exclude={"num_lessons"}),
+                                              num_lessons=len(rows)).returning(Course.id)
+                course_id = (await session.execute(query)).scalar_one()
+                if rows:
+                    # Один executemany: драйвер отправляет уроки пачками многострочных INSERT
+                    await session.execute(insert(Lesson), [{**row, "course_id": course_id} for row in rows])
+                await commit(session)
+                await entity_cache.invalidate(session, CATALOG_KEY)
+                return SuccessResponse(status_code=200, data={"course_id": course_id, "num_lessons": len(rows)})
             except ProgrammingError as e:
                 logger.error(e)
-                await session.rollback()
+                await rollback(session)
                 return FailedResponse(status_code=500, detail="Ошибка при получении данных")
             except Exception as e:
                 logger.error(e)
-                await session.rollback()
+                await rollback(session)
                 return FailedResponse(status_code=500, detail="Произошла непредвиденная ошибка")
 
     @classmethod
-    async def update_course(cls, course_id, changes: dict):
-        async with session_maker() as session:
+    async def update_course(cls, course_id, changes: dict, session: Optional[AsyncSession] = None):
+        async with session_scope(session) as session:
             try:
-                query = select(Course).where(Course.id == course_id)
-                state = await session.execute(query)
-                course = state.scalar_one_or_none()
-                if not course:
-                    return FailedResponse(status_code=404, detail="Курс не найден")
-                for attr, change in changes.items():
-                    if hasattr(course, attr):
-                        if attr not in COURSE_PATCH_ALLOW_ATTR:
-                            return FailedResponse(status_code=404, detail=f"Вы не можете изменить атрибут '{attr}'")
-                        setattr(course, attr, change)
-                    else:
+                for attr in changes:
+                    if not hasattr(Course, attr):
                         return FailedResponse(status_code=404, detail=f"Атрибута '{attr}' не существует")
-                copy_course = deepcopy(course)
-                await session.commit()
-                return SuccessResponse(status_code=200, data=copy_course)
+                    if attr not in COURSE_PATCH_ALLOW_ATTR:
+                        return FailedResponse(status_code=404, detail=f"Вы не можете изменить атрибут '{attr}'")
+                # Изменение и новое состояние строки одним запросом, объект в сессию не загружается
+                returned = columns(CourseDTO, Course)
+                query = select(*returned).where(Course.id == course_id)
+                if changes:
+                    query = update(Course).where(Course.id == course_id).values(changes).returning(
+                        *returned).execution_options(synchronize_session=False)
+                row = (await session.execute(query)).one_or_none()
+                if not row:
+                    return FailedResponse(status_code=404, detail="Курс не найден")
+                await commit(session)
+                await entity_cache.invalidate(session, course_key(course_id), CATALOG_KEY)
+                return SuccessResponse(status_code=200,
+                                       data=CourseDTO(**counters.merge(Course, row._asdict(), "course_num_peoples")))
             except ProgrammingError as e:
                 logger.error(e)
-                await session.rollback()
+                await rollback(session)
                 return FailedResponse(status_code=500, detail="Ошибка при получении данных")
             except Exception as e:
                 logger.error(e)
-                await session.rollback()
+                await rollback(session)
                 return FailedResponse(status_code=500, detail="Произошла непредвиденная ошибка")
 
     @classmethod
-    async def delete_course(cls, course_id):
-        async with session_maker() as session:
+    async def delete_course(cls, course_id, session: Optional[AsyncSession] = None):
+        async with session_scope(session) as session:
             try:
-                query = select(Course).where(Course.id == course_id)
-                state = await session.execute(query)
-                course = state.scalar_one_or_none()
-                if not course:
+                query = select(Course.num_lessons).where(Course.id == course_id).where(
+                    Course.deleted_at.is_(None)).with_for_update()
+                num_lessons = (await session.execute(query)).scalar()
+                if num_lessons is None:
                     return FailedResponse(status_code=404, detail="Курс не найден")
-                await session.delete(course)
-                response = await LessonMethods.delete_all_lessons(course_id)
-                if isinstance(response, FailedResponse):
-                    return FailedResponse(status_code=response.status_code, detail=response.detail)
-                await session.commit()
-                return SuccessResponse(status_code=200, data=True)
+                if num_lessons > db_config.COURSE_PURGE_THRESHOLD:
+                    # Большой курс только помечается удаленным, его строки удаляются в фоне
+                    await session.execute(update(Course).where(Course.id == course_id).values(deleted_at=func.now()))
+                    await commit(session)
+                    await entity_cache.invalidate(session, course_key(course_id), CATALOG_KEY)
+                    purger.notify()
+                    return SuccessResponse(status_code=200, data={"purged": False})
+                await cascade_delete(session, course_id)
+                await commit(session)
+                await entity_cache.invalidate(session, course_key(course_id), CATALOG_KEY)
+                return SuccessResponse(status_code=200, data={"purged": True})
             except ProgrammingError as e:
                 logger.error(e)
-                await session.rollback()
+                await rollback(session)
                 return FailedResponse(status_code=500, detail="Ошибка при получении данных")
             except Exception as e:
                 logger.error(e)
-                await session.rollback()
+                await rollback(session)
                 return FailedResponse(status_code=500, detail="Произошла непредвиденная ошибка")
 
     @staticmethod
@@ -201,53 +236,66 @@ class CourseMethods:
             return SuccessResponse(status_code=200, data="Количество лекций в курсе обновлено.")
         except ProgrammingError as e:
             logger.error(e)
-            await session.rollback()
+            await rollback(session)
             return FailedResponse(status_code=500, detail="Ошибка при получении данных")
         except Exception as e:
             logger.error(e)
-            await session.rollback()
+            await rollback(session)
             return FailedResponse(status_code=500, detail="Произошла непредвиденная ошибка")
 
     @classmethod
-    async def get_courses(cls, course_search: course_m.SearchCourse):
-        async with session_maker() as session:
+    async def get_courses(cls, course_search: course_m.SearchCourse, session: Optional[AsyncSession] = None):
+        async with session_scope(session) as session:
             try:
-                course_name = course_search.course_name
-                course_id = course_search.course_id
-                query = str()
-                if not course_name and not course_id:
-                    query = select(Course)
-                elif course_name and course_id:
-                    query = select(Course).where(cast(Course.course_title, String).contains(course_name)).where(
-                        Course.id == course_id)
-                elif course_name:
-                    query = select(Course).where(cast(Course.course_title, String).contains(course_name))
-                elif course_id:
-                    query = select(Course).where(Course.id == course_id)
-
-                result = await session.execute(query)
-                courses = result.scalars().all()
-
-                if not courses:
+                fields = parse_fields(course_search.fields, COURSE_FIELDS)
+                # С основного сервера: выдача помечается ETag (см. RoutingSession)
+                query = select(*select_fields(Course, fields)).where(Course.deleted_at.is_(None))
+                if course_search.course_id:
+                    query = query.where(Course.id == course_search.course_id)
+                # Поиск по префиксам слов через GIN-индекс по названию, описанию и категориям
+                terms = re.findall(r"\w+", (course_search.course_name or "").lower())
+                if terms:
+                    ts_query = func.to_tsquery("simple", " & ".join(f"{term}:*" for term in terms))
+                    rank = func.ts_rank(Course.search_vector, ts_query, type_=REAL)
+                    query = query.add_columns(rank.label("rank")).where(Course.search_vector.bool_op("@@")(ts_query))
+                    order, key = [rank, Course.id], lambda row: [row.rank, row.id]
+                else:
+                    order, key = [Course.id], lambda row: [row.id]
+                # Общее количество считается только для первой страницы
+                total = None if course_search.cursor else await estimate_count(session, query)
+                rows, next_cursor = await paginate(session, query, order, key, cursor=course_search.cursor,
+                                                   limit=course_search.limit, descending=True)
+                if not rows:
                     return FailedResponse(status_code=404, detail=f'По текущим фильтрам ничего не найдено')
-                return SuccessResponse(status_code=200, data=courses)
+                courses = [counters.merge(Course, row._asdict(), "course_num_peoples") for row in rows]
+                return SuccessResponse(status_code=200,
+                                       data=page([project(course, fields) for course in courses], next_cursor,
+                                                 total=total))
+            except InvalidCursor:
+                return FailedResponse(status_code=400, detail="Невалидный курсор")
+            except InvalidFields as e:
+                return FailedResponse(status_code=400, detail=f"Недопустимые поля: {e}")
             except ProgrammingError as e:
                 logger.error(e)
-                await session.rollback()
+                await rollback(session)
                 return FailedResponse(status_code=500, detail="Ошибка при получении данных")
             except Exception as e:
                 logger.error(e)
-                await session.rollback()
+                await rollback(session)
                 return FailedResponse(status_code=500, detail="Произошла непредвиденная ошибка")
 
     @classmethod
-    async def get_author(cls, course_id: int):
-        async with session_maker() as session:
+    async def get_author(cls, course_id: int, session: Optional[AsyncSession] = None):
+        async with session_scope(session) as session:
             try:
-                query = select(Course.author).where(Course.id == course_id)
-
-                result = await session.execute(query)
-                author = result.scalar()
+                key = ("author", course_id)
+                author = await entity_cache.get(key, session)
+                if author is MISSING:
+                    versions = await entity_cache.versions(course_key(course_id))
+                    result = await session.execute(statements.course_author(course_id))
+                    author = result.scalar()
+                    if author:
+                        entity_cache.set(key, author, versions)
 
                 if not author:
                     return FailedResponse(status_code=404,
@@ -255,34 +303,32 @@ class CourseMethods:
                 return SuccessResponse(status_code=200, data=author)
             except ProgrammingError as e:
                 logger.error(e)
-                await session.rollback()
+                await rollback(session)
                 return FailedResponse(status_code=500, detail="Ошибка при получении данных")
             except Exception as e:
                 logger.error(e)
-                await session.rollback()
+                await rollback(session)
                 return FailedResponse(status_code=500, detail="Произошла непредвиденная ошибка")
 
 
 class LessonMethods:
     @classmethod
-    async def add_lesson(cls, lesson: lesson_m.LessonAddModel):
-        async with session_maker() as session:
+    async def add_lesson(cls, lesson: lesson_m.LessonAddModel, session: Optional[AsyncSession] = None):
+        async with session_scope(session) as session:
             try:
                 # Дамп модели в словарь
                 dumped_model = lesson.model_dump()
-                # Проверка существования курса
+                # Проверка существования курса с блокировкой: параллельные добавления не получат одну позицию
                 course_id = dumped_model['course_id']
-                course_search = course_m.SearchCourse(course_id=course_id)
-                response = await CourseMethods.get_courses(course_search=course_search)
-
-                if isinstance(response, FailedResponse):
+                if not await ordering.lock_course(session, course_id):
                     return FailedResponse(status_code=404, detail=f'Курса с айди "{course_id}" не существует')
                 # Получение количества уроков в курсе
-                response = await cls.get_count_lessons_in_course(dumped_model['course_id'])
+                response = await cls.get_count_lessons_in_course(dumped_model['course_id'], session=session)
                 if isinstance(response, FailedResponse):
                     return FailedResponse(status_code=500, detail="Ошибка при получении данных")
-                # Добавление позиции новому уроку
-                new_dumped_model = lesson.model_copy(update={"pos": response.data}).model_dump(exclude_none=True)
+                # Новый урок встает в конец курса
+                pos = await ordering.next_pos(session, course_id)
+                new_dumped_model = lesson.model_copy(update={"pos": pos}).model_dump(exclude_none=True)
                 new_lesson = Lesson(**new_dumped_model)
                 # Изменение количества уроков в курсе на новое
                 response = await CourseMethods.update_num_lessons(session, course_id, int(response.data) + 1)
@@ -291,48 +337,53 @@ class LessonMethods:
 
                 # Добавление урока в БД
                 session.add(new_lesson)
-                await session.commit()
+                await commit(session)
+                # Изменилось и количество уроков курса в каталоге
+                await entity_cache.invalidate(session, course_key(course_id), CATALOG_KEY)
                 return SuccessResponse(status_code=200, data=new_dumped_model)
             except ProgrammingError as e:
                 logger.error(e)
-                await session.rollback()
+                await rollback(session)
                 return FailedResponse(status_code=500, detail="Ошибка при получении данных")
             except Exception as e:
                 logger.error(e)
-                await session.rollback()
+                await rollback(session)
                 return FailedResponse(status_code=500, detail="Произошла непредвиденная ошибка")
 
     @classmethod
-    async def update_lesson(cls, lesson_id, changes: dict):
-        async with session_maker() as session:
+    async def update_lesson(cls, lesson_id, changes: dict, session: Optional[AsyncSession] = None):
+        async with session_scope(session) as session:
             try:
-                query = select(Lesson).where(Lesson.id == lesson_id)
-                state = await session.execute(query)
-                lesson = state.scalar_one_or_none()
-                if not lesson:
-                    return FailedResponse(status_code=404, detail="Урока с таким айди не существует")
-                for attr, change in changes.items():
-                    if hasattr(lesson, attr):
-                        if attr not in LESSON_PATCH_ALLOW_ATTR:
-                            return FailedResponse(status_code=404, detail=f"Вы не можете изменить атрибут '{attr}'")
-                        setattr(lesson, attr, change)
-                    else:
+                for attr in changes:
+                    if not hasattr(Lesson, attr):
                         return FailedResponse(status_code=404, detail=f"Атрибута '{attr}' не существует")
-                copy_lesson = deepcopy(lesson)
-                await session.commit()
-                return SuccessResponse(status_code=200, data=copy_lesson)
+                    if attr not in LESSON_PATCH_ALLOW_ATTR:
+                        return FailedResponse(status_code=404, detail=f"Вы не можете изменить атрибут '{attr}'")
+                # Изменение и новое состояние строки одним запросом, объект в сессию не загружается
+                returned = columns(LessonDTO, Lesson)
+                query = select(*returned).where(Lesson.id == lesson_id)
+                if changes:
+                    query = update(Lesson).where(Lesson.id == lesson_id).values(changes).returning(
+                        *returned).execution_options(synchronize_session=False)
+                row = (await session.execute(query)).one_or_none()
+                if not row:
+                    return FailedResponse(status_code=404, detail="Урока с таким айди не существует")
+                await commit(session)
+                await entity_cache.invalidate(session, lesson_key(lesson_id), course_key(row.course_id))
+                return SuccessResponse(status_code=200, data=LessonDTO(
+                    **counters.merge(Lesson, row._asdict(), "lesson_num_success_peoples")))
             except ProgrammingError as e:
                 logger.error(e)
-                await session.rollback()
+                await rollback(session)
                 return FailedResponse(status_code=500, detail="Ошибка при получении данных")
             except Exception as e:
                 logger.error(e)
-                await session.rollback()
+                await rollback(session)
                 return FailedResponse(status_code=500, detail="Произошла непредвиденная ошибка")
 
     @classmethod
-    async def delete_lesson(cls, lesson_id, course_id):
-        async with session_maker() as session:
+    async def delete_lesson(cls, lesson_id, course_id, session: Optional[AsyncSession] = None):
+        async with session_scope(session) as session:
             try:
                 query = select(Lesson).where(Lesson.id == lesson_id).where(Lesson.course_id == course_id)
                 state = await session.execute(query)
@@ -340,7 +391,7 @@ class LessonMethods:
                 if not lesson:
                     return FailedResponse(status_code=404, detail="Урока с таким айди не существует, либо Вы не являетесь его автором")
 
-                response = await cls.get_count_lessons_in_course(lesson.course_id)
+                response = await cls.get_count_lessons_in_course(lesson.course_id, session=session)
                 if isinstance(response, FailedResponse):
                     return FailedResponse(status_code=500, detail="Ошибка при получении данных о количестве лекций")
                 num_lessons_in_course = response.data
@@ -348,172 +399,185 @@ class LessonMethods:
                 if isinstance(response, FailedResponse):
                     return FailedResponse(status_code=500, detail="Ошибка при получении данных о лекциях")
                 await session.delete(lesson)
-                await session.commit()
+                await commit(session)
+                await entity_cache.invalidate(session, lesson_key(lesson_id), course_key(course_id), CATALOG_KEY)
                 return SuccessResponse(status_code=200, data=True)
             except ProgrammingError as e:
                 logger.error(e)
-                await session.rollback()
+                await rollback(session)
                 return FailedResponse(status_code=500, detail="Ошибка при получении данных")
             except Exception as e:
                 logger.error(e)
-                await session.rollback()
+                await rollback(session)
                 return FailedResponse(status_code=500, detail="Произошла непредвиденная ошибка")
 
     @classmethod
-    async def delete_all_lessons(cls, course_id):
-        async with session_maker() as session:
+    async def reorder_lessons(cls, course_id, lesson_ids: list, after_id: Optional[int] = None,
+                              session: Optional[AsyncSession] = None):
+        async with session_scope(session) as session:
             try:
-                query = select(Lesson).where(Lesson.course_id == course_id)
-                state = await session.execute(query)
-                lessons = state.scalars().all()
-                if not lessons:
-                    return FailedResponse(status_code=404, detail="Уроков в этом курсе нет")
-
-                for lesson in lessons:
-                    await session.delete(lesson)
-                await session.commit()
-                return SuccessResponse(status_code=200, data=True)
+                if not await ordering.lock_course(session, course_id):
+                    return FailedResponse(status_code=404, detail=f'Курса с айди "{course_id}" не существует')
+                positions = await ordering.move(session, course_id, lesson_ids, after_id)
+                await commit(session)
+                # Позиции входят в данные уроков, которые зависят от версии курса
+                await entity_cache.invalidate(session, course_key(course_id))
+                return SuccessResponse(status_code=200, data=positions)
+            except ordering.InvalidMove as e:
+                await rollback(session)
+                return FailedResponse(status_code=400, detail=str(e))
             except ProgrammingError as e:
                 logger.error(e)
-                await session.rollback()
+                await rollback(session)
                 return FailedResponse(status_code=500, detail="Ошибка при получении данных")
             except Exception as e:
                 logger.error(e)
-                await session.rollback()
+                await rollback(session)
                 return FailedResponse(status_code=500, detail="Произошла непредвиденная ошибка")
 
     @classmethod
-    async def get_lesson(cls, lesson_id):
-        async with session_maker() as session:
+    async def delete_all_lessons(cls, course_id, session: Optional[AsyncSession] = None):
+        async with session_scope(session) as session:
             try:
-                query = select(Lesson).where(Lesson.id == lesson_id)
-
-                result = await session.execute(query)
-                lesson = result.scalar()
-
-                if not lesson:
-                    return FailedResponse(status_code=404, detail=f'Урока с айди {lesson_id} не существует')
-                return SuccessResponse(status_code=200, data=lesson)
+                query = delete(Lesson).where(Lesson.course_id == course_id).execution_options(
+                    synchronize_session=False)
+                state = await session.execute(query)
+                if not state.rowcount:
+                    return FailedResponse(status_code=404, detail="Уроков в этом курсе нет")
+                await commit(session)
+                await entity_cache.invalidate(session, course_key(course_id))
+                return SuccessResponse(status_code=200, data=True)
             except ProgrammingError as e:
                 logger.error(e)
-                await session.rollback()
+                await rollback(session)
                 return FailedResponse(status_code=500, detail="Ошибка при получении данных")
             except Exception as e:
                 logger.error(e)
-                await session.rollback()
+                await rollback(session)
                 return FailedResponse(status_code=500, detail="Произошла непредвиденная ошибка")
 
     @classmethod
-    async def get_lessons_in_course(cls, course_id):
-        async with session_maker() as session:
+    async def get_lesson(cls, lesson_id, fields: Optional[tuple] = None, session: Optional[AsyncSession] = None):
+        async with session_scope(session) as session:
             try:
-                query = select(Lesson).where(Lesson.course_id == course_id)
-
-                result = await session.execute(query)
-                lessons = result.scalars().all()
-
-                if not lessons:
-                    return FailedResponse(status_code=404,
-                                          detail=f'В курсе нет лекций, либо его попросту не существует')
-                return SuccessResponse(status_code=200, data=lessons)
+                # Курс нужен всегда: запись кэша зависит от версий урока, его курса и счетчиков курса
+                fields = tuple(dict.fromkeys(fields + ("course_id",))) if fields else None
+                key = ("lesson", lesson_id, fields)
+                row = await entity_cache.get(key, session)
+                if row is MISSING:
+                    # Версии всех зависимостей читаются до строки урока, поэтому курс урока нужен заранее.
+                    # Урок не переносится между курсами, и связь кэшируется без версий
+                    course_id = await entity_cache.get(("lesson_course", lesson_id))
+                    if course_id is MISSING:
+                        course_id = (await session.execute(statements.lesson_course(lesson_id))).scalar()
+                        if course_id is not None:
+                            entity_cache.set(("lesson_course", lesson_id), course_id, ())
+                    row = None
+                    if course_id is not None:
+                        versions = await entity_cache.versions(lesson_key(lesson_id), course_key(course_id),
+                                                               stats_key(course_id))
+                        result = await session.execute(statements.lesson_by_id(lesson_id, fields))
+                        row = result.one_or_none()
+                        if row:
+                            row = row._asdict()
+                            entity_cache.set(key, row, versions)
+
+                if not row:
+                    return FailedResponse(status_code=404, detail=f'Урока с айди {lesson_id} не существует')
+                # Запись кэша устаревает при записи счетчиков в БД, непереданные приращения подмешиваются при каждом чтении
+                return SuccessResponse(status_code=200, data=LessonDTO(
+                    **counters.merge(Lesson, dict(row), "lesson_num_success_peoples")))
             except ProgrammingError as e:
                 logger.error(e)
-                await session.rollback()
+                await rollback(session)
                 return FailedResponse(status_code=500, detail="Ошибка при получении данных")
             except Exception as e:
                 logger.error(e)
-                await session.rollback()
+                await rollback(session)
                 return FailedResponse(status_code=500, detail="Произошла непредвиденная ошибка")
 
     @classmethod
-    async def check_answer_lesson(cls, body: lesson_m.AnswerLesson):
-        async with session_maker() as session:
+    async def get_lesson_material(cls, lesson_id, session: Optional[AsyncSession] = None):
+        async with session_scope(session) as session:
             try:
-                lesson_id = body.lesson_id
-                user_answer = body.answer
-
-                response = await cls.get_answer_in_lesson(lesson_id)
-                if isinstance(response, FailedResponse):
-                    return FailedResponse(status_code=response.status_code, detail=response.detail)
-                if user_answer != response.data:
-                    return SuccessResponse(status_code=200, data=False)
-                return SuccessResponse(status_code=200, data=True)
-
-
+                # С основного сервера: ответ помечается ETag (см. RoutingSession)
+                query = select(Lesson.id, Lesson.lesson_title, Lesson.material).where(Lesson.id == lesson_id)
+                result = await session.execute(query)
+                material = result.mappings().one_or_none()
+                if not material:
+                    return FailedResponse(status_code=404, detail=f'Урока с айди {lesson_id} не существует')
+                return SuccessResponse(status_code=200, data=dict(material))
             except ProgrammingError as e:
                 logger.error(e)
-                await session.rollback()
+                await rollback(session)
                 return FailedResponse(status_code=500, detail="Ошибка при получении данных")
             except Exception as e:
                 logger.error(e)
-                await session.rollback()
+                await rollback(session)
                 return FailedResponse(status_code=500, detail="Произошла непредвиденная ошибка")
 
     @classmethod
-    async def add_success_lesson_people(cls, lesson_id):
-        async with session_maker() as session:
+    async def get_lessons_in_course(cls, course_id, limit: Optional[int] = None, cursor: Optional[str] = None,
+                                    fields: Optional[str] = None, session: Optional[AsyncSession] = None):
+        async with session_scope(session) as session:
             try:
-                query = select(Lesson).where(Lesson.id == lesson_id)
-                state = await session.execute(query)
-                lesson = state.scalar_one_or_none()
-                if isinstance(lesson, FailedResponse):
-                    return FailedResponse(status_code=404, detail=f"Урока с айди {lesson_id} не существует")
-                lesson.lesson_num_success_peoples = lesson.lesson_num_success_peoples + 1
-                await session.commit()
-                return SuccessResponse(status_code=200, data=True)
-
-
-            except ProgrammingError as e:
-                logger.error(e)
-                await session.rollback()
-                return FailedResponse(status_code=500, detail="Ошибка при получении данных")
-            except Exception as e:
-                logger.error(e)
-                await session.rollback()
-                return FailedResponse(status_code=500, detail="Произошла непредвиденная ошибка")
-
-    @staticmethod
-    async def get_answer_in_lesson(lesson_id):
-        async with session_maker() as session:
-            try:
-                query = select(Lesson.answer_lesson).where(Lesson.id == lesson_id)
-                state = await session.execute(query)
-                answer = state.scalar()
-                if not answer:
+                # Только краткие данные уроков: материал отдается отдельным запросом, ответ не отдается вовсе
+                fields = parse_fields(fields, LESSON_SUMMARY_FIELDS)
+                # Уроки удаленного курса не отдаются, пока их не удалила фоновая очистка
+                active = select(Course.id).where(Course.id == course_id).where(Course.deleted_at.is_(None))
+                # С основного сервера: выдача помечается ETag (см. RoutingSession)
+                query = select(*select_fields(Lesson, fields, "pos")).where(
+                    Lesson.course_id == course_id).where(active.exists())
+                rows, next_cursor = await paginate(session, query, [Lesson.pos, Lesson.id],
+                                                   key=lambda row: [row.pos, row.id], cursor=cursor, limit=limit)
+                if not rows:
                     return FailedResponse(status_code=404,
-                                          detail=f'У лекционного урока нет вопроса')
-                return SuccessResponse(status_code=200, data=answer)
+                                          detail=f'В курсе нет лекций, либо его попросту не существует')
+                lessons = [counters.merge(Lesson, row._asdict(), "lesson_num_success_peoples") for row in rows]
+                return SuccessResponse(status_code=200,
+                                       data=page([project(lesson, fields) for lesson in lessons], next_cursor))
+            except InvalidCursor:
+                return FailedResponse(status_code=400, detail="Невалидный курсор")
+            except InvalidFields as e:
+                return FailedResponse(status_code=400, detail=f"Недопустимые поля: {e}")
             except ProgrammingError as e:
                 logger.error(e)
-                await session.rollback()
+                await rollback(session)
                 return FailedResponse(status_code=500, detail="Ошибка при получении данных")
             except Exception as e:
                 logger.error(e)
-                await session.rollback()
+                await rollback(session)
                 return FailedResponse(status_code=500, detail="Произошла непредвиденная ошибка")
 
+    @classmethod
+    async def add_success_lesson_people(cls, lesson_id, session: Optional[AsyncSession] = None):
+        async with session_scope(session) as session:
+            # Приращение уходит в агрегатор счетчиков, строка урока не блокируется
+            await counters.record(session, Lesson, "lesson_num_success_peoples", lesson_id)
+            return SuccessResponse(status_code=200, data=True)
+
     @staticmethod
-    async def get_count_lessons_in_course(course_id: int):
-        async with session_maker() as session:
+    async def get_count_lessons_in_course(course_id: int, session: Optional[AsyncSession] = None):
+        async with session_scope(session) as session:
             try:
-                query = select(Lesson).where(Lesson.course_id == course_id)
+                query = select(func.count()).select_from(Lesson).where(Lesson.course_id == course_id)
                 result = await session.execute(query)
-                num_lessons = len(result.scalars().all())
+                num_lessons = result.scalar_one()
                 return SuccessResponse(status_code=200, data=num_lessons)
             except ProgrammingError as e:
                 logger.error(e)
-                await session.rollback()
+                await rollback(session)
                 return FailedResponse(status_code=500, detail="Ошибка при получении данных")
             except Exception as e:
                 logger.error(e)
-                await session.rollback()
+                await rollback(session)
                 return FailedResponse(status_code=500, detail="Произошла непредвиденная ошибка")
 
 
 class ProgressMethods:
     @classmethod
-    async def start_material(cls, progress: user_m.UserAddProgress):
-        async with session_maker() as session:
+    async def start_material(cls, progress: user_m.UserAddProgress, session: Optional[AsyncSession] = None):
+        async with session_scope(session) as session:
             try:
                 dumped_model = progress.model_dump(exclude_none=True)
                 material_type = dumped_model.get("material_type")
@@ -523,44 +587,46 @@ class ProgressMethods:
                     return FailedResponse(status_code=400, detail="Не указан тип материала")
                 if material_type == MaterialTypes.COURSE:
                     # Проверка наличия курса
-                    course_search = course_m.SearchCourse(course_id=material_id)
-                    response = await CourseMethods.get_courses(course_search=course_search)
+                    course_search = course_m.SearchCourse(course_id=material_id, fields="id")
+                    response = await CourseMethods.get_courses(course_search=course_search, session=session)
                     if isinstance(response, FailedResponse):
                         return FailedResponse(status_code=404, detail=f'Материала не существует')
                     # Проверка на дубликат прогресса
                     response = await cls.get_progress(material_id=material_id, user_id=user_id,
-                                                      material_type=MaterialTypes.COURSE)
+                                                      material_type=MaterialTypes.COURSE, session=session)
                     if isinstance(response, SuccessResponse):
                         return FailedResponse(status_code=400, detail=f'Прогресс уже начат')
                 if material_type == MaterialTypes.LECTURE:
                     # Проверка наличия урока
-                    response = await LessonMethods.get_lesson(lesson_id=material_id)
+                    response = await LessonMethods.get_lesson(lesson_id=material_id, fields=("id",), session=session)
                     if isinstance(response, FailedResponse):
                         return FailedResponse(status_code=404, detail=f'Материала не существует')
                     # Проверка на дубликат прогресса
                     response = await cls.get_progress(material_id=material_id, user_id=user_id,
-                                                      material_type=MaterialTypes.LECTURE)
+                                                      material_type=MaterialTypes.LECTURE, session=session)
                     if isinstance(response, SuccessResponse):
                         return FailedResponse(status_code=400, detail=f'Прогресс уже начат')
                 progress_model = UserProgress(**dumped_model)
                 session.add(progress_model)
-                await session.commit()
+                await commit(session)
+                if material_type == MaterialTypes.COURSE:
+                    await counters.record(session, Course, "course_num_peoples", material_id)
                 return SuccessResponse(status_code=200, data=dumped_model)
             except ProgrammingError as e:
                 logger.error(e)
-                await session.rollback()
+                await rollback(session)
                 return FailedResponse(status_code=500, detail="Ошибка при получении данных")
             except Exception as e:
                 logger.error(e)
-                await session.rollback()
+                await rollback(session)
                 return FailedResponse(status_code=500, detail="Произошла непредвиденная ошибка")
 
     @classmethod
-    async def get_progress(cls, user_id, material_id, material_type):
-        async with session_maker() as session:
+    async def get_progress(cls, user_id, material_id, material_type,
+                           session: Optional[AsyncSession] = None):
+        async with session_scope(session) as session:
             try:
-                query = select(UserProgress).where(UserProgress.user_id == user_id).where(
-                    UserProgress.material_id == material_id).where(UserProgress.material_type == material_type)
+                query = statements.progress(user_id, material_id, material_type)
                 result = await session.execute(query)
                 progress = result.scalar()
                 if not progress:
@@ -568,19 +634,45 @@ class ProgressMethods:
                 return SuccessResponse(status_code=200, data=progress)
             except ProgrammingError as e:
                 logger.error(e)
-                await session.rollback()
+                await rollback(session)
                 return FailedResponse(status_code=500, detail="Ошибка при получении данных")
             except Exception as e:
                 logger.error(e)
-                await session.rollback()
+                await rollback(session)
                 return FailedResponse(status_code=500, detail="Произошла непредвиденная ошибка")
 
     @classmethod
-    async def get_status(cls, user_id, material_id):
-        async with session_maker() as session:
+    async def get_answers(cls, user_id, lesson_id, limit: Optional[int] = None, cursor: Optional[str] = None,
+                          session: Optional[AsyncSession] = None):
+        async with session_scope(session) as session:
             try:
-                query = select(UserProgress.status).where(UserProgress.user_id == user_id).where(
-                    UserProgress.material_id == material_id)
+                # Полная история ответов по уроку, начиная с последних
+                query = select(ProgressAnswers.id, ProgressAnswers.answer, ProgressAnswers.is_right,
+                               ProgressAnswers.created_at).join(
+                    UserProgress, UserProgress.id == ProgressAnswers.progress_id).where(
+                    UserProgress.user_id == user_id).where(UserProgress.material_id == lesson_id).where(
+                    UserProgress.material_type == MaterialTypes.LECTURE).execution_options(replica=True)
+                rows, next_cursor = await paginate(session, query, [ProgressAnswers.id], key=lambda row: [row.id],
+                                                   cursor=cursor, limit=limit, descending=True)
+                if not rows:
+                    return FailedResponse(status_code=404, detail="Ответов по этому уроку нет")
+                return SuccessResponse(status_code=200, data=page([row._mapping for row in rows], next_cursor))
+            except InvalidCursor:
+                return FailedResponse(status_code=400, detail="Невалидный курсор")
+            except ProgrammingError as e:
+                logger.error(e)
+                await rollback(session)
+                return FailedResponse(status_code=500, detail="Ошибка при получении данных")
+            except Exception as e:
+                logger.error(e)
+                await rollback(session)
+                return FailedResponse(status_code=500, detail="Произошла непредвиденная ошибка")
+
+    @classmethod
+    async def get_status(cls, user_id, material_id, session: Optional[AsyncSession] = None):
+        async with session_scope(session) as session:
+            try:
+                query = statements.progress_status(user_id, material_id)
                 result = await session.execute(query)
                 progress_status = result.scalar()
                 if not progress_status:
@@ -588,16 +680,16 @@ class ProgressMethods:
                 return SuccessResponse(status_code=200, data=progress_status)
             except ProgrammingError as e:
                 logger.error(e)
-                await session.rollback()
+                await rollback(session)
                 return FailedResponse(status_code=500, detail="Ошибка при получении данных")
             except Exception as e:
                 logger.error(e)
-                await session.rollback()
+                await rollback(session)
                 return FailedResponse(status_code=500, detail="Произошла непредвиденная ошибка")
 
     @classmethod
-    async def complete_lesson(cls, user_id, material_id):
-        async with session_maker() as session:
+    async def complete_lesson(cls, user_id, material_id, session: Optional[AsyncSession] = None):
+        async with session_scope(session) as session:
             try:
                 # Проверка типа лекции
                 query = select(Lesson.lesson_type).where(
@@ -625,266 +717,351 @@ class ProgressMethods:
                     return FailedResponse(status_code=400, detail="Урок уже завершен")
                 progress.status = ProgressTypes.COMPLETED
                 copy_progress = user_m.UserProgressResponse(**vars(progress)).model_dump(exclude_none=True)
-                await session.commit()
+                await commit(session)
                 return SuccessResponse(status_code=200, data=copy_progress)
             except ProgrammingError as e:
                 logger.error(e)
-                await session.rollback()
+                await rollback(session)
                 return FailedResponse(status_code=500, detail="Ошибка при получении данных")
             except Exception as e:
                 logger.error(e)
-                await session.rollback()
+                await rollback(session)
                 return FailedResponse(status_code=500, detail="Произошла непредвиденная ошибка")
 
-    @staticmethod
-    async def get_user_attempts(user_id, material_id):
-        async with session_maker() as session:
+    @classmethod
+    async def update_status(cls, user_id, material_id, status, session: Optional[AsyncSession] = None):
+        async with session_scope(session) as session:
             try:
-                query = select(UserProgress.attempts).where(UserProgress.user_id == user_id).where(
-                    UserProgress.material_id == material_id)
-                result = await session.execute(query)
-                attempts = result.scalar()
-                if attempts is None:
-                    return FailedResponse(status_code=400,
-                                          detail="У данного материала не предусмотрены попытки на ответ, либо вы не подписаны на урок")
-                return SuccessResponse(status_code=200, data=attempts)
+                query = update(UserProgress).where(UserProgress.user_id == user_id).where(
+                    UserProgress.material_id == material_id).values(status=status)
+                await session.execute(query)
+                await commit(session)
+                model = user_m.UserUpdateProgress(
+                    status=status,
+                    user_id=user_id,
+                    material_id=material_id
+                )
+                return SuccessResponse(status_code=200, data=model)
             except ProgrammingError as e:
                 logger.error(e)
-                await session.rollback()
+                await rollback(session)
                 return FailedResponse(status_code=500, detail="Ошибка при получении данных")
             except Exception as e:
                 logger.error(e)
-                await session.rollback()
+                await rollback(session)
                 return FailedResponse(status_code=500, detail="Произошла непредвиденная ошибка")
 
+
+class AiTaskMethods:
     @classmethod
-    async def update_attempts(cls, user_id, material_id, bias):
-        async with session_maker() as session:
+    async def add_task(cls, data: task_m.AddTaskModel, session: Optional[AsyncSession] = None):
+        async with session_scope(session) as session:
             try:
-                result = await cls.get_user_attempts(user_id, material_id)
-                if isinstance(result, FailedResponse):
-                    return FailedResponse(status_code=result.status_code, detail=result.detail)
-                old_attempts = deepcopy(result.data)
-                print("OLD", old_attempts)
-                if not old_attempts:
-                    return FailedResponse(status_code=403, detail="Количество попыток превысило лимит")
-                new_attempts = old_attempts - bias
-                query = update(UserProgress).where(UserProgress.user_id == user_id).where(
-                    UserProgress.material_id == material_id).values(attempts=new_attempts)
-                await session.execute(query)
-                await session.commit()
-                model = user_m.UserUpdateProgress(
-                    attempts=new_attempts,
-                    user_id=user_id,
-                    material_id=material_id
-                )
-                return SuccessResponse(status_code=200, data=model)
+                dumped_model = data.model_dump()
+                new_task = AiTasks(**dumped_model)
+                session.add(new_task)
+                await commit(session)
+                return SuccessResponse(status_code=200, data=dumped_model)
             except ProgrammingError as e:
                 logger.error(e)
-                await session.rollback()
+                await rollback(session)
                 return FailedResponse(status_code=500, detail="Ошибка при получении данных")
             except Exception as e:
                 logger.error(e)
-                await session.rollback()
+                await rollback(session)
                 return FailedResponse(status_code=500, detail="Произошла непредвиденная ошибка")
 
     @classmethod
-    async def update_status(cls, user_id, material_id, status):
-        async with session_maker() as session:
+    async def get_task(cls, task_id, user_id, session: Optional[AsyncSession] = None):
+        async with session_scope(session) as session:
             try:
-                query = update(UserProgress).where(UserProgress.user_id == user_id).where(
-                    UserProgress.material_id == material_id).values(status=status)
-                await session.execute(query)
-                await session.commit()
-                model = user_m.UserUpdateProgress(
-                    status=status,
-                    user_id=user_id,
-                    material_id=material_id
-                )
-                return SuccessResponse(status_code=200, data=model)
+                query = select(*columns(TaskDTO, AiTasks)).where(AiTasks.id == task_id).where(
+                    AiTasks.user_id == user_id)
+                state = await session.execute(query)
+                row = state.one_or_none()
+                if not row:
+                    return FailedResponse(status_code=404,
+                                          detail="У Вас нет задач от искусственного интеллекта с указанным айди")
+                return SuccessResponse(status_code=200, data=TaskDTO(*row))
             except ProgrammingError as e:
                 logger.error(e)
-                await session.rollback()
+                await rollback(session)
                 return FailedResponse(status_code=500, detail="Ошибка при получении данных")
             except Exception as e:
                 logger.error(e)
-                await session.rollback()
+                await rollback(session)
                 return FailedResponse(status_code=500, detail="Произошла непредвиденная ошибка")
 
     @classmethod
-    async def update_user_answers(cls, user_id, material_id, new_answer):
-        async with session_maker() as session:
+    async def complete_task(cls, task_id, session: Optional[AsyncSession] = None):
+        async with session_scope(session) as session:
             try:
-                query = select(UserProgress).where(UserProgress.user_id == user_id).where(
-                    UserProgress.material_id == material_id)
+                query = update(AiTasks).where(AiTasks.id == task_id).values(status=ProgressTypes.COMPLETED).returning(
+                    *columns(TaskDTO, AiTasks)).execution_options(synchronize_session=False)
                 state = await session.execute(query)
-                user_progress = state.scalar_one_or_none()
-                if not user_progress:
-                    return FailedResponse(status_code=404, detail="Прогресс по данному материалу не начат")
+                row = state.one_or_none()
+                if not row:
+                    return FailedResponse(status_code=404,
+                                          detail="Указанной задачи не существует")
+                await commit(session)
+                return SuccessResponse(status_code=200, data={"status": "Успешно!", "body": TaskDTO(*row)})
+            except ProgrammingError as e:
+                logger.error(e)
+                await rollback(session)
+                return FailedResponse(status_code=500, detail="Ошибка при получении данных")
+            except Exception as e:
+                logger.error(e)
+                await rollback(session)
+                return FailedResponse(status_code=500, detail="Произошла непредвиденная ошибка")
 
-                user_progress.user_answers = (user_progress.user_answers or []) + [new_answer]
-                answers = deepcopy(user_progress.user_answers)
-                await session.commit()
-                return SuccessResponse(status_code=200, data=answers)
+    @classmethod
+    async def get_user_tasks(cls, user_id, limit: Optional[int] = None, cursor: Optional[str] = None,
+                             fields: Optional[str] = None, session: Optional[AsyncSession] = None):
+        async with session_scope(session) as session:
+            try:
+                fields = parse_fields(fields, TASK_FIELDS, TASK_JSON_FIELDS)
+                query = select(*select_fields(AiTasks, fields)).where(
+                    AiTasks.user_id == user_id).execution_options(replica=True)
+                # Сначала новые задачи
+                rows, next_cursor = await paginate(session, query, [AiTasks.id], key=lambda row: [row.id],
+                                                   cursor=cursor, limit=limit, descending=True)
+                if not rows:
+                    return FailedResponse(status_code=404,
+                                          detail="У пользователя нет задач от искусственного интеллекта")
+                return SuccessResponse(status_code=200, data=page([row._mapping for row in rows], next_cursor))
+            except InvalidCursor:
+                return FailedResponse(status_code=400, detail="Невалидный курсор")
+            except InvalidFields as e:
+                return FailedResponse(status_code=400, detail=f"Недопустимые поля: {e}")
             except ProgrammingError as e:
                 logger.error(e)
-                await session.rollback()
+                await rollback(session)
                 return FailedResponse(status_code=500, detail="Ошибка при получении данных")
             except Exception as e:
                 logger.error(e)
-                await session.rollback()
+                await rollback(session)
                 return FailedResponse(status_code=500, detail="Произошла непредвиденная ошибка")
 
 
-class AiTaskMethods:
+class BadgeMethods:
     @classmethod
-    async def add_task(cls, data: task_m.AddTaskModel):
-        async with session_maker() as session:
+    async def get_context(cls, user_id: int, session: Optional[AsyncSession] = None):
+        async with session_scope(session) as session:
             try:
-                dumped_model = data.model_dump()
-                new_task = AiTasks(**dumped_model)
-                session.add(new_task)
-                await session.commit()
-                return SuccessResponse(status_code=200, data=dumped_model)
+                # Все показатели для правил и уже выданные достижения - одним запросом по индексам пользователя
+                progress = select(func.count()).where(UserProgress.user_id == Users.id)
+                query = select(
+                    Users.success_in_a_row,
+                    progress.where(UserProgress.material_type == MaterialTypes.LECTURE).where(
+                        UserProgress.status == ProgressTypes.COMPLETED).scalar_subquery(),
+                    progress.where(UserProgress.material_type == MaterialTypes.COURSE).scalar_subquery(),
+                    select(func.count()).where(AiTasks.user_id == Users.id).where(
+                        AiTasks.status == ProgressTypes.COMPLETED).scalar_subquery(),
+                    select(func.array_agg(UserBadges.badge_id)).where(UserBadges.user_id == Users.id).scalar_subquery()
+                ).where(Users.id == user_id)
+                row = (await session.execute(query)).one_or_none()
+                if not row:
+                    return FailedResponse(status_code=404, detail="Пользователя не существует")
+                *stats, badge_ids = row
+                return SuccessResponse(status_code=200,
+                                       data=BadgeContext(user_id, *stats, badge_ids=frozenset(badge_ids or ())))
             except ProgrammingError as e:
                 logger.error(e)
-                await session.rollback()
+                await rollback(session)
                 return FailedResponse(status_code=500, detail="Ошибка при получении данных")
             except Exception as e:
                 logger.error(e)
-                await session.rollback()
+                await rollback(session)
                 return FailedResponse(status_code=500, detail="Произошла непредвиденная ошибка")
 
     @classmethod
-    async def get_task(cls, task_id, user_id):
-        async with session_maker() as session:
+    async def give_many(cls, user_id: int, badge_ids: list, session: Optional[AsyncSession] = None):
+        async with session_scope(session) as session:
             try:
-                query = select(AiTasks).where(AiTasks.id == task_id).where(AiTasks.user_id == user_id)
-                state = await session.execute(query)
-                task = state.scalar_one_or_none()
-                if not task:
-                    return FailedResponse(status_code=404,
-                                          detail="У Вас нет задач от искусственного интеллекта с указанным айди")
-                return SuccessResponse(status_code=200, data=task)
+                # Все новые достижения одним INSERT. Уже выданные (например, параллельным ответом) пропускаются
+                # по уникальному индексу, в ответе - только действительно выданные
+                rows = [{"user_id": user_id, "badge_id": badge_id} for badge_id in badge_ids]
+                query = pg_insert(UserBadges).values(rows).on_conflict_do_nothing(
+                    index_elements=[UserBadges.user_id, UserBadges.badge_id]).returning(UserBadges.badge_id)
+                given = (await session.execute(query)).scalars().all()
+                await commit(session)
+                return SuccessResponse(status_code=200, data=given)
             except ProgrammingError as e:
                 logger.error(e)
-                await session.rollback()
+                await rollback(session)
                 return FailedResponse(status_code=500, detail="Ошибка при получении данных")
             except Exception as e:
                 logger.error(e)
-                await session.rollback()
+                await rollback(session)
                 return FailedResponse(status_code=500, detail="Произошла непредвиденная ошибка")
 
     @classmethod
-    async def complete_task(cls, task_id):
-        async with session_maker() as session:
+    async def get_catalog(cls, session: Optional[AsyncSession] = None):
+        async with session_scope(session) as session:
             try:
-                query = select(AiTasks).where(AiTasks.id == task_id)
+                # Весь справочник достижений: он мал и хранится в памяти каждого воркера
+                query = select(*columns(BadgeDTO, Badges)).order_by(Badges.id)
                 state = await session.execute(query)
-                task = state.scalar_one_or_none()
-                if not task:
-                    return FailedResponse(status_code=404,
-                                          detail="Указанной задачи не существует")
-                task.status = ProgressTypes.COMPLETED
-                completed_task = deepcopy(task)
-                await session.commit()
-                return SuccessResponse(status_code=200, data={"status": "Успешно!", "body": completed_task})
+                return SuccessResponse(status_code=200, data=[BadgeDTO(*row) for row in state])
             except ProgrammingError as e:
                 logger.error(e)
-                await session.rollback()
+                await rollback(session)
                 return FailedResponse(status_code=500, detail="Ошибка при получении данных")
             except Exception as e:
                 logger.error(e)
-                await session.rollback()
+                await rollback(session)
                 return FailedResponse(status_code=500, detail="Произошла непредвиденная ошибка")
 
     @classmethod
-    async def get_user_tasks(cls, user_id):
-        async with session_maker() as session:
+    async def get_user_badges(cls, user_id, limit: Optional[int] = None, cursor: Optional[str] = None,
+                              session: Optional[AsyncSession] = None):
+        async with session_scope(session) as session:
             try:
-                query = select(AiTasks.id, AiTasks.task, AiTasks.status).where(AiTasks.user_id == user_id)
-                state = await session.execute(query)
-                tasks = state.mappings().all()
-                if not tasks:
-                    return FailedResponse(status_code=404,
-                                          detail="У пользователя нет задач от искусственного интеллекта")
-                return SuccessResponse(status_code=200, data=tasks)
+                # Айди достижений в порядке получения: только индекс user_badges, данные достижений берутся
+                # из справочника в памяти
+                query = select(UserBadges.id, UserBadges.badge_id).where(
+                    UserBadges.user_id == user_id).execution_options(replica=True)
+                rows, next_cursor = await paginate(session, query, [UserBadges.id], key=lambda row: [row.id],
+                                                   cursor=cursor, limit=limit)
+                if not rows:
+                    return FailedResponse(status_code=400, detail="У Вас нет достижений")
+                return SuccessResponse(status_code=200, data=page([row.badge_id for row in rows], next_cursor))
+            except InvalidCursor:
+                return FailedResponse(status_code=400, detail="Невалидный курсор")
             except ProgrammingError as e:
                 logger.error(e)
-                await session.rollback()
+                await rollback(session)
                 return FailedResponse(status_code=500, detail="Ошибка при получении данных")
             except Exception as e:
                 logger.error(e)
-                await session.rollback()
+                await rollback(session)
                 return FailedResponse(status_code=500, detail="Произошла непредвиденная ошибка")
 
 
-class BadgeMethods:
+class RefreshTokenMethods:
     @classmethod
-    async def give(cls, achievement: Achievement):
-        async with session_maker() as session:
+    async def add_token(cls, jti: str, family_id: str, user_id: int, expires_at: datetime,
+                        session: Optional[AsyncSession] = None):
+        async with session_scope(session) as session:
             try:
-                query = select(UserBadges).filter_by(
-                    user_id=achievement.user_id,
-                    badge_id=achievement.badge_id
-                )
+                token = RefreshTokens(jti=jti, family_id=family_id, user_id=user_id,
+                                      status=TokenStatus.ACTIVE, expires_at=expires_at)
+                session.add(token)
+                await commit(session)
+                return SuccessResponse(status_code=200, data=jti)
+            except ProgrammingError as e:
+                logger.error(e)
+                await rollback(session)
+                return FailedResponse(status_code=500, detail="Ошибка при получении данных")
+            except Exception as e:
+                logger.error(e)
+                await rollback(session)
+                return FailedResponse(status_code=500, detail="Произошла непредвиденная ошибка")
+
+    @classmethod
+    async def rotate(cls, jti: str, new_jti: str, expires_at: datetime,
+                     session: Optional[AsyncSession] = None):
+        async with session_scope(session) as session:
+            try:
+                # Старый токен помечается замененным, только если он еще активен
+                query = update(RefreshTokens).where(RefreshTokens.jti == jti).where(
+                    RefreshTokens.status == TokenStatus.ACTIVE).where(
+                    RefreshTokens.expires_at > func.now()).values(status=TokenStatus.ROTATED).returning(
+                    RefreshTokens.family_id, RefreshTokens.user_id)
                 state = await session.execute(query)
-                ex = state.scalar_one_or_none()
-                if not ex:
-                    model = UserBadges(user_id=achievement.user_id, badge_id=achievement.badge_id)
-                    session.add(model)
-                    await session.commit()
-                    return SuccessResponse(status_code=200, data=model)
-                return FailedResponse(status_code=400, detail="Достижение уже выдано")
+                token = state.one_or_none()
+                if not token:
+                    query = select(RefreshTokens.family_id, RefreshTokens.status).where(RefreshTokens.jti == jti)
+                    state = await session.execute(query)
+                    old_token = state.one_or_none()
+                    if old_token and old_token.status == TokenStatus.ROTATED:
+                        # Повторное использование замененного токена - отзываем всё семейство
+                        query = update(RefreshTokens).where(
+                            RefreshTokens.family_id == old_token.family_id).values(status=TokenStatus.REVOKED)
+                        await session.execute(query)
+                        await commit(session)
+                    return FailedResponse(status_code=401, detail="Токен отозван или более недействителен")
+                new_token = RefreshTokens(jti=new_jti, family_id=token.family_id, user_id=token.user_id,
+                                          status=TokenStatus.ACTIVE, expires_at=expires_at)
+                session.add(new_token)
+                await commit(session)
+                return SuccessResponse(status_code=200, data={"family_id": token.family_id, "user_id": token.user_id})
+            except ProgrammingError as e:
+                logger.error(e)
+                await rollback(session)
+                return FailedResponse(status_code=500, detail="Ошибка при получении данных")
+            except Exception as e:
+                logger.error(e)
+                await rollback(session)
+                return FailedResponse(status_code=500, detail="Произошла непредвиденная ошибка")
+
+    @classmethod
+    async def revoke_family(cls, family_id: str, session: Optional[AsyncSession] = None):
+        async with session_scope(session) as session:
+            try:
+                query = update(RefreshTokens).where(RefreshTokens.family_id == family_id).values(
+                    status=TokenStatus.REVOKED)
+                await session.execute(query)
+                await commit(session)
+                return SuccessResponse(status_code=200, data=True)
             except ProgrammingError as e:
                 logger.error(e)
-                await session.rollback()
+                await rollback(session)
                 return FailedResponse(status_code=500, detail="Ошибка при получении данных")
             except Exception as e:
                 logger.error(e)
-                await session.rollback()
+                await rollback(session)
                 return FailedResponse(status_code=500, detail="Произошла непредвиденная ошибка")
 
     @classmethod
-    async def get_badges_with_id(cls, badge_ids: list):
-        async with session_maker() as session:
+    async def is_family_revoked(cls, family_id: str, session: Optional[AsyncSession] = None):
+        async with session_scope(session) as session:
             try:
-                query = select(Badges).where(Badges.id.in_(badge_ids))
+                query = statements.family_revoked(family_id)
                 state = await session.execute(query)
-                badges = state.scalars().all()
+                return SuccessResponse(status_code=200, data=bool(state.scalar()))
+            except ProgrammingError as e:
+                logger.error(e)
+                await rollback(session)
+                return FailedResponse(status_code=500, detail="Ошибка при получении данных")
+            except Exception as e:
+                logger.error(e)
+                await rollback(session)
+                return FailedResponse(status_code=500, detail="Произошла непредвиденная ошибка")
 
-                if not badges:
-                    return FailedResponse(status_code=400, detail="Достижения с таким айди не существует")
-                return SuccessResponse(status_code=200, data=badges)
+    @classmethod
+    async def get_revoked_families(cls, session: Optional[AsyncSession] = None):
+        async with session_scope(session) as session:
+            try:
+                # Семейства, по которым еще могут жить выданные токены
+                query = select(RefreshTokens.family_id).where(RefreshTokens.status == TokenStatus.REVOKED).where(
+                    RefreshTokens.expires_at > func.now()).distinct()
+                state = await session.execute(query)
+                return SuccessResponse(status_code=200, data=state.scalars().all())
             except ProgrammingError as e:
                 logger.error(e)
-                await session.rollback()
+                await rollback(session)
                 return FailedResponse(status_code=500, detail="Ошибка при получении данных")
             except Exception as e:
                 logger.error(e)
-                await session.rollback()
+                await rollback(session)
                 return FailedResponse(status_code=500, detail="Произошла непредвиденная ошибка")
 
     @classmethod
-    async def get_user_badges(cls, user_id):
-        async with session_maker() as session:
+    async def delete_expired(cls, session: Optional[AsyncSession] = None):
+        async with session_scope(session) as session:
             try:
-                query = select(UserBadges.badge_id).where(UserBadges.user_id == user_id)
+                query = delete(RefreshTokens).where(RefreshTokens.expires_at <= func.now())
                 state = await session.execute(query)
-                user_badges_ids = state.scalars().all()
-                if not user_badges_ids:
-                    return FailedResponse(status_code=400, detail="У Вас нет достижений")
-                response = await cls.get_badges_with_id(user_badges_ids)
-                if isinstance(response, FailedResponse):
-                    return FailedResponse(response.status_code, response.detail)
-                return SuccessResponse(status_code=200, data=response.data)
+                await commit(session)
+                return SuccessResponse(status_code=200, data=state.rowcount)
             except ProgrammingError as e:
                 logger.error(e)
-                await session.rollback()
+                await rollback(session)
                 return FailedResponse(status_code=500, detail="Ошибка при получении данных")
             except Exception as e:
                 logger.error(e)
-                await session.rollback()
+                await rollback(session)
                 return FailedResponse(status_code=500, detail="Произошла непредвиденная ошибка")
 # import asyncio
 # a = BadgeMethods()
@@ -0,0 +1,48 @@
+import importlib
+import pkgutil
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+from src.database.model import engine
+from src.utils.logger import logger
+
+# Ключ advisory-блокировки: миграции выполняет только один процесс, остальные ждут
+MIGRATIONS_LOCK_KEY = 7310452
+
+
+def load_migrations() -> list:
+    # Модули версий называются v0001_<описание>.py и применяются по возрастанию VERSION
+    modules = [importlib.import_module(f"{__name__}.{info.name}") for info in pkgutil.iter_modules(__path__)
+               if info.name.startswith("v")]
+    return sorted(modules, key=lambda module: module.VERSION)
+
+
+async def migrate(target_engine: AsyncEngine = engine):
+    async with target_engine.connect() as conn:
+        await conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": MIGRATIONS_LOCK_KEY})
+        await conn.commit()
+        try:
+            await conn.execute(text(
+                "CREATE TABLE IF NOT EXISTS schema_migrations ("
+                "version INTEGER PRIMARY KEY, "
+                "description VARCHAR NOT NULL, "
+                "applied_at TIMESTAMP WITH TIME ZONE DEFAULT now() NOT NULL)"
+            ))
+            await conn.commit()
+            state = await conn.execute(text("SELECT version FROM schema_migrations"))
+            applied = set(state.scalars().all())
+            for migration in load_migrations():
+                if migration.VERSION in applied:
+                    continue
+                logger.info(f"Применяю миграцию {migration.VERSION}: {migration.DESCRIPTION}...")
+                # Каждая миграция вместе с отметкой о ней выполняется в одной транзакции
+                await migration.upgrade(conn)
+                await conn.execute(text("INSERT INTO schema_migrations (version, description) VALUES (:v, :d)"),
+                                   {"v": migration.VERSION, "d": migration.DESCRIPTION})
+                await conn.commit()
+                logger.info("Миграция применена!")
+        except Exception:
+            await conn.rollback()
+            raise
+        finally:
+            await conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": MIGRATIONS_LOCK_KEY})
+            await conn.commit()
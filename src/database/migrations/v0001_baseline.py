@@ -0,0 +1,112 @@
+from sqlalchemy import text
+
+VERSION = 1
+DESCRIPTION = "Исходная схема"
+
+# Схема на момент появления миграций. IF NOT EXISTS позволяет принять уже развернутую из дампа базу
+STATEMENTS = [
+    """
+    CREATE TABLE IF NOT EXISTS users (
+        id SERIAL NOT NULL,
+        username VARCHAR NOT NULL,
+        password VARCHAR NOT NULL,
+        first_name VARCHAR NOT NULL,
+        last_name VARCHAR NOT NULL,
+        age INTEGER NOT NULL,
+        email VARCHAR NOT NULL,
+        phone VARCHAR,
+        role VARCHAR NOT NULL,
+        success_in_a_row INTEGER NOT NULL,
+        PRIMARY KEY (id),
+        UNIQUE (username),
+        UNIQUE (email),
+        UNIQUE (phone)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS courses (
+        id SERIAL NOT NULL,
+        course_title VARCHAR NOT NULL,
+        author VARCHAR NOT NULL,
+        "desc" VARCHAR,
+        course_categories VARCHAR NOT NULL,
+        course_num_peoples INTEGER NOT NULL,
+        num_lessons INTEGER NOT NULL,
+        PRIMARY KEY (id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS lessons (
+        id SERIAL NOT NULL,
+        course_id INTEGER NOT NULL,
+        lesson_title VARCHAR NOT NULL,
+        lesson_type VARCHAR NOT NULL,
+        "desc" TEXT,
+        material TEXT NOT NULL,
+        question_lesson VARCHAR,
+        answer_lesson VARCHAR,
+        attempts INTEGER,
+        lesson_num_success_peoples INTEGER NOT NULL,
+        level INTEGER NOT NULL,
+        pos INTEGER NOT NULL,
+        PRIMARY KEY (id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS user_progress (
+        id SERIAL NOT NULL,
+        material_type VARCHAR NOT NULL,
+        material_id INTEGER NOT NULL,
+        user_id INTEGER,
+        user_answers VARCHAR[],
+        attempts INTEGER,
+        status VARCHAR NOT NULL,
+        PRIMARY KEY (id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS ai_tasks (
+        id SERIAL NOT NULL,
+        task TEXT NOT NULL,
+        answer TEXT NOT NULL,
+        user_id INTEGER,
+        status VARCHAR NOT NULL,
+        PRIMARY KEY (id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS badges (
+        id SERIAL NOT NULL,
+        badge_name VARCHAR NOT NULL,
+        badge_type VARCHAR NOT NULL,
+        "desc" VARCHAR NOT NULL,
+        emoji VARCHAR,
+        PRIMARY KEY (id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS user_badges (
+        id SERIAL NOT NULL,
+        badge_id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        PRIMARY KEY (id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS refresh_tokens (
+        jti VARCHAR NOT NULL,
+        family_id VARCHAR NOT NULL,
+        user_id INTEGER NOT NULL,
+        status VARCHAR NOT NULL,
+        expires_at TIMESTAMP WITH TIME ZONE NOT NULL,
+        created_at TIMESTAMP WITH TIME ZONE DEFAULT now() NOT NULL,
+        PRIMARY KEY (jti)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_refresh_tokens_family_id ON refresh_tokens (family_id)",
+]
+
+
+async def upgrade(conn):
+    for statement in STATEMENTS:
+        await conn.execute(text(statement))
@@ -0,0 +1,63 @@
+from sqlalchemy import text
+
+VERSION = 2
+DESCRIPTION = "Индексы для частых выборок и внешние ключи"
+
+STATEMENTS = [
+    # Перед созданием уникальных индексов удаляются дубликаты, остается самая ранняя запись
+    """
+    DELETE FROM user_progress a USING user_progress b
+    WHERE a.user_id = b.user_id AND a.material_id = b.material_id
+      AND a.material_type = b.material_type AND a.id > b.id
+    """,
+    """
+    DELETE FROM user_badges a USING user_badges b
+    WHERE a.user_id = b.user_id AND a.badge_id = b.badge_id AND a.id > b.id
+    """,
+    # Перед созданием внешних ключей удаляются записи без родителя
+    "DELETE FROM lessons l WHERE NOT EXISTS (SELECT 1 FROM courses c WHERE c.id = l.course_id)",
+    """
+    DELETE FROM user_progress p
+    WHERE p.user_id IS NOT NULL AND NOT EXISTS (SELECT 1 FROM users u WHERE u.id = p.user_id)
+    """,
+    """
+    DELETE FROM ai_tasks t
+    WHERE t.user_id IS NOT NULL AND NOT EXISTS (SELECT 1 FROM users u WHERE u.id = t.user_id)
+    """,
+    "DELETE FROM user_badges b WHERE NOT EXISTS (SELECT 1 FROM users u WHERE u.id = b.user_id)",
+    "DELETE FROM refresh_tokens r WHERE NOT EXISTS (SELECT 1 FROM users u WHERE u.id = r.user_id)",
+    # Прогресс ищется по пользователю и материалу, иногда без типа материала
+    """
+    CREATE UNIQUE INDEX uq_user_progress_user_material
+    ON user_progress (user_id, material_id, material_type)
+    """,
+    "CREATE INDEX ix_lessons_course_id_pos ON lessons (course_id, pos)",
+    "CREATE INDEX ix_ai_tasks_user_id ON ai_tasks (user_id, id)",
+    "CREATE UNIQUE INDEX uq_user_badges_user_badge ON user_badges (user_id, badge_id)",
+    "CREATE INDEX ix_refresh_tokens_expires_at ON refresh_tokens (expires_at)",
+    """
+    ALTER TABLE lessons ADD CONSTRAINT fk_lessons_course_id
+    FOREIGN KEY (course_id) REFERENCES courses (id) ON DELETE CASCADE
+    """,
+    """
+    ALTER TABLE user_progress ADD CONSTRAINT fk_user_progress_user_id
+    FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+    """,
+    """
+    ALTER TABLE ai_tasks ADD CONSTRAINT fk_ai_tasks_user_id
+    FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+    """,
+    """
+    ALTER TABLE user_badges ADD CONSTRAINT fk_user_badges_user_id
+    FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+    """,
+    """
+    ALTER TABLE refresh_tokens ADD CONSTRAINT fk_refresh_tokens_user_id
+    FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+    """,
+]
+
+
+async def upgrade(conn):
+    for statement in STATEMENTS:
+        await conn.execute(text(statement))
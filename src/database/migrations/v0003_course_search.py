@@ -0,0 +1,21 @@
+from sqlalchemy import text
+
+VERSION = 3
+DESCRIPTION = "Полнотекстовый поиск по курсам"
+
+# Словарь simple: без стемминга, названия на русском и английском разбираются одинаково
+SEARCH_VECTOR = (
+    "setweight(to_tsvector('simple', coalesce(course_title, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(\"desc\", '')), 'B') || "
+    "setweight(to_tsvector('simple', coalesce(course_categories, '')), 'C')"
+)
+
+STATEMENTS = [
+    f"ALTER TABLE courses ADD COLUMN search_vector tsvector GENERATED ALWAYS AS ({SEARCH_VECTOR}) STORED",
+    "CREATE INDEX ix_courses_search_vector ON courses USING gin (search_vector)",
+]
+
+
+async def upgrade(conn):
+    for statement in STATEMENTS:
+        await conn.execute(text(statement))
@@ -0,0 +1,25 @@
+from sqlalchemy import text
+
+VERSION = 4
+DESCRIPTION = "Позиции уроков с промежутками и уникальность позиции в курсе"
+
+STATEMENTS = [
+    # Позиции переписываются с шагом 1024 в текущем порядке, заодно закрываются дыры после удалений
+    """
+    UPDATE lessons SET pos = ranked.rn * 1024
+    FROM (SELECT id, row_number() OVER (PARTITION BY course_id ORDER BY pos, id) AS rn FROM lessons) AS ranked
+    WHERE lessons.id = ranked.id
+    """,
+    "DROP INDEX IF EXISTS ix_lessons_course_id_pos",
+    # Откладываемое ограничение проверяется в конце оператора, поэтому перестановка уроков одним UPDATE
+    # не упирается в промежуточные совпадения позиций
+    """
+    ALTER TABLE lessons ADD CONSTRAINT uq_lessons_course_id_pos UNIQUE (course_id, pos)
+    DEFERRABLE INITIALLY IMMEDIATE
+    """,
+]
+
+
+async def upgrade(conn):
+    for statement in STATEMENTS:
+        await conn.execute(text(statement))
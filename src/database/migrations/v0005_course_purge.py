@@ -0,0 +1,28 @@
+from sqlalchemy import text
+
+VERSION = 5
+DESCRIPTION = "Мягкое удаление курсов и связь задач ИИ с уроком"
+
+STATEMENTS = [
+    # Отметка об удалении: строки большого курса удаляются в фоне частями
+    "ALTER TABLE courses ADD COLUMN deleted_at timestamptz",
+    # Задачи ИИ удаляются вместе с уроком, по которому сгенерированы
+    """
+    ALTER TABLE ai_tasks ADD COLUMN lesson_id integer
+    CONSTRAINT fk_ai_tasks_lesson_id REFERENCES lessons (id) ON DELETE CASCADE
+    """,
+    "CREATE INDEX ix_ai_tasks_lesson_id ON ai_tasks (lesson_id)",
+    # Прогресс по материалу удаляется вместе с материалом
+    "CREATE INDEX ix_user_progress_material ON user_progress (material_type, material_id)",
+    # Прогресс по уже удаленным курсам и урокам
+    """
+    DELETE FROM user_progress p
+    WHERE (p.material_type = 'Курс' AND NOT EXISTS (SELECT 1 FROM courses c WHERE c.id = p.material_id))
+       OR (p.material_type = 'Урок' AND NOT EXISTS (SELECT 1 FROM lessons l WHERE l.id = p.material_id))
+    """,
+]
+
+
+async def upgrade(conn):
+    for statement in STATEMENTS:
+        await conn.execute(text(statement))
@@ -0,0 +1,18 @@
+from sqlalchemy import text
+
+VERSION = 6
+DESCRIPTION = "JSONB для задач ИИ"
+
+STATEMENTS = [
+    # Колонки хранили результат json.dumps в TEXT, поэтому значение приводится к jsonb напрямую
+    """
+    ALTER TABLE ai_tasks
+        ALTER COLUMN task TYPE jsonb USING task::jsonb,
+        ALTER COLUMN answer TYPE jsonb USING answer::jsonb
+    """,
+]
+
+
+async def upgrade(conn):
+    for statement in STATEMENTS:
+        await conn.execute(text(statement))
@@ -0,0 +1,31 @@
+from sqlalchemy import text
+
+VERSION = 7
+DESCRIPTION = "Журнал ответов вместо массива user_answers"
+
+STATEMENTS = [
+    """
+    CREATE TABLE progress_answers (
+        id BIGSERIAL PRIMARY KEY,
+        progress_id INTEGER NOT NULL
+            CONSTRAINT fk_progress_answers_progress_id REFERENCES user_progress (id) ON DELETE CASCADE,
+        answer VARCHAR NOT NULL,
+        is_right BOOLEAN NOT NULL,
+        created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+    )
+    """,
+    "CREATE INDEX ix_progress_answers_progress_id ON progress_answers (progress_id, id)",
+    # В массиве хранились только неверные ответы, порядок сохраняется
+    """
+    INSERT INTO progress_answers (progress_id, answer, is_right)
+    SELECT p.id, a.answer, false
+    FROM user_progress p CROSS JOIN LATERAL unnest(p.user_answers) WITH ORDINALITY AS a (answer, n)
+    ORDER BY p.id, a.n
+    """,
+    "ALTER TABLE user_progress DROP COLUMN user_answers",
+]
+
+
+async def upgrade(conn):
+    for statement in STATEMENTS:
+        await conn.execute(text(statement))
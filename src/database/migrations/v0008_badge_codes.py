@@ -0,0 +1,33 @@
+from sqlalchemy import text
+
+VERSION = 8
+DESCRIPTION = "Коды достижений для правил выдачи"
+
+STATEMENTS = [
+    "ALTER TABLE badges ADD COLUMN code VARCHAR",
+    # Правила раньше ссылались на достижения по айди, коды выдаются по их названиям
+    """
+    UPDATE badges SET code = CASE badge_name
+        WHEN 'Всемогущий' THEN 'streak_10'
+        WHEN 'Все с чего-то начинали' THEN 'first_solve'
+        ELSE 'badge_' || id END
+    """,
+    # На пустой базе справочник заполняется достижениями, на которые ссылаются правила
+    """
+    INSERT INTO badges (code, badge_name, badge_type, "desc", emoji)
+    SELECT v.code, v.badge_name, v.badge_type, v."desc", v.emoji
+    FROM (VALUES ('streak_10', 'Всемогущий', 'Серия', 'Решить 10 задач подряд без ошибок', '💪'),
+                 ('first_solve', 'Все с чего-то начинали', 'Серия', 'Решить первую задачу', '🌱'))
+        AS v (code, badge_name, badge_type, "desc", emoji)
+    WHERE NOT EXISTS (SELECT 1 FROM badges b WHERE b.code = v.code)
+    """,
+    "ALTER TABLE badges ALTER COLUMN code SET NOT NULL",
+    "CREATE UNIQUE INDEX uq_badges_code ON badges (code)",
+    # Достижения пользователя постранично в порядке получения - только по индексу, без обращения к таблице
+    "CREATE INDEX ix_user_badges_user_id ON user_badges (user_id, id) INCLUDE (badge_id)",
+]
+
+
+async def upgrade(conn):
+    for statement in STATEMENTS:
+        await conn.execute(text(statement))
@@ -1,10 +1,14 @@
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
-from sqlalchemy import TEXT, ARRAY, String, TypeDecorator
-import json
+from sqlalchemy import URL, TEXT, BigInteger, DateTime, func, ForeignKey, Index, Computed, \
+    UniqueConstraint
+from sqlalchemy.dialects.postgresql import TSVECTOR, JSONB
+from datetime import datetime
+import orjson
 from src.database.config import DBConfig
+from src.database.pool import TimedQueuePool
+from src.database.routing import ReplicaRouter, routing_session_class
 from dotenv import load_dotenv
-from src.utils.logger import logger
 
 load_dotenv()
 
@@ -18,23 +22,36 @@ host = db_config.HOST
 port = db_config.PORT
 dbname = db_config.DBNAME
 
-engine = create_async_engine(f"postgresql+asyncpg://{user}:{password}@{host}:{port}/{dbname}", pool_pre_ping=True)
-session_maker = async_sessionmaker(bind=engine, autoflush=False)
 
+def json_dumps(value) -> str:
+    # JSONB-колонки кодируются через orjson, декодирование - тоже orjson (json_deserializer движка)
+    return orjson.dumps(value).decode()
 
-class JSON(TypeDecorator):
-    cache_ok = True
-    impl = TEXT
 
-    def process_bind_param(self, value, dialect):
-        if value is None:
-            return None
-        return json.dumps(value, ensure_ascii=False)
+def make_engine(host: str, port: str):
+    return create_async_engine(
+        URL.create("postgresql+asyncpg", username=user, password=password, host=host, port=int(port),
+                   database=dbname, query={"prepared_statement_cache_size": str(db_config.STATEMENT_CACHE_SIZE)}),
+        poolclass=TimedQueuePool,
+        pool_size=db_config.POOL_SIZE,
+        max_overflow=db_config.POOL_MAX_OVERFLOW,
+        pool_timeout=db_config.POOL_TIMEOUT,
+        pool_recycle=db_config.POOL_RECYCLE,
+        pool_pre_ping=db_config.POOL_PRE_PING,
+        query_cache_size=db_config.QUERY_CACHE_SIZE,
+        json_serializer=json_dumps,
+        json_deserializer=orjson.loads
+    )
 
-    def process_result_value(self, value, dialect):
-        if value is None:
-            return None
-        return json.loads(value)
+
+engine = make_engine(host, port)
+# Реплики только для чтения: на них уходят запросы с execution_options(replica=True)
+replica_engines = [make_engine(*replica.strip().rsplit(":", 1)) for replica in db_config.REPLICA_HOSTS.split(",")
+                   if replica.strip()]
+replica_router = ReplicaRouter(replica_engines, strategy=db_config.REPLICA_SELECTION,
+                               check_interval=db_config.REPLICA_CHECK_INTERVAL)
+session_maker = async_sessionmaker(bind=engine, autoflush=False,
+                                   sync_session_class=routing_session_class(replica_router))
 
 
 class Base(DeclarativeBase):
@@ -55,21 +72,12 @@ class Users(Base):
     role: Mapped[str] = mapped_column(comment="Роль участника в системе")
     success_in_a_row: Mapped[int] = mapped_column(default=0, comment="Верно решено задач подряд без ошибок")
 
-    @classmethod
-    async def create_table(cls):
-        async with engine.begin() as connect:
-            logger.info(f"Создаю базу данных {cls.__tablename__}...")
-            await connect.run_sync(
-                lambda sync_conn: cls.metadata.drop_all(sync_conn, tables=[cls.__table__])
-            )
-            await connect.run_sync(
-                lambda sync_conn: cls.metadata.create_all(sync_conn, tables=[cls.__table__])
-            )
-            logger.info("База данных создана!")
-
 
 class Course(Base):
     __tablename__ = "courses"
+    __table_args__ = (
+        Index("ix_courses_search_vector", "search_vector", postgresql_using="gin"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, comment="Айди в системе")
     course_title: Mapped[str] = mapped_column(nullable=False, comment='Название курса')
@@ -79,25 +87,28 @@ class Course(Base):
     course_num_peoples: Mapped[int] = mapped_column(default=0, nullable=False,
                                                     comment="Количество людей, записанных на курс")
     num_lessons: Mapped[int] = mapped_column(nullable=False, comment="Количество уроков в курсе")
-
-    @classmethod
-    async def create_table(cls):
-        async with engine.begin() as connect:
-            logger.info(f"Создаю базу данных {cls.__tablename__}...")
-            await connect.run_sync(
-                lambda sync_conn: cls.metadata.drop_all(sync_conn, tables=[cls.__table__])
-            )
-            await connect.run_sync(
-                lambda sync_conn: cls.metadata.create_all(sync_conn, tables=[cls.__table__])
-            )
-            logger.info("База данных создана!")
+    # Вычисляется базой данных (миграция 3), в выдачу не загружается
+    search_vector: Mapped[str] = mapped_column(
+        TSVECTOR,
+        Computed("setweight(to_tsvector('simple', coalesce(course_title, '')), 'A') || "
+                 "setweight(to_tsvector('simple', coalesce(\"desc\", '')), 'B') || "
+                 "setweight(to_tsvector('simple', coalesce(course_categories, '')), 'C')", persisted=True),
+        deferred=True, comment="Поисковый вектор по названию, описанию и категориям"
+    )
+    # Удаленный курс скрыт из выдачи, пока его уроки и прогресс удаляются в фоне
+    deleted_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=True, default=None,
+                                                 comment="Время удаления курса")
 
 
 class Lesson(Base):
     __tablename__ = "lessons"
+    __table_args__ = (
+        UniqueConstraint("course_id", "pos", name="uq_lessons_course_id_pos", deferrable=True, initially="IMMEDIATE"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, comment="Айди в системе")
-    course_id: Mapped[int] = mapped_column(nullable=False, comment='Айди курса, к которому относится урок')
+    course_id: Mapped[int] = mapped_column(ForeignKey("courses.id", ondelete="CASCADE", name="fk_lessons_course_id"),
+                                           nullable=False, comment='Айди курса, к которому относится урок')
     lesson_title: Mapped[str] = mapped_column(nullable=False, comment='Название урока')
     lesson_type: Mapped[str] = mapped_column(nullable=False, comment='Лекционный урок или практический')
     desc: Mapped[str] = mapped_column(TEXT, nullable=True, comment="Описание урока")
@@ -110,105 +121,98 @@ class Lesson(Base):
     lesson_num_success_peoples: Mapped[int] = mapped_column(default=0, nullable=False,
                                                             comment="Количество людей, прошедших урок.")
     level: Mapped[int] = mapped_column(nullable=False, comment="Уровень сложности задания")
+    # Позиции идут с промежутками (см. src/database/ordering.py), важен только порядок
     pos: Mapped[int] = mapped_column(nullable=False, comment='Позиция урока в курсе')
 
-    @classmethod
-    async def create_table(cls):
-        async with engine.begin() as connect:
-            logger.info(f"Создаю базу данных {cls.__tablename__}...")
-            await connect.run_sync(
-                lambda sync_conn: cls.metadata.drop_all(sync_conn, tables=[cls.__table__])
-            )
-            await connect.run_sync(
-                lambda sync_conn: cls.metadata.create_all(sync_conn, tables=[cls.__table__])
-            )
-            logger.info("База данных создана!")
-
 
 class UserProgress(Base):
     __tablename__ = "user_progress"
+    __table_args__ = (
+        Index("uq_user_progress_user_material", "user_id", "material_id", "material_type", unique=True),
+        Index("ix_user_progress_material", "material_type", "material_id"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, comment="Айди записи")
     material_type: Mapped[str] = mapped_column(nullable=False, comment="Тип материала (лекция/курс)")
     material_id: Mapped[int] = mapped_column(nullable=False, comment="Айди лекции/курса")
-    user_id: Mapped[int] = mapped_column(nullable=True, comment="Айди пользователя")
-    user_answers: Mapped[list[TEXT]] = mapped_column(ARRAY(String), nullable=True, comment="Ответ пользователя")
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE", name="fk_user_progress_user_id"),
+                                         nullable=True, comment="Айди пользователя")
     attempts: Mapped[int] = mapped_column(nullable=True, comment="Оставшееся количество попыток")
     status: Mapped[str] = mapped_column(default="in progress", comment="Статус выполнения материала")
 
-    @classmethod
-    async def create_table(cls):
-        async with engine.begin() as connect:
-            logger.info(f"Создаю базу данных {cls.__tablename__}...")
-            await connect.run_sync(
-                lambda sync_conn: cls.metadata.drop_all(sync_conn, tables=[cls.__table__])
-            )
-            await connect.run_sync(
-                lambda sync_conn: cls.metadata.create_all(sync_conn, tables=[cls.__table__])
-            )
-            logger.info("База данных создана!")
+
+class ProgressAnswers(Base):
+    # Ответы только добавляются: запись ответа не переписывает историю и не зависит от ее длины
+    __tablename__ = "progress_answers"
+    __table_args__ = (
+        Index("ix_progress_answers_progress_id", "progress_id", "id"),
+    )
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, comment="Айди ответа")
+    progress_id: Mapped[int] = mapped_column(
+        ForeignKey("user_progress.id", ondelete="CASCADE", name="fk_progress_answers_progress_id"), nullable=False,
+        comment="Айди записи прогресса")
+    answer: Mapped[str] = mapped_column(nullable=False, comment="Ответ пользователя")
+    is_right: Mapped[bool] = mapped_column(nullable=False, comment="Верен ли ответ")
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), nullable=False,
+                                                 comment="Время ответа")
 
 
 class AiTasks(Base):
     __tablename__ = "ai_tasks"
+    __table_args__ = (
+        Index("ix_ai_tasks_user_id", "user_id", "id"),
+        Index("ix_ai_tasks_lesson_id", "lesson_id"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, comment="Айди записи")
-    task: Mapped[str] = mapped_column(JSON, nullable=False, comment="Задача от ИИ")
-    answer: Mapped[str] = mapped_column(JSON, nullable=False, comment="Правильный ответ")
-    user_id: Mapped[int] = mapped_column(nullable=True, comment="Айди пользователя")
+    task: Mapped[str] = mapped_column(JSONB, nullable=False, comment="Задача от ИИ")
+    answer: Mapped[str] = mapped_column(JSONB, nullable=False, comment="Правильный ответ")
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE", name="fk_ai_tasks_user_id"),
+                                         nullable=True, comment="Айди пользователя")
+    lesson_id: Mapped[int] = mapped_column(ForeignKey("lessons.id", ondelete="CASCADE", name="fk_ai_tasks_lesson_id"),
+                                           nullable=True, comment="Айди урока, по которому сгенерирована задача")
     status: Mapped[str] = mapped_column(default="in progress", comment="Статус выполнения задания")
 
-    @classmethod
-    async def create_table(cls):
-        async with engine.begin() as connect:
-            logger.info(f"Создаю базу данных {cls.__tablename__}...")
-            await connect.run_sync(
-                lambda sync_conn: cls.metadata.drop_all(sync_conn, tables=[cls.__table__])
-            )
-            await connect.run_sync(
-                lambda sync_conn: cls.metadata.create_all(sync_conn, tables=[cls.__table__])
-            )
-            logger.info("База данных создана!")
-
 
 class Badges(Base):
     __tablename__ = "badges"
+    __table_args__ = (
+        Index("uq_badges_code", "code", unique=True),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, comment="Айди достижения")
+    code: Mapped[str] = mapped_column(nullable=False, comment="Код достижения, по которому на него ссылаются правила")
     badge_name: Mapped[str] = mapped_column(nullable=False, comment="Название достижения")
     badge_type: Mapped[str] = mapped_column(nullable=False, comment="Тип достижения")
     desc: Mapped[str] = mapped_column(nullable=False, comment="Описание достижения")
     emoji: Mapped[str] = mapped_column(nullable=True, comment="Смайлик достижения")
 
-    @classmethod
-    async def create_table(cls):
-        async with engine.begin() as connect:
-            logger.info(f"Создаю базу данных {cls.__tablename__}...")
-            await connect.run_sync(
-                lambda sync_conn: cls.metadata.drop_all(sync_conn, tables=[cls.__table__])
-            )
-            await connect.run_sync(
-                lambda sync_conn: cls.metadata.create_all(sync_conn, tables=[cls.__table__])
-            )
-            logger.info("База данных создана!")
-
 
 class UserBadges(Base):
     __tablename__ = "user_badges"
+    __table_args__ = (
+        Index("uq_user_badges_user_badge", "user_id", "badge_id", unique=True),
+        Index("ix_user_badges_user_id", "user_id", "id", postgresql_include=["badge_id"]),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, comment="Айди записи")
     badge_id: Mapped[int] = mapped_column(nullable=False, comment="Айди достижения")
-    user_id: Mapped[int] = mapped_column(nullable=False,
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE", name="fk_user_badges_user_id"),
+                                         nullable=False,
                                          comment="Айди пользователя, которому принадлежит достижение")
 
-    @classmethod
-    async def create_table(cls):
-        async with engine.begin() as connect:
-            logger.info(f"Создаю базу данных {cls.__tablename__}...")
-            await connect.run_sync(
-                lambda sync_conn: cls.metadata.drop_all(sync_conn, tables=[cls.__table__])
-            )
-            await connect.run_sync(
-                lambda sync_conn: cls.metadata.create_all(sync_conn, tables=[cls.__table__])
-            )
-            logger.info("База данных создана!")
+
+class RefreshTokens(Base):
+    __tablename__ = "refresh_tokens"
+
+    jti: Mapped[str] = mapped_column(primary_key=True, comment="Уникальный идентификатор refresh-токена")
+    family_id: Mapped[str] = mapped_column(nullable=False, index=True,
+                                           comment="Семейство токенов, порожденных одним входом в систему")
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE", name="fk_refresh_tokens_user_id"),
+                                         nullable=False, comment="Айди пользователя")
+    status: Mapped[str] = mapped_column(nullable=False, comment="Статус токена (активен/заменен/отозван)")
+    expires_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False, index=True,
+                                                 comment="Время истечения токена")
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(),
+                                                 comment="Время выдачи токена")
@@ -0,0 +1,73 @@
+from typing import Optional
+from sqlalchemy import select, update, func, values, column, Integer
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.database.model import Course, Lesson
+
+# Шаг между соседними уроками: вставка между ними не требует сдвига остальных.
+# Когда промежуток исчерпан, позиции курса переписываются заново с этим шагом
+POS_GAP = 1024
+
+
+class InvalidMove(ValueError):
+    pass
+
+
+async def lock_course(session: AsyncSession, course_id: int) -> bool:
+    # Изменения порядка уроков одного курса выполняются по очереди
+    query = select(Course.id).where(Course.id == course_id).where(Course.deleted_at.is_(None)).with_for_update()
+    return (await session.execute(query)).scalar() is not None
+
+
+async def next_pos(session: AsyncSession, course_id: int) -> int:
+    query = select(func.coalesce(func.max(Lesson.pos), 0) + POS_GAP).where(Lesson.course_id == course_id)
+    return (await session.execute(query)).scalar_one()
+
+
+def spread(lower: int, upper: int, count: int) -> Optional[list]:
+    # Равномерно раскладывает count позиций строго между lower и upper
+    if upper - lower <= count:
+        return None
+    return [lower + (upper - lower) * (index + 1) // (count + 1) for index in range(count)]
+
+
+async def rebalance(session: AsyncSession, course_id: int):
+    # Одним оператором: уникальность позиций проверяется в конце оператора
+    ranked = select(Lesson.id, func.row_number().over(order_by=(Lesson.pos, Lesson.id)).label("rn")).where(
+        Lesson.course_id == course_id).subquery()
+    await session.execute(update(Lesson).where(Lesson.id == ranked.c.id).values(pos=ranked.c.rn * POS_GAP))
+
+
+async def bounds(session: AsyncSession, course_id: int, lesson_ids: list, after_id: Optional[int]):
+    # Позиции, между которыми встают перемещаемые уроки
+    lower = 0
+    if after_id is not None:
+        query = select(Lesson.pos).where(Lesson.id == after_id).where(Lesson.course_id == course_id)
+        lower = (await session.execute(query)).scalar()
+        if lower is None:
+            raise InvalidMove(f"Урока с айди {after_id} нет в курсе")
+    query = select(func.min(Lesson.pos)).where(Lesson.course_id == course_id).where(Lesson.pos > lower).where(
+        Lesson.id.not_in(lesson_ids))
+    upper = (await session.execute(query)).scalar()
+    if upper is None:
+        upper = lower + (len(lesson_ids) + 1) * POS_GAP
+    return lower, upper
+
+
+async def move(session: AsyncSession, course_id: int, lesson_ids: list, after_id: Optional[int] = None) -> list:
+    # Ставит уроки lesson_ids подряд в указанном порядке сразу после after_id (None - в начало курса)
+    if len(set(lesson_ids)) != len(lesson_ids):
+        raise InvalidMove("Уроки в перестановке повторяются")
+    if after_id in lesson_ids:
+        raise InvalidMove("Урок не может быть поставлен после самого себя")
+    query = select(func.count()).select_from(Lesson).where(Lesson.id.in_(lesson_ids)).where(
+        Lesson.course_id == course_id)
+    if (await session.execute(query)).scalar_one() != len(lesson_ids):
+        raise InvalidMove("Не все уроки относятся к курсу")
+    positions = spread(*await bounds(session, course_id, lesson_ids, after_id), len(lesson_ids))
+    if positions is None:
+        await rebalance(session, course_id)
+        positions = spread(*await bounds(session, course_id, lesson_ids, after_id), len(lesson_ids))
+    moves = values(column("id", Integer), column("pos", Integer), name="moves").data(
+        list(zip(lesson_ids, positions)))
+    await session.execute(update(Lesson).where(Lesson.id == moves.c.id).values(pos=moves.c.pos))
+    return [{"id": lesson_id, "pos": pos} for lesson_id, pos in zip(lesson_ids, positions)]
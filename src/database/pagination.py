@@ -0,0 +1,87 @@
+import base64
+import json
+import math
+from typing import Callable, Optional
+from sqlalchemy import Select, select, func, tuple_, Integer, BigInteger
+from sqlalchemy.ext.asyncio import AsyncSession
+
+DEFAULT_PAGE_LIMIT = 20
+MAX_PAGE_LIMIT = 100
+# До этого числа строк результат считается точно, дальше берется оценка планировщика
+COUNT_ESTIMATE_CAP = 1000
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def clamp_limit(limit: Optional[int]) -> int:
+    if not limit or limit < 1:
+        return DEFAULT_PAGE_LIMIT
+    return min(limit, MAX_PAGE_LIMIT)
+
+
+def encode_cursor(values: list) -> str:
+    raw = json.dumps(values, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def cursor_value_check(column) -> Callable:
+    # Значение курсора должно подходить к типу колонки сортировки, иначе ошибку вернет уже БД
+    if isinstance(column.type, Integer):
+        bound = 2 ** 63 if isinstance(column.type, BigInteger) else 2 ** 31
+        return lambda value: isinstance(value, int) and -bound <= value < bound
+    if column.type.python_type is float:
+        return lambda value: isinstance(value, (int, float)) and math.isfinite(value)
+    return lambda value: isinstance(value, column.type.python_type)
+
+
+def decode_cursor(cursor: str, columns: list) -> list:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (ValueError, TypeError):
+        raise InvalidCursor(cursor)
+    if not isinstance(values, list) or len(values) != len(columns):
+        raise InvalidCursor(cursor)
+    if not all(not isinstance(value, bool) and cursor_value_check(column)(value)
+               for value, column in zip(values, columns)):
+        raise InvalidCursor(cursor)
+    return values
+
+
+def page(items: list, next_cursor: Optional[str], **extra) -> dict:
+    # Единый формат страницы для всех списков
+    return {"items": items, "next_cursor": next_cursor, **extra}
+
+
+async def paginate(session: AsyncSession, query: Select, columns: list, key: Callable, cursor: Optional[str] = None,
+                   limit: Optional[int] = None, descending: bool = False):
+    # Постраничная выборка по ключу: следующая страница начинается строго после последней строки предыдущей.
+    # Колонки сортировки должны однозначно определять строку (последней обычно идет id).
+    limit = clamp_limit(limit)
+    if cursor:
+        values = decode_cursor(cursor, columns)
+        boundary = tuple_(*columns) < tuple_(*values) if descending else tuple_(*columns) > tuple_(*values)
+        query = query.where(boundary)
+    order = [column.desc() if descending else column.asc() for column in columns]
+    state = await session.execute(query.order_by(*order).limit(limit + 1))
+    rows = state.all()
+    next_cursor = encode_cursor(key(rows[limit - 1])) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+
+async def estimate_count(session: AsyncSession, query: Select, cap: int = COUNT_ESTIMATE_CAP) -> dict:
+    capped = select(func.count()).select_from(query.order_by(None).limit(cap + 1).subquery()).execution_options(
+        **query.get_execution_options())
+    count = (await session.execute(capped)).scalar_one()
+    if count <= cap:
+        return {"count": count, "exact": True}
+    # Точный подсчет большого результата дороже самой страницы, поэтому берется оценка планировщика
+    # Оценка берется с того же сервера, что и сама выборка
+    connection = await session.connection(bind_arguments={"clause": query})
+    compiled = query.order_by(None).compile(dialect=connection.dialect)
+    params = tuple(compiled.params[name] for name in compiled.positiontup)
+    state = await connection.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled.string}", params)
+    planned = int(state.scalar()[0]["Plan"]["Plan Rows"])
+    return {"count": max(planned, cap + 1), "exact": False}
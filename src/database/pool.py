@@ -0,0 +1,40 @@
+import time
+from sqlalchemy import exc
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from src.utils.metrics import Histogram
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    # Пул соединений, который замеряет ожидание свободного соединения и считает таймауты
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.wait_time = Histogram()
+        self.timeouts = 0
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            self.timeouts += 1
+            raise
+        finally:
+            self.wait_time.observe(time.perf_counter() - start)
+
+
+def pool_stats(engine: AsyncEngine) -> dict:
+    pool = engine.pool
+    stats = {
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "idle": pool.checkedin(),
+        # До заполнения основного пула SQLAlchemy возвращает отрицательное значение
+        "overflow": max(pool.overflow(), 0),
+        "max_overflow": pool._max_overflow,
+        "timeout": pool.timeout()
+    }
+    if isinstance(pool, TimedQueuePool):
+        stats["timeouts"] = pool.timeouts
+        stats["wait_time"] = pool.wait_time.snapshot()
+    return stats
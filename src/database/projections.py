@@ -0,0 +1,46 @@
+import re
+from typing import Optional
+
+# Поля, доступные в списках. Тяжелые и закрытые колонки (материал урока, ответы) сюда не входят
+COURSE_FIELDS = ("id", "course_title", "author", "desc", "course_categories", "course_num_peoples", "num_lessons")
+LESSON_SUMMARY_FIELDS = ("id", "course_id", "lesson_title", "lesson_type", "desc", "question_lesson", "attempts",
+                         "lesson_num_success_peoples", "level", "pos")
+TASK_FIELDS = ("id", "task", "status")
+# JSON-колонки, из которых можно запросить отдельные ключи: "task.text" вернет только task -> text,
+# ключ извлекается в БД и остальной документ не передается и не декодируется
+TASK_JSON_FIELDS = ("task",)
+JSON_KEY_PATH = re.compile(r"\w+(\.\w+)+")
+
+
+class InvalidFields(ValueError):
+    pass
+
+
+def is_json_key(field: str, json_fields: tuple) -> bool:
+    return bool(JSON_KEY_PATH.fullmatch(field)) and field.split(".", 1)[0] in json_fields
+
+
+def parse_fields(fields: Optional[str], allowed: tuple, json_fields: tuple = ()) -> tuple:
+    # Строка вида "id,lesson_title" превращается в список полей, id возвращается всегда
+    if not fields:
+        return allowed
+    requested = tuple(dict.fromkeys(field.strip() for field in fields.split(",") if field.strip()))
+    unknown = [field for field in requested if field not in allowed and not is_json_key(field, json_fields)]
+    if unknown:
+        raise InvalidFields(", ".join(unknown))
+    return requested if "id" in requested else ("id",) + requested
+
+
+def select_fields(model, fields: tuple, *keys: str) -> list:
+    # Колонки для select() (и ключи сортировки): ключи JSON-документов извлекаются оператором #> на стороне БД
+    columns = []
+    for field in dict.fromkeys(fields + keys):
+        name, _, path = field.partition(".")
+        column = getattr(model, name)
+        columns.append(column[tuple(path.split("."))].label(field) if path else column)
+    return columns
+
+
+def project(row: dict, fields: tuple) -> dict:
+    # Только запрошенные поля, без служебных ключей сортировки
+    return {field: row[field] for field in fields}
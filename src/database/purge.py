@@ -0,0 +1,87 @@
+import asyncio
+from sqlalchemy import select, delete, and_, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.database.model import session_maker, db_config, Course, Lesson, UserProgress
+from src.api.v1.enums import MaterialTypes
+from src.utils.logger import logger
+
+
+def course_progress(course_id: int):
+    # Прогресс по самому курсу и по всем его урокам
+    lessons = select(Lesson.id).where(Lesson.course_id == course_id)
+    return or_(and_(UserProgress.material_type == MaterialTypes.COURSE, UserProgress.material_id == course_id),
+               and_(UserProgress.material_type == MaterialTypes.LECTURE, UserProgress.material_id.in_(lessons)))
+
+
+async def cascade_delete(session: AsyncSession, course_id: int):
+    # Уроки и задачи ИИ по ним удаляются внешними ключами вместе с курсом, прогресс - отдельным DELETE
+    await session.execute(delete(UserProgress).where(course_progress(course_id)).execution_options(
+        synchronize_session=False))
+    await session.execute(delete(Course).where(Course.id == course_id).execution_options(synchronize_session=False))
+
+
+class CoursePurger:
+    # Фоновое удаление курсов, помеченных удаленными: строки удаляются пачками, каждая пачка - своя транзакция,
+    # чтобы не держать долгие блокировки на больших курсах
+    def __init__(self, interval: float, batch_size: int):
+        self.interval = interval
+        self.batch_size = batch_size
+        self._wake = asyncio.Event()
+        self.purged_courses = 0
+        self.purged_rows = 0
+        self.failed = 0
+
+    def notify(self):
+        # Очередной курс помечен удаленным - очистка начинается, не дожидаясь периода
+        self._wake.set()
+
+    async def purge_batch(self, course_id: int) -> bool:
+        async with session_maker() as session:
+            for model, condition in ((UserProgress, course_progress(course_id)), (Lesson, Lesson.course_id == course_id)):
+                batch = select(model.id).where(condition).limit(self.batch_size)
+                state = await session.execute(delete(model).where(model.id.in_(batch)).execution_options(
+                    synchronize_session=False))
+                if state.rowcount:
+                    await session.commit()
+                    self.purged_rows += state.rowcount
+                    return False
+            await cascade_delete(session, course_id)
+            await session.commit()
+            return True
+
+    async def purge(self):
+        try:
+            async with session_maker() as session:
+                state = await session.execute(select(Course.id).where(Course.deleted_at.is_not(None)))
+                course_ids = state.scalars().all()
+        except Exception as e:
+            logger.error(e)
+            self.failed += 1
+            return
+        for course_id in course_ids:
+            try:
+                while not await self.purge_batch(course_id):
+                    await asyncio.sleep(0)
+                self.purged_courses += 1
+            except Exception as e:
+                logger.error(e)
+                self.failed += 1
+
+    async def run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.purge()
+
+    def stats(self) -> dict:
+        return {
+            "purged_courses": self.purged_courses,
+            "purged_rows": self.purged_rows,
+            "failed": self.failed
+        }
+
+
+purger = CoursePurger(interval=db_config.PURGE_INTERVAL, batch_size=db_config.PURGE_BATCH_SIZE)
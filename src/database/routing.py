@@ -0,0 +1,116 @@
+import asyncio
+import itertools
+from typing import Optional
+from sqlalchemy import text, Select
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import visitors
+from sqlalchemy.sql.lambdas import StatementLambdaElement
+from sqlalchemy.sql.selectable import CTE
+from src.utils.logger import logger
+
+ROUND_ROBIN = "round_robin"
+LEAST_CONNECTIONS = "least_connections"
+
+
+class ReplicaRouter:
+    # Выбор реплики для чтения. Недоступные реплики исключаются до следующей успешной проверки
+    def __init__(self, replicas: list, strategy: str = ROUND_ROBIN, check_interval: float = 5.0,
+                 check_timeout: float = 2.0):
+        self.replicas: list[AsyncEngine] = replicas
+        self.strategy = strategy
+        self.check_interval = check_interval
+        self.check_timeout = check_timeout
+        self._healthy = set(range(len(replicas)))
+        self._counter = itertools.count()
+        self.routed = 0
+        self.fallbacks = 0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.replicas)
+
+    def pick(self) -> Optional[AsyncEngine]:
+        healthy = [replica for index, replica in enumerate(self.replicas) if index in self._healthy]
+        if not healthy:
+            # Все реплики недоступны - чтение уходит на основной сервер
+            self.fallbacks += 1
+            return None
+        self.routed += 1
+        if self.strategy == LEAST_CONNECTIONS:
+            return min(healthy, key=lambda replica: replica.pool.checkedout())
+        return healthy[next(self._counter) % len(healthy)]
+
+    def mark_down(self, replica: AsyncEngine):
+        self._healthy.discard(self.replicas.index(replica))
+
+    def mark_up(self, replica: AsyncEngine):
+        self._healthy.add(self.replicas.index(replica))
+
+    @staticmethod
+    async def ping(replica: AsyncEngine):
+        async with replica.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+
+    async def check(self):
+        for replica in self.replicas:
+            try:
+                await asyncio.wait_for(self.ping(replica), timeout=self.check_timeout)
+                self.mark_up(replica)
+            except Exception as e:
+                logger.error(f"Реплика {replica.url.host}:{replica.url.port} недоступна: {e}")
+                self.mark_down(replica)
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.check_interval)
+            await self.check()
+
+    def stats(self) -> dict:
+        return {
+            "replicas": len(self.replicas),
+            "healthy": len(self._healthy),
+            "strategy": self.strategy,
+            "routed": self.routed,
+            "fallbacks": self.fallbacks
+        }
+
+
+def writes(clause) -> bool:
+    if clause is None:
+        return False
+    # Запросы из реестра горячих запросов (lambda_stmt) проверяются по построенному из них выражению
+    if isinstance(clause, StatementLambdaElement):
+        clause = clause._resolved
+    if getattr(clause, "is_dml", False) or not isinstance(clause, Select):
+        return True
+    # SELECT ... FOR UPDATE блокирует строки для последующей записи
+    if clause._for_update_arg is not None:
+        return True
+    # SELECT с изменяющими CTE (UPDATE ... RETURNING внутри WITH) тоже является записью
+    return any(isinstance(element, CTE) and element.element.is_dml for element in visitors.iterate(clause))
+
+
+class RoutingSession(Session):
+    # Запросы с execution_options(replica=True) читаются с реплики, остальное идет на основной сервер.
+    # После первой записи сессия до конца работает только с основным сервером, чтобы видеть свои изменения.
+    # Данные, которые отдаются под версиями (кэш сущностей, ETag), replica=True не помечаются: отстающая
+    # реплика вернула бы старые данные под новой версией
+    router: Optional[ReplicaRouter] = None
+
+    def get_bind(self, mapper=None, *, clause=None, **kw):
+        if self.router is None or not self.router.enabled:
+            return super().get_bind(mapper, clause=clause, **kw)
+        if self._flushing or writes(clause):
+            self.info["wrote"] = True
+        elif not self.info.get("wrote") and clause is not None and clause.get_execution_options().get("replica"):
+            # В пределах сессии используется одна реплика
+            replica = self.info.get("replica") or self.router.pick()
+            if replica is not None:
+                self.info["replica"] = replica
+                return replica.sync_engine
+        return super().get_bind(mapper, clause=clause, **kw)
+
+
+def routing_session_class(router: ReplicaRouter):
+    return type("ReplicaRoutingSession", (RoutingSession,), {"router": router})
@@ -0,0 +1,73 @@
+from contextlib import asynccontextmanager
+from typing import Optional
+from fastapi import Request
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.database.model import session_maker
+from src.database.counters import counters
+from src.database.entity_cache import entity_cache
+from src.api.v1.methods import principal_cache
+
+
+@asynccontextmanager
+async def session_scope(session: Optional[AsyncSession] = None):
+    # Если передана сессия запроса - работаем в ней, иначе открываем собственную
+    if session is not None:
+        yield session
+    else:
+        async with session_maker() as own_session:
+            yield own_session
+
+
+async def commit(session: AsyncSession):
+    # Внутри единицы работы транзакцию фиксирует finish до отправки ответа, методы только сбрасывают изменения
+    if session.info.get("unit_of_work"):
+        await session.flush()
+    else:
+        await session.commit()
+
+
+async def rollback(session: AsyncSession):
+    await session.rollback()
+    if session.info.get("unit_of_work"):
+        # Часть изменений запроса уже потеряна, фиксировать остаток нельзя
+        session.info["failed"] = True
+
+
+async def finish(session: AsyncSession) -> bool:
+    # Завершение единицы работы: фиксация и применение отложенных счетчиков и инвалидаций кэша.
+    # False - если часть изменений откатилась и запрос не сохранен. После завершения сессия
+    # работает как обычная: методы сами фиксируют свои изменения
+    if not session.info.pop("unit_of_work", False):
+        return True
+    if session.info.pop("failed", False):
+        await session.rollback()
+        session.info.pop("cache_entities", None)
+        session.info.pop("counter_deltas", None)
+        session.info.pop("principals", None)
+        return False
+    try:
+        await session.commit()
+    except Exception:
+        await session.rollback()
+        raise
+    await counters.accept(session)
+    await entity_cache.accept(session)
+    principal_cache.accept(session)
+    return True
+
+
+async def get_session(request: Request):
+    # Зависимость FastAPI: одна сессия и одна транзакция на весь запрос. Фиксирует ее UnitOfWorkRoute
+    # до отправки ответа, завершение зависимости выполняется уже после отправки
+    async with session_maker(info={"unit_of_work": True}) as session:
+        request.state.session = session
+        try:
+            yield session
+        except Exception:
+            await session.rollback()
+            raise
+        finally:
+            request.state.session = None
+        # Маршрут без UnitOfWorkRoute: откатываем незавершенную работу, а не фиксируем ее после ответа
+        if session.info.get("unit_of_work"):
+            await session.rollback()
@@ -0,0 +1,81 @@
+from typing import Optional
+from sqlalchemy import select, exists, lambda_stmt
+from src.database.model import Users, Course, Lesson, UserProgress, RefreshTokens
+from src.database.dto import LessonDTO, columns
+from src.api.v1.enums import TokenStatus
+from src.utils.logger import logger
+
+# Реестр горячих запросов. lambda_stmt разбирает лямбду один раз на место в коде и дальше берет готовый
+# запрос и его ключ кэша компиляции, подставляя только значения параметров. Текст SQL при этом не меняется,
+# поэтому подготовленное выражение asyncpg на соединении тоже переиспользуется
+HOT_STATEMENTS = {}
+LESSON_COLUMNS = tuple(columns(LessonDTO, Lesson))
+
+
+def hot(builder):
+    HOT_STATEMENTS[builder.__name__] = builder
+    return builder
+
+
+@hot
+def user_credentials(username: str):
+    return lambda_stmt(lambda: select(Users.id, Users.password, Users.role).where(Users.username == username))
+
+
+@hot
+def user_by_id(user_id: int):
+    return lambda_stmt(lambda: select(Users).where(Users.id == user_id))
+
+
+@hot
+def user_id_by_name(username: str):
+    return lambda_stmt(lambda: select(Users.id).where(Users.username == username))
+
+
+@hot
+def course_author(course_id: int):
+    return lambda_stmt(lambda: select(Course.author).where(Course.id == course_id).where(
+        Course.deleted_at.is_(None)))
+
+
+@hot
+def lesson_course(lesson_id: int):
+    return lambda_stmt(lambda: select(Lesson.course_id).where(Lesson.id == lesson_id))
+
+
+@hot
+def lesson_by_id(lesson_id: int, fields: Optional[tuple] = None):
+    # С основного сервера: результат кэшируется под версиями (см. RoutingSession).
+    # Уроки удаленного курса не отдаются, пока их не удалила фоновая очистка
+    stmt = lambda_stmt(lambda: select(*LESSON_COLUMNS).where(Lesson.id == lesson_id).where(
+        exists().where(Course.id == Lesson.course_id).where(Course.deleted_at.is_(None))))
+    if fields:
+        # Набор полей входит в ключ кэша: для каждого набора свой скомпилированный запрос
+        selected = columns(LessonDTO, Lesson, tuple(fields))
+        stmt = stmt.add_criteria(lambda s: s.with_only_columns(*selected), track_on=[",".join(fields)])
+    return stmt
+
+
+@hot
+def progress_status(user_id: int, material_id: int):
+    return lambda_stmt(lambda: select(UserProgress.status).where(UserProgress.user_id == user_id).where(
+        UserProgress.material_id == material_id))
+
+
+@hot
+def progress(user_id: int, material_id: int, material_type: str):
+    return lambda_stmt(lambda: select(UserProgress).where(UserProgress.user_id == user_id).where(
+        UserProgress.material_id == material_id).where(UserProgress.material_type == material_type))
+
+
+@hot
+def family_revoked(family_id: str):
+    return lambda_stmt(lambda: select(exists().where(RefreshTokens.family_id == family_id).where(
+        RefreshTokens.status == TokenStatus.REVOKED)))
+
+
+def check_cache_size(cache_size: int):
+    # Горячие запросы должны помещаться в кэш подготовленных выражений соединения вместе с остальными
+    if 0 < cache_size < len(HOT_STATEMENTS):
+        logger.warning(f"STATEMENT_CACHE_SIZE={cache_size} меньше числа горячих запросов "
+                       f"({len(HOT_STATEMENTS)}): подготовленные выражения будут вытесняться")
@@ -0,0 +1,80 @@
+import uuid
+import pytest
+from contextlib import contextmanager
+from fastapi.testclient import TestClient
+from sqlalchemy import delete
+from src.database.model import engine, session_maker, Course, Users
+
+
+@contextmanager
+def live_client(app):
+    # Соединения общего движка привязаны к циклу событий: пул от прошлых тестов отбрасывается без закрытия,
+    # свой закрывается в цикле клиента. Остановка приложения (запись счетчиков) может открыть новое
+    # соединение уже после этого, поэтому пул отбрасывается и после выхода
+    engine.sync_engine.dispose(close=False)
+    with TestClient(app) as client:
+        try:
+            yield client
+        finally:
+            client.portal.call(engine.dispose)
+    engine.sync_engine.dispose(close=False)
+
+
+class Accounts:
+    # Пользователи, зарегистрированные тестами модуля. Удаляются вместе с их курсами,
+    # остальное (прогресс, ответы, токены, достижения) удаляется каскадом
+    def __init__(self, client: TestClient):
+        self.client = client
+        self.usernames = []
+
+    def register(self, username: str = None) -> str:
+        username = username or "t" + uuid.uuid4().hex[:10]
+        self.usernames.append(username)
+        response = self.client.post("/api/v1/auth/register", json={
+            "username": username, "password": "password", "first_name": "Тест", "last_name": "Тестов", "age": 20,
+            "email": f"{username}@example.com"})
+        assert response.status_code == 200, response.text
+        return username
+
+    def tokens(self, username: str) -> dict:
+        response = self.client.post("/api/v1/auth/login", data={"username": username, "password": "password"})
+        assert response.status_code == 200, response.text
+        return response.json()
+
+    def login(self, username: str) -> dict:
+        return {"Authorization": f"Bearer {self.tokens(username)['access_token']}"}
+
+    def new(self) -> dict:
+        return self.login(self.register())
+
+    async def cleanup(self):
+        async with session_maker() as session:
+            await session.execute(delete(Course).where(Course.author.in_(self.usernames)))
+            await session.execute(delete(Users).where(Users.username.in_(self.usernames)))
+            await session.commit()
+
+
+def practical_lesson(client: TestClient, headers: dict, attempts: int = 3) -> int:
+    # Курс из одного практического урока с ответом "4"; пользователь сразу записывается на урок
+    course = client.post("/api/v1/course/import", headers=headers, json={
+        "course_title": "Курс для ответа", "desc": "Курс для проверки ответа", "course_categories": "test",
+        "lessons": [{"lesson_title": "Урок", "desc": "Практический урок", "material": "М" * 40, "level": 1,
+                     "question_lesson": "2+2", "answer_lesson": "4", "attempts": attempts}]}).json()["data"]
+    lesson_id = client.get("/api/v1/lesson/getLessons", headers=headers,
+                           params={"course_id": course["course_id"]}).json()["data"]["items"][0]["id"]
+    assert client.post("/api/v1/lesson/sign", headers=headers, json={"lesson_id": lesson_id}).status_code == 200
+    return lesson_id
+
+
+@pytest.fixture(scope="module")
+def client():
+    from src.api.v1.entry.run import app
+    with live_client(app) as client:
+        yield client
+
+
+@pytest.fixture(scope="module")
+def accounts(client):
+    accounts = Accounts(client)
+    yield accounts
+    client.portal.call(accounts.cleanup)
@@ -0,0 +1,103 @@
+import asyncio
+from sqlalchemy import select
+from src.database.answer_engine import AnswerEngine
+from src.database.methods import UserMethods
+from src.database.model import session_maker, db_config, UserProgress, ProgressAnswers
+from src.database.responses import SuccessResponse, FailedResponse
+from src.api.v1.enums import MaterialTypes, ProgressTypes
+from test.conftest import practical_lesson
+
+
+def start(client, accounts, attempts: int = 3):
+    username = accounts.register()
+    lesson_id = practical_lesson(client, accounts.login(username), attempts=attempts)
+    return client.portal.call(UserMethods.get_user_id, username).data, lesson_id
+
+
+def submit(client, user_id: int, lesson_id: int, answer: str):
+    return client.portal.call(AnswerEngine.submit, user_id, lesson_id, answer)
+
+
+def stored(client, user_id: int, lesson_id: int):
+    async def read():
+        async with session_maker() as session:
+            progress = (await session.execute(select(UserProgress.id, UserProgress.status, UserProgress.attempts).where(
+                UserProgress.user_id == user_id).where(UserProgress.material_id == lesson_id).where(
+                UserProgress.material_type == MaterialTypes.LECTURE))).one()
+            answers = (await session.execute(select(ProgressAnswers.answer, ProgressAnswers.is_right).where(
+                ProgressAnswers.progress_id == progress.id).order_by(ProgressAnswers.id))).all()
+            return (progress.status, progress.attempts), [tuple(answer) for answer in answers]
+
+    return client.portal.call(read)
+
+
+def test_right_answer_completes_the_lesson(client, accounts):
+    user_id, lesson_id = start(client, accounts)
+    response = submit(client, user_id, lesson_id, "4")
+    assert isinstance(response, SuccessResponse)
+    assert response.data == {"right": True, "status": ProgressTypes.COMPLETED, "attempts": 3, "user_answers": ["4"],
+                             "success_in_a_row": 1, "answer_id": response.data["answer_id"]}
+    assert stored(client, user_id, lesson_id) == ((ProgressTypes.COMPLETED, 3), [("4", True)])
+
+
+def test_wrong_answer_spends_an_attempt_and_resets_the_streak(client, accounts):
+    user_id, lesson_id = start(client, accounts)
+    submit(client, user_id, lesson_id, "5")
+    response = submit(client, user_id, lesson_id, "6")
+    assert response.data["right"] is False
+    assert response.data["attempts"] == 1 and response.data["status"] == ProgressTypes.PROGRESS
+    assert response.data["user_answers"] == ["5", "6"] and response.data["success_in_a_row"] == 0
+    assert stored(client, user_id, lesson_id) == ((ProgressTypes.PROGRESS, 1), [("5", False), ("6", False)])
+
+
+def test_answer_after_attempts_are_exhausted_is_rejected_but_logged(client, accounts):
+    user_id, lesson_id = start(client, accounts, attempts=1)
+    submit(client, user_id, lesson_id, "5")
+    response = submit(client, user_id, lesson_id, "4")
+    assert isinstance(response, FailedResponse) and response.status_code == 403
+    assert stored(client, user_id, lesson_id) == ((ProgressTypes.PROGRESS, 0), [("5", False), ("4", False)])
+
+
+def test_answer_to_a_completed_lesson_is_rejected(client, accounts):
+    user_id, lesson_id = start(client, accounts)
+    submit(client, user_id, lesson_id, "4")
+    response = submit(client, user_id, lesson_id, "4")
+    assert isinstance(response, FailedResponse) and response.status_code == 400
+    assert stored(client, user_id, lesson_id) == ((ProgressTypes.COMPLETED, 3), [("4", True)])
+
+
+def test_concurrent_answers_spend_the_last_attempt_once(client, accounts):
+    user_id, lesson_id = start(client, accounts, attempts=1)
+
+    async def race():
+        # Каждый ответ в своей сессии и транзакции
+        return await asyncio.gather(AnswerEngine.submit(user_id, lesson_id, "5"),
+                                    AnswerEngine.submit(user_id, lesson_id, "6"))
+
+    responses = client.portal.call(race)
+    assert sorted(type(response).__name__ for response in responses) == ["FailedResponse", "SuccessResponse"]
+    assert next(response for response in responses if isinstance(response, FailedResponse)).status_code == 403
+    (status, attempts), answers = stored(client, user_id, lesson_id)
+    assert (status, attempts) == (ProgressTypes.PROGRESS, 0)
+    assert sorted(answers) == [("5", False), ("6", False)]
+
+
+def test_rejected_answer_is_kept_through_the_api(client, accounts):
+    headers = accounts.new()
+    lesson_id = practical_lesson(client, headers, attempts=1)
+    for answer, status_code in (("5", 200), ("4", 403)):
+        response = client.post("/api/v1/lesson/answerLesson", headers=headers,
+                               json={"lesson_id": lesson_id, "answer": answer})
+        assert response.status_code == status_code
+    response = client.get(f"/api/v1/lesson/{lesson_id}/answers", headers=headers)
+    assert [item["answer"] for item in response.json()["data"]["items"]] == ["4", "5"]
+
+
+def test_only_recent_answers_are_returned_inline(client, accounts, monkeypatch):
+    monkeypatch.setattr(db_config, "ANSWERS_INLINE_LIMIT", 2)
+    user_id, lesson_id = start(client, accounts, attempts=5)
+    for answer in ("1", "2", "3"):
+        response = submit(client, user_id, lesson_id, answer)
+    assert response.data["user_answers"] == ["2", "3"]
+    # В журнале остаются все ответы
+    assert stored(client, user_id, lesson_id)[1] == [("1", False), ("2", False), ("3", False)]
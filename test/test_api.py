@@ -0,0 +1,180 @@
+import uuid
+from sqlalchemy import select, update, insert
+from src.database.methods import BadgeMethods, LessonMethods, UserMethods
+from src.database.counters import counters
+from src.database.entity_cache import entity_cache, stats_key
+from src.utils.cache import MISSING
+from test.conftest import practical_lesson
+from src.database.pagination import encode_cursor
+from src.database.model import session_maker, Lesson, Users, UserProgress, ProgressAnswers, AiTasks
+from src.database.responses import FailedResponse
+from src.api.v1.enums import ProgressTypes, Roles
+
+
+def test_login_right_after_registration(client, accounts):
+    username = "t" + uuid.uuid4().hex[:10]
+    # Неудачный вход до регистрации не должен мешать входу сразу после нее
+    assert client.post("/api/v1/auth/login", data={"username": username, "password": "password"}).status_code == 404
+    accounts.register(username)
+    accounts.login(username)
+
+
+def test_unknown_username_is_answered_from_cache(client, monkeypatch):
+    username = "t" + uuid.uuid4().hex[:10]
+    calls = []
+    get_credentials = UserMethods.get_credentials
+
+    async def counted(username, session=None):
+        calls.append(username)
+        return await get_credentials(username, session=session)
+
+    monkeypatch.setattr(UserMethods, "get_credentials", counted)
+    for _ in range(3):
+        assert client.post("/api/v1/auth/login",
+                           data={"username": username, "password": "password"}).status_code == 404
+    assert calls == [username]
+
+
+def test_metrics_are_for_admins_only(client, accounts):
+    username = accounts.register()
+    headers = accounts.login(username)
+    assert client.get("/api/v1/internal/metrics", headers=headers).status_code == 403
+
+    async def promote():
+        async with session_maker() as session:
+            await session.execute(update(Users).where(Users.username == username).values(role=Roles.ADMIN))
+            await session.commit()
+
+    client.portal.call(promote)
+    response = client.get("/api/v1/internal/metrics", headers=headers)
+    assert response.status_code == 200
+    assert "db_pool" in response.json()["data"]
+
+
+def test_cached_lesson_sees_flushed_counters(client, accounts):
+    headers = accounts.new()
+    lesson_id = practical_lesson(client, headers)
+
+    async def solved():
+        response = await LessonMethods.get_lesson(lesson_id)
+        return response.data.lesson_num_success_peoples
+
+    # Урок попадает в кэш до ответа, затем приращение записывается в БД
+    assert client.portal.call(solved) == 0
+    response = client.post("/api/v1/lesson/answerLesson", headers=headers, json={"lesson_id": lesson_id, "answer": "4"})
+    assert response.status_code == 200
+    client.portal.call(counters.flush)
+    assert client.portal.call(solved) == 1
+
+
+def test_lesson_read_during_a_change_is_not_cached_under_new_versions(client, accounts):
+    lesson_id = practical_lesson(client, accounts.new())
+
+    async def read():
+        async with session_maker() as session:
+            course_id = (await session.execute(select(Lesson.course_id).where(Lesson.id == lesson_id))).scalar()
+            execute = session.execute
+
+            async def racing(statement, *args, **kwargs):
+                result = await execute(statement, *args, **kwargs)
+                # Запись счетчиков курса фиксируется, пока урок читается
+                await entity_cache.bump([stats_key(course_id)])
+                return result
+
+            session.execute = racing
+            await LessonMethods.get_lesson(lesson_id, session=session)
+        return await entity_cache.get(("lesson", lesson_id, None))
+
+    assert client.portal.call(read) is MISSING
+
+
+def test_flushed_deltas_are_not_counted_twice(client, accounts, monkeypatch):
+    lesson_id = practical_lesson(client, accounts.new())
+    seen = []
+
+    async def listener(rows):
+        seen.append(counters.pending(Lesson, "lesson_num_success_peoples", lesson_id))
+
+    async def flush():
+        await counters.increment(Lesson, "lesson_num_success_peoples", lesson_id)
+        await counters.flush()
+
+    monkeypatch.setattr(counters, "listeners", counters.listeners + [listener])
+    client.portal.call(flush)
+    # Во время уведомления приращение уже в БД и не должно подмешиваться к прочитанной строке
+    assert seen == [0]
+
+
+def test_badge_failure_keeps_the_answer(client, accounts, monkeypatch):
+    headers = accounts.new()
+    lesson_id = practical_lesson(client, headers)
+
+    async def give_many(user_id, badge_ids, session=None):
+        return FailedResponse(status_code=500, detail="Ошибка при получении данных")
+
+    monkeypatch.setattr(BadgeMethods, "give_many", give_many)
+    response = client.post("/api/v1/lesson/answerLesson", headers=headers, json={"lesson_id": lesson_id, "answer": "4"})
+    assert response.status_code == 200
+    assert "Не удалось проверить достижения" in response.json()["data"]
+
+    async def stored():
+        async with session_maker() as session:
+            query = select(UserProgress.status, ProgressAnswers.is_right).join(
+                ProgressAnswers, ProgressAnswers.progress_id == UserProgress.id).where(
+                UserProgress.material_id == lesson_id)
+            return (await session.execute(query)).all()
+
+    assert [tuple(row) for row in client.portal.call(stored)] == [(ProgressTypes.COMPLETED, True)]
+
+
+def test_cursor_of_wrong_types_is_rejected(client, accounts):
+    headers = accounts.new()
+    lesson_id = practical_lesson(client, headers)
+    course_id = client.portal.call(LessonMethods.get_lesson, lesson_id).data.course_id
+    response = client.get("/api/v1/lesson/getLessons", headers=headers,
+                          params={"course_id": course_id, "cursor": encode_cursor(["a", "b"])})
+    assert response.status_code == 400
+
+
+def test_if_none_match_star_does_not_hide_a_missing_course(client, accounts):
+    response = client.get("/api/v1/lesson/getLessons", headers={**accounts.new(), "If-None-Match": "*"},
+                          params={"course_id": 999999999})
+    assert response.status_code == 404
+
+
+def test_course_list_returns_only_requested_fields(client, accounts):
+    headers = accounts.new()
+    response = client.post("/api/v1/course/addCourse", headers=headers, json={
+        "course_title": "Курс для полей", "desc": "Описание курса для полей", "course_categories": "test"})
+    assert response.status_code == 200, response.text
+    response = client.get("/api/v1/course/getCourse", headers=headers,
+                          params={"name": "Курс для полей", "fields": "id,course_title"})
+    assert response.status_code == 200, response.text
+    items = response.json()["data"]["items"]
+    assert items and all(set(item) == {"id", "course_title"} for item in items)
+
+
+def test_ai_task_list_returns_only_requested_keys(client, accounts):
+    username = accounts.register()
+    headers = accounts.login(username)
+    user_id = client.portal.call(UserMethods.get_user_id, username).data
+
+    async def add_task():
+        async with session_maker() as session:
+            await session.execute(insert(AiTasks).values(
+                task={"text": "Сложите 2 и 2", "hint": "Подсказка"}, answer={"text": "4"}, user_id=user_id))
+            await session.commit()
+
+    client.portal.call(add_task)
+    response = client.get("/api/v1/lesson/get-ai-tasks", headers=headers, params={"fields": "task.text"})
+    assert response.status_code == 200, response.text
+    [item] = response.json()["data"]["items"]
+    assert item == {"id": item["id"], "task.text": "Сложите 2 и 2"}
+
+
+def test_unknown_fields_are_rejected(client, accounts):
+    headers = accounts.new()
+    for url, fields in (("/api/v1/course/getCourse", "id,answer"), ("/api/v1/lesson/get-ai-tasks", "answer.text"),
+                        ("/api/v1/lesson/get-ai-tasks", "status.text")):
+        response = client.get(url, headers=headers, params={"fields": fields})
+        assert response.status_code == 400, (url, fields, response.text)
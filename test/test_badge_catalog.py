@@ -0,0 +1,25 @@
+import pytest
+from src.badges import catalog as catalog_module
+from src.badges.catalog import BadgeCatalog
+from src.database.dto import BadgeDTO
+from src.database.responses import SuccessResponse
+
+
+@pytest.mark.asyncio
+async def test_unknown_badge_reloads_catalog_once(monkeypatch):
+    rows = [BadgeDTO(1, "first_solve", "Первое", "Серия", "Решить первую задачу", None)]
+    loads = []
+
+    async def get_catalog():
+        loads.append(1)
+        return SuccessResponse(status_code=200, data=list(rows))
+
+    monkeypatch.setattr(catalog_module.BadgeMethods, "get_catalog", get_catalog)
+    catalog = BadgeCatalog()
+    await catalog.reload()
+    assert catalog.by_code("first_solve").id == 1
+    rows.append(BadgeDTO(2, "streak_10", "Серия", "Серия", "Решить 10 задач подряд", None))
+    assert [badge.id for badge in await catalog.resolve([2, 1, 3])] == [2, 1]
+    # Айди, которого нет и после перечитывания, больше не вызывает загрузку
+    await catalog.resolve([3])
+    assert len(loads) == 2 and catalog.reloads == 2
@@ -0,0 +1,31 @@
+import pytest
+from src.badges import dispatcher as dispatcher_module
+from src.badges.catalog import BadgeCatalog, BadgeCodes
+from src.badges.dispatcher import BadgeDispatcher
+from src.badges.status import BadgeScanStatus
+from src.database.dto import BadgeDTO, BadgeContext
+from src.database.responses import SuccessResponse
+
+
+@pytest.mark.asyncio
+async def test_scan_skips_held_badges_and_awards_the_rest_in_one_batch(monkeypatch):
+    catalog = BadgeCatalog()
+    monkeypatch.setattr(dispatcher_module, "badge_catalog", catalog)
+    monkeypatch.setattr(catalog, "by_code", {
+        BadgeCodes.STREAK_10: BadgeDTO(1, BadgeCodes.STREAK_10, "Серия", "Серия", "10 подряд", None),
+        BadgeCodes.FIRST_SOLVE: BadgeDTO(2, BadgeCodes.FIRST_SOLVE, "Первое", "Серия", "Первая задача", None),
+    }.get)
+    batches = []
+
+    async def get_context(user_id, session=None):
+        return SuccessResponse(status_code=200, data=BadgeContext(user_id, 10, 0, 0, 0, frozenset({2})))
+
+    async def give_many(user_id, badge_ids, session=None):
+        batches.append(badge_ids)
+        return SuccessResponse(status_code=200, data=badge_ids)
+
+    monkeypatch.setattr(dispatcher_module.BadgeMethods, "get_context", get_context)
+    monkeypatch.setattr(dispatcher_module.BadgeMethods, "give_many", give_many)
+    result = await BadgeDispatcher(1).scan()
+    assert result == {"Серия": BadgeScanStatus.SUCCESS, "Первое": BadgeScanStatus.HELD}
+    assert batches == [[1]]
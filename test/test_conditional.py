@@ -0,0 +1,20 @@
+from starlette.requests import Request
+from src.api.v1.methods.conditional import make_etag, etag_matches
+
+
+def request(query: bytes) -> Request:
+    return Request({"type": "http", "method": "GET", "path": "/api/v1/lesson/getLessons", "query_string": query,
+                    "headers": []})
+
+
+def test_etag_depends_on_versions_and_query_but_not_parameter_order():
+    etag = make_etag(request(b"course_id=1&limit=10"), [1, 0])
+    assert etag == make_etag(request(b"limit=10&course_id=1"), [1, 0])
+    assert etag != make_etag(request(b"course_id=1&limit=10"), [2, 0])
+    assert etag != make_etag(request(b"course_id=1&limit=20"), [1, 0])
+
+
+def test_if_none_match_uses_weak_comparison():
+    assert etag_matches('"a", W/"b"', '"b"')
+    assert not etag_matches("*", '"b"')
+    assert not etag_matches('"a"', '"b"') and not etag_matches(None, '"b"')
@@ -0,0 +1,214 @@
+import orjson
+import uuid
+from sqlalchemy import select, func, insert, or_, and_
+from src.database.model import session_maker, db_config, Course, Lesson, UserProgress, ProgressAnswers, AiTasks
+from src.database.purge import purger
+from src.api.v1.enums import MaterialTypes
+from test.conftest import practical_lesson
+
+
+def add_course(client, headers: dict, title: str, desc: str, categories: str):
+    response = client.post("/api/v1/course/addCourse", headers=headers,
+                           json={"course_title": title, "desc": desc, "course_categories": categories})
+    assert response.status_code == 200, response.text
+
+
+def search(client, headers: dict, name: str, **params):
+    response = client.get("/api/v1/course/getCourse", headers=headers, params={"name": name, **params})
+    assert response.status_code == 200, response.text
+    return response.json()["data"]
+
+
+def test_search_is_ordered_by_relevance_and_pages_continue(client, accounts):
+    headers = accounts.new()
+    # Уникальное слово, чтобы в выдачу попали только курсы теста
+    word = "поиск" + uuid.uuid4().hex[:8]
+    for title in ("первый", "второй", "третий"):
+        add_course(client, headers, f"Курс {word} {title}", "Описание курса без слова", "test")
+    add_course(client, headers, "Курс с описанием", f"Описание со словом {word}", "test")
+    add_course(client, headers, "Курс с категорией", "Описание курса без слова", f"test {word}")
+
+    first = search(client, headers, word)
+    assert first["total"] == {"count": 5, "exact": True}
+    everything = first["items"]
+    # Совпадение в названии весит больше описания, описание - больше категорий; равные по весу - от новых к старым
+    assert [course["course_title"].split()[-1] for course in everything] == \
+           ["третий", "второй", "первый", "описанием", "категорией"]
+    assert [course["id"] for course in everything[:3]] == sorted((course["id"] for course in everything[:3]),
+                                                                 reverse=True)
+
+    pages, cursor = [], None
+    while True:
+        data = search(client, headers, word, limit=2, **({"cursor": cursor} if cursor else {}))
+        pages.append([course["id"] for course in data["items"]])
+        cursor = data["next_cursor"]
+        if not cursor:
+            break
+    assert pages == [[course["id"] for course in everything[index:index + 2]] for index in (0, 2, 4)]
+
+
+def test_search_matches_word_prefixes(client, accounts):
+    headers = accounts.new()
+    word = "префикс" + uuid.uuid4().hex[:8]
+    add_course(client, headers, f"Курс {word}", "Описание курса без слова", "test")
+    assert [course["course_title"] for course in search(client, headers, word[:-3])["items"]] == [f"Курс {word}"]
+
+
+COURSE = {"course_title": "Импортируемый курс", "desc": "Курс, загруженный импортом", "course_categories": "test"}
+LECTURE = {"lesson_title": "Лекция", "desc": "Лекционный урок курса", "material": "М" * 40, "level": 1}
+PRACTICE = {**LECTURE, "lesson_title": "Практика", "question_lesson": "2+2", "answer_lesson": "4", "attempts": 3}
+
+
+def ndjson(*lines) -> bytes:
+    return b"\n".join(line if isinstance(line, bytes) else orjson.dumps(line) for line in lines)
+
+
+def import_course(client, headers: dict, content: bytes, content_type: str = "application/json"):
+    return client.post("/api/v1/course/import", headers={**headers, "Content-Type": content_type}, content=content)
+
+
+def errors(response) -> list:
+    assert response.status_code == 400, response.text
+    return [(error.get("line", error.get("index")), error["field"]) for error in
+            response.json()["detail"]["message"]["errors"]]
+
+
+def imported_lessons(client, headers: dict, response) -> list:
+    assert response.status_code == 200, response.text
+    data = response.json()["data"]
+    lessons = client.get("/api/v1/lesson/getLessons", headers=headers, params={"course_id": data["course_id"]})
+    return data["num_lessons"], [(lesson["lesson_title"], lesson["lesson_type"])
+                                 for lesson in lessons.json()["data"]["items"]]
+
+
+def test_json_import_creates_the_course_with_ordered_lessons(client, accounts):
+    headers = accounts.new()
+    response = import_course(client, headers, orjson.dumps({**COURSE, "lessons": [PRACTICE, LECTURE]}))
+    assert imported_lessons(client, headers, response) == (2, [("Практика", "Практическая"),
+                                                               ("Лекция", "Лекционная")])
+
+
+def test_ndjson_import_creates_the_course_with_ordered_lessons(client, accounts):
+    headers = accounts.new()
+    # Пустые строки пропускаются
+    response = import_course(client, headers, ndjson(COURSE, LECTURE, b"", PRACTICE, b""), "application/x-ndjson")
+    assert imported_lessons(client, headers, response) == (2, [("Лекция", "Лекционная"),
+                                                               ("Практика", "Практическая")])
+
+
+def test_validation_errors_report_their_positions(client, accounts):
+    headers = accounts.new()
+    broken = {**LECTURE, "level": 9}
+    no_attempts = {**PRACTICE, "attempts": None}
+    response = import_course(client, headers, ndjson(COURSE, LECTURE, broken, b"{", no_attempts),
+                             "application/x-ndjson")
+    assert errors(response) == [(3, "level"), (4, ""), (5, None)]
+    response = import_course(client, headers, orjson.dumps({**COURSE, "lessons": [LECTURE, broken, no_attempts]}))
+    assert errors(response) == [(None, "lessons.1.level")]
+    response = import_course(client, headers, orjson.dumps({**COURSE, "lessons": [LECTURE, no_attempts]}))
+    assert errors(response) == [(1, None)]
+
+
+def test_empty_body_and_missing_course_are_rejected(client, accounts):
+    headers = accounts.new()
+    assert errors(import_course(client, headers, b"", "application/x-ndjson")) == [(1, None)]
+    assert errors(import_course(client, headers, b"\n\n", "application/x-ndjson")) == [(1, None)]
+    # Первая строка - урок вместо курса
+    assert (1, "course_title") in errors(import_course(client, headers, ndjson(LECTURE, LECTURE),
+                                                       "application/x-ndjson"))
+    assert errors(import_course(client, headers, b"")) == [(None, "")]
+
+
+def test_failed_lesson_rolls_back_the_whole_import(client, accounts):
+    headers = accounts.new()
+    title = "Откат " + uuid.uuid4().hex[:8]
+    # Нулевой байт проходит проверку схемы, но не принимается Postgres при вставке уроков
+    response = import_course(client, headers, orjson.dumps({**COURSE, "course_title": title,
+                                                            "lessons": [LECTURE, {**LECTURE, "material": "\x00" * 40}]}))
+    assert response.status_code == 500
+
+    async def stored():
+        async with session_maker() as session:
+            return (await session.execute(select(Course.id).where(Course.course_title == title))).all()
+
+    assert client.portal.call(stored) == []
+
+
+def started_course(client, headers: dict):
+    # Курс с прогрессом по курсу и уроку, ответом в журнале и задачей ИИ по уроку
+    lesson_id = practical_lesson(client, headers)
+    assert client.post("/api/v1/lesson/answerLesson", headers=headers,
+                       json={"lesson_id": lesson_id, "answer": "5"}).status_code == 200
+
+    async def prepare():
+        async with session_maker() as session:
+            course_id = (await session.execute(select(Lesson.course_id).where(Lesson.id == lesson_id))).scalar_one()
+            await session.execute(insert(AiTasks).values(task={"text": "Задача"}, answer={"text": "Ответ"},
+                                                         lesson_id=lesson_id))
+            await session.commit()
+            return course_id
+
+    course_id = client.portal.call(prepare)
+    assert client.post("/api/v1/course/sign", headers=headers, json={"course_id": course_id}).status_code == 200
+    return course_id, lesson_id
+
+
+def remaining(client, course_id: int, lesson_id: int) -> dict:
+    async def count():
+        async with session_maker() as session:
+            progress = or_(and_(UserProgress.material_type == MaterialTypes.COURSE, UserProgress.material_id == course_id),
+                           and_(UserProgress.material_type == MaterialTypes.LECTURE,
+                                UserProgress.material_id == lesson_id))
+            queries = {
+                "courses": select(func.count()).where(Course.id == course_id),
+                "lessons": select(func.count()).where(Lesson.course_id == course_id),
+                "progress": select(func.count()).select_from(UserProgress).where(progress),
+                "answers": select(func.count()).select_from(ProgressAnswers).join(
+                    UserProgress, UserProgress.id == ProgressAnswers.progress_id).where(progress),
+                "ai_tasks": select(func.count()).where(AiTasks.lesson_id == lesson_id),
+            }
+            return {name: (await session.execute(query)).scalar_one() for name, query in queries.items()}
+
+    return client.portal.call(count)
+
+
+def delete_course(client, headers: dict, course_id: int):
+    response = client.request("DELETE", "/api/v1/course/deleteCourse", headers=headers, json={"course_id": course_id})
+    assert response.status_code == 200, response.text
+    return response.json()["data"]
+
+
+def test_small_course_is_deleted_with_everything_it_owns(client, accounts):
+    headers = accounts.new()
+    course_id, lesson_id = started_course(client, headers)
+    assert remaining(client, course_id, lesson_id) == {"courses": 1, "lessons": 1, "progress": 2, "answers": 1,
+                                                        "ai_tasks": 1}
+    assert delete_course(client, headers, course_id) == "Курс успешно удален!"
+    assert set(remaining(client, course_id, lesson_id).values()) == {0}
+
+
+def test_large_course_is_hidden_at_once_and_purged_in_the_background(client, accounts, monkeypatch):
+    headers = accounts.new()
+    course_id, lesson_id = started_course(client, headers)
+    # Любой курс считается большим; фоновая очистка запускается вручную
+    monkeypatch.setattr(db_config, "COURSE_PURGE_THRESHOLD", 0)
+    monkeypatch.setattr(purger, "notify", lambda: None)
+    assert delete_course(client, headers, course_id) == "Курс удален, его уроки и прогресс будут удалены в фоне"
+    assert remaining(client, course_id, lesson_id)["lessons"] == 1
+
+    requests = [
+        ("GET", "/api/v1/lesson/getLessons", {"params": {"course_id": course_id}}),
+        ("GET", f"/api/v1/lesson/{lesson_id}/material", {}),
+        ("POST", "/api/v1/lesson/sign", {"json": {"lesson_id": lesson_id}}),
+        ("POST", "/api/v1/lesson/answerLesson", {"json": {"lesson_id": lesson_id, "answer": "4"}}),
+        ("POST", "/api/v1/course/sign", {"json": {"course_id": course_id}}),
+    ]
+    for method, url, arguments in requests:
+        response = client.request(method, url, headers=headers, **arguments)
+        assert response.status_code == 404, (url, response.text)
+    # Ответ к уроку удаленного курса не попадает в журнал
+    assert remaining(client, course_id, lesson_id)["answers"] == 1
+
+    monkeypatch.setattr(purger, "batch_size", 1)
+    client.portal.call(purger.purge)
+    assert set(remaining(client, course_id, lesson_id).values()) == {0}
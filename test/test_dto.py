@@ -0,0 +1,22 @@
+import dataclasses
+import pytest
+from src.database.counters import CounterAggregator
+from src.database.dto import LessonDTO, columns
+from src.database.model import Lesson
+
+
+def test_lesson_dto_is_immutable_and_follows_model_columns():
+    lesson = LessonDTO(id=1, attempts=3)
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        lesson.attempts = 2
+    assert [column.key for column in columns(LessonDTO, Lesson)] == [field.name for field in dataclasses.fields(LessonDTO)]
+
+
+@pytest.mark.asyncio
+async def test_pending_counters_are_merged_into_rows():
+    counters = CounterAggregator(flush_interval=60, max_pending=100)
+    await counters.increment(Lesson, "lesson_num_success_peoples", 1, 2)
+    row = counters.merge(Lesson, {"id": 1, "lesson_num_success_peoples": 5}, "lesson_num_success_peoples")
+    assert LessonDTO(**row).lesson_num_success_peoples == 7
+    # Поле не было прочитано - приращение не подмешивается
+    assert counters.merge(Lesson, {"id": 1}, "lesson_num_success_peoples") == {"id": 1}
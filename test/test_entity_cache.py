@@ -0,0 +1,28 @@
+import pytest
+from types import SimpleNamespace
+from src.database.entity_cache import EntityCache, LocalVersionStore, course_key, lesson_key
+from src.utils.cache import MISSING
+
+
+@pytest.mark.asyncio
+async def test_entry_is_dropped_once_any_dependency_changes():
+    cache = EntityCache(LocalVersionStore(), maxsize=10, ttl=60)
+    versions = await cache.versions(lesson_key(1), course_key(1))
+    cache.set(("lesson", 1), {"id": 1}, versions)
+    assert await cache.get(("lesson", 1)) == {"id": 1}
+    await cache.invalidate(None, course_key(1))
+    assert await cache.get(("lesson", 1)) is MISSING
+
+
+@pytest.mark.asyncio
+async def test_unit_of_work_invalidates_after_commit():
+    cache = EntityCache(LocalVersionStore(), maxsize=10, ttl=60)
+    cache.set(("author", 1), "author", await cache.versions(course_key(1)))
+    session = SimpleNamespace(info={"unit_of_work": True})
+    await cache.invalidate(session, course_key(1))
+    # Другие запросы видят запись до фиксации, сам запрос - уже нет
+    assert await cache.get(("author", 1)) == "author"
+    assert await cache.get(("author", 1), session) is MISSING
+    cache.set(("author", 1), "author", await cache.versions(course_key(1)))
+    await cache.accept(session)
+    assert await cache.get(("author", 1)) is MISSING
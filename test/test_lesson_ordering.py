@@ -0,0 +1,41 @@
+import pytest
+from sqlalchemy import select, insert, delete
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import NullPool
+from src.database.model import engine, Course, Lesson
+from src.database.migrations import migrate
+from src.database import ordering
+
+
+def test_spread_stays_between_bounds():
+    assert ordering.spread(1024, 2048, 3) == [1280, 1536, 1792]
+    assert ordering.spread(1024, 1026, 1) == [1025]
+    # Промежуток исчерпан - нужна перебалансировка
+    assert ordering.spread(1024, 1025, 1) is None
+
+
+@pytest.mark.asyncio
+async def test_move_rebalances_when_gap_is_exhausted():
+    test_engine = create_async_engine(engine.url, poolclass=NullPool)
+    try:
+        await migrate(test_engine)
+        async with async_sessionmaker(test_engine)() as session:
+            course_id = (await session.execute(insert(Course).values(
+                course_title="Порядок уроков", author="test", course_categories="test",
+                num_lessons=3).returning(Course.id))).scalar_one()
+            # Соседние позиции без промежутка
+            lesson_ids = (await session.execute(insert(Lesson).returning(Lesson.id), [
+                {"course_id": course_id, "lesson_title": str(pos), "lesson_type": "test", "material": "test",
+                 "level": 1, "pos": pos}
+                for pos in (1, 2, 3)])).scalars().all()
+            await ordering.move(session, course_id, [lesson_ids[2]], after_id=lesson_ids[0])
+            order = (await session.execute(select(Lesson.id).where(Lesson.course_id == course_id).order_by(
+                Lesson.pos))).scalars().all()
+            assert order == [lesson_ids[0], lesson_ids[2], lesson_ids[1]]
+            positions = (await session.execute(select(Lesson.pos).where(Lesson.course_id == course_id).order_by(
+                Lesson.pos))).scalars().all()
+            assert positions[0] == ordering.POS_GAP
+            await session.execute(delete(Course).where(Course.id == course_id))
+            await session.commit()
+    finally:
+        await test_engine.dispose()
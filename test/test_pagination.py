@@ -0,0 +1,22 @@
+import pytest
+from sqlalchemy import func, REAL
+from src.database.model import Course, Lesson, ProgressAnswers
+from src.database.pagination import encode_cursor, decode_cursor, InvalidCursor
+
+
+def test_cursor_round_trip_keeps_values():
+    rank = func.ts_rank(Course.search_vector, func.to_tsquery("simple", "a"), type_=REAL)
+    assert decode_cursor(encode_cursor([0.5, 7]), [rank, Course.id]) == [0.5, 7]
+    assert decode_cursor(encode_cursor([1, 7]), [rank, Course.id]) == [1, 7]
+    assert decode_cursor(encode_cursor([2 ** 40]), [ProgressAnswers.id]) == [2 ** 40]
+
+
+@pytest.mark.parametrize("values", [["a", "b"], [1.5, 2], [True, 1], [None, 1], [2 ** 31, 1], [1]])
+def test_cursor_values_must_match_key_columns(values):
+    with pytest.raises(InvalidCursor):
+        decode_cursor(encode_cursor(values), [Lesson.pos, Lesson.id])
+
+
+def test_malformed_cursor_is_rejected():
+    with pytest.raises(InvalidCursor):
+        decode_cursor("не base64", [Lesson.id])
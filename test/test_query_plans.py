@@ -0,0 +1,66 @@
+import inspect
+import pytest
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.pool import NullPool
+from src.database import statements
+from src.database.model import engine
+from src.database.methods import LessonMethods, ProgressMethods, AiTaskMethods, BadgeMethods
+from src.database.migrations import migrate
+
+SAMPLE_VALUES = {int: 1, str: "x"}
+
+# Списки строятся в методах вместе с постраничной выборкой, поэтому проверяются вызовом самих методов
+HOT_METHODS = {
+    "lessons_in_course": lambda session: LessonMethods.get_lessons_in_course(1, session=session),
+    "answers": lambda session: ProgressMethods.get_answers(1, 1, session=session),
+    "ai_tasks": lambda session: AiTaskMethods.get_user_tasks(1, session=session),
+    "user_badges": lambda session: BadgeMethods.get_user_badges(1, session=session),
+}
+
+
+def sample_call(builder):
+    # Горячий запрос из реестра с подставленными значениями по аннотациям параметров
+    arguments = [SAMPLE_VALUES[parameter.annotation] for parameter in inspect.signature(builder).parameters.values()
+                 if parameter.default is inspect.Parameter.empty]
+    return lambda session: session.execute(builder(*arguments))
+
+
+CALLS = {**{name: sample_call(builder) for name, builder in statements.HOT_STATEMENTS.items()}, **HOT_METHODS}
+
+
+def plan_nodes(plan: dict):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from plan_nodes(child)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("name", CALLS)
+async def test_hot_query_uses_index(name):
+    # Отдельный движок без пула: у каждого теста свой цикл событий. На маленьких таблицах планировщик выбирает
+    # полный просмотр, поэтому он запрещается: если подходящего индекса нет, в плане все равно останется Seq Scan
+    test_engine = create_async_engine(engine.url, poolclass=NullPool,
+                                      connect_args={"server_settings": {"enable_seqscan": "off"}})
+    executed = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        executed.append((statement, parameters))
+
+    try:
+        await migrate(test_engine)
+        event.listen(test_engine.sync_engine, "before_cursor_execute", capture)
+        # Выполняется тот же код, что и в приложении, планы строятся по отправленному в БД SQL
+        async with AsyncSession(test_engine) as session:
+            await CALLS[name](session)
+        event.remove(test_engine.sync_engine, "before_cursor_execute", capture)
+        assert executed
+        async with test_engine.connect() as conn:
+            for statement, parameters in executed:
+                state = await conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}", parameters)
+                plan = state.scalar()[0]["Plan"]
+                node_types = {node["Node Type"] for node in plan_nodes(plan)}
+                assert "Seq Scan" not in node_types, (statement, node_types)
+                assert node_types & {"Index Scan", "Index Only Scan", "Bitmap Index Scan"}, (statement, node_types)
+    finally:
+        await test_engine.dispose()
@@ -0,0 +1,49 @@
+import os
+import pytest
+import pytest_asyncio
+from sqlalchemy import select, func, text
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import NullPool
+from src.database.model import engine
+from src.database.routing import ReplicaRouter, routing_session_class
+
+# Второй сервер PostgreSQL (host:port) с той же БД, например: TEST_REPLICA_HOST=localhost:5433
+REPLICA_HOST = os.getenv("TEST_REPLICA_HOST")
+
+pytestmark = pytest.mark.skipif(not REPLICA_HOST, reason="TEST_REPLICA_HOST не задан")
+
+SERVER_PORT = select(func.inet_server_port()).execution_options(replica=True)
+
+
+@pytest_asyncio.fixture
+async def routing():
+    replica_host, replica_port = REPLICA_HOST.rsplit(":", 1)
+    primary = create_async_engine(engine.url, poolclass=NullPool)
+    replica = create_async_engine(engine.url.set(host=replica_host, port=int(replica_port)), poolclass=NullPool)
+    router = ReplicaRouter([replica])
+    yield router, async_sessionmaker(bind=primary, sync_session_class=routing_session_class(router))
+    await primary.dispose()
+    await replica.dispose()
+
+
+@pytest.mark.asyncio
+async def test_reads_go_to_replica_until_first_write(routing):
+    router, maker = routing
+    async with maker() as session:
+        assert (await session.execute(SERVER_PORT)).scalar() == router.replicas[0].url.port
+        # Без опции replica запрос выполняется на основном сервере
+        assert (await session.execute(select(func.inet_server_port()))).scalar() == engine.url.port
+        await session.execute(text("SET LOCAL application_name = 'routing_test'"))
+        # После записи чтения остаются на основном сервере
+        assert (await session.execute(SERVER_PORT)).scalar() == engine.url.port
+
+
+@pytest.mark.asyncio
+async def test_reads_fall_back_to_primary(routing):
+    router, maker = routing
+    router.mark_down(router.replicas[0])
+    async with maker() as session:
+        assert (await session.execute(SERVER_PORT)).scalar() == engine.url.port
+    assert router.fallbacks == 1
+    await router.check()
+    assert router.stats()["healthy"] == 1
@@ -0,0 +1,20 @@
+from src.api.v1.schemas.response_schema import Success
+from src.api.v1.schemas.page_schema import Page
+from src.api.v1.schemas import lesson_schema as lesson_m, tasks_schema as task_m
+from src.database.dto import LessonDTO
+from src.database.pagination import page
+from src.api.v1 import responses
+
+
+def test_sparse_fields_are_kept_with_exclude_unset():
+    content = responses.success_response(data=page([{"id": 1, "lesson_title": "Урок"}], None))
+    model = Success[Page[lesson_m.LessonView]].model_validate(content)
+    assert model.model_dump(mode="json", exclude_unset=True) == content
+
+
+def test_dto_and_task_keys_pass_through():
+    model = Success[lesson_m.LessonView].model_validate(responses.success_response(data=LessonDTO(id=1, pos=2)))
+    assert model.data.id == 1 and model.data.pos == 2
+    content = responses.success_response(data=page([{"id": 1, "task.text": "Задача"}], "cursor"))
+    dumped = Success[Page[task_m.TaskItem]].model_validate(content).model_dump(mode="json", exclude_unset=True)
+    assert dumped["data"]["items"] == [{"id": 1, "task.text": "Задача"}]
@@ -0,0 +1,85 @@
+import threading
+import time
+from jose import jwt
+from passlib.context import CryptContext
+from src.api.v1.methods import security
+from src.api.v1.methods.hasher import PasswordHasher
+from src.api.v1.methods.revocation import RevocationFilter, LocalRevocationBus
+
+
+def test_login_gets_503_with_retry_after_when_the_hasher_is_saturated(client, accounts, monkeypatch):
+    username = accounts.register()
+    hasher = PasswordHasher(CryptContext(schemes=["bcrypt"]), workers=1, queue_size=1)
+    monkeypatch.setattr(security, "hasher", hasher)
+    release = threading.Event()
+    # Один поток занят, одно место в очереди тоже
+    busy = [client.portal.start_task_soon(hasher._submit, release.wait) for _ in range(2)]
+    try:
+        while hasher.pending < 2:
+            time.sleep(0.01)
+        response = client.post("/api/v1/auth/login", data={"username": username, "password": "password"})
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "1"
+        assert hasher.rejected == 1
+    finally:
+        release.set()
+        for future in busy:
+            future.result()
+    # Освободившийся пул снова принимает операции
+    assert client.post("/api/v1/auth/login", data={"username": username, "password": "password"}).status_code == 200
+    hasher.shutdown()
+
+
+def refresh(client, refresh_token: str):
+    return client.post("/api/v1/auth/refresh", json={"refresh_token": refresh_token})
+
+
+def me(client, tokens: dict):
+    return client.get("/api/v1/auth/me", headers={"Authorization": f"Bearer {tokens['access_token']}"})
+
+
+def test_refresh_rotates_the_token(client, accounts):
+    tokens = accounts.tokens(accounts.register())
+    rotated = refresh(client, tokens["refresh_token"])
+    assert rotated.status_code == 200
+    rotated = rotated.json()["data"]
+    assert rotated["refresh_token"] != tokens["refresh_token"]
+    # Новая пара из того же семейства, новый refresh-токен тоже одноразовый
+    assert jwt.get_unverified_claims(rotated["refresh_token"])["fam"] == \
+           jwt.get_unverified_claims(tokens["refresh_token"])["fam"]
+    assert me(client, rotated).status_code == 200
+    assert refresh(client, rotated["refresh_token"]).status_code == 200
+
+
+def test_reused_refresh_token_revokes_the_family(client, accounts):
+    tokens = accounts.tokens(accounts.register())
+    rotated = refresh(client, tokens["refresh_token"]).json()["data"]
+    assert refresh(client, tokens["refresh_token"]).status_code == 401
+    # Отозвано все семейство: и последний refresh-токен, и выданные в нем токены доступа
+    assert refresh(client, rotated["refresh_token"]).status_code == 401
+    assert me(client, tokens).status_code == 401
+    assert me(client, rotated).status_code == 401
+
+
+def test_logout_revokes_refresh_and_access_tokens(client, accounts):
+    tokens = accounts.tokens(accounts.register())
+    assert me(client, tokens).status_code == 200
+    assert client.post("/api/v1/auth/logout", json={"refresh_token": tokens["refresh_token"]}).status_code == 200
+    assert me(client, tokens).status_code == 401
+    assert refresh(client, tokens["refresh_token"]).status_code == 401
+    # Другой вход того же пользователя не затронут
+    assert me(client, accounts.tokens(jwt.get_unverified_claims(tokens["access_token"])["sub"])).status_code == 200
+
+
+def test_revoked_family_is_found_by_a_rebuilt_filter(client, accounts):
+    tokens = accounts.tokens(accounts.register())
+    family_id = jwt.get_unverified_claims(tokens["access_token"])["fam"]
+    # Фильтр другого воркера: об отзыве он узнает только при пересборке из БД
+    other = RevocationFilter(LocalRevocationBus(), capacity=1000, error_rate=0.001)
+    client.portal.call(other.rebuild)
+    assert not client.portal.call(other.is_revoked, family_id)
+    assert client.post("/api/v1/auth/logout", json={"refresh_token": tokens["refresh_token"]}).status_code == 200
+    assert not client.portal.call(other.is_revoked, family_id)
+    client.portal.call(other.rebuild)
+    assert client.portal.call(other.is_revoked, family_id)
+    assert other.stats()["suspected"] == 1
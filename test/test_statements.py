@@ -0,0 +1,21 @@
+from sqlalchemy.dialects import postgresql
+from src.database import statements
+from src.database.routing import writes
+
+
+def sql(stmt) -> str:
+    return str(stmt._resolved.compile(dialect=postgresql.dialect()))
+
+
+def test_statement_is_reused_with_new_parameters():
+    first, second = statements.user_id_by_name("first"), statements.user_id_by_name("second")
+    assert first._generate_cache_key().key == second._generate_cache_key().key
+    assert sql(first) == sql(second)
+    assert [param.value for param in second._generate_cache_key().bindparams] == ["second"]
+
+
+def test_lesson_fields_are_part_of_cache_key():
+    short, full = statements.lesson_by_id(1, ("id",)), statements.lesson_by_id(1, ("id", "attempts"))
+    assert short._generate_cache_key().key != full._generate_cache_key().key
+    assert "attempts" not in sql(short) and "attempts" in sql(full)
+    assert not writes(full)
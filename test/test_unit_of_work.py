@@ -0,0 +1,47 @@
+from fastapi import APIRouter, Depends, FastAPI
+from sqlalchemy import select, insert, delete
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.api.v1.methods.unit_of_work import UnitOfWorkRoute
+from src.database.model import session_maker, Course
+from src.database.session import get_session, rollback
+from test.conftest import live_client
+
+router = APIRouter(route_class=UnitOfWorkRoute)
+seen = {}
+
+
+@router.post("/write")
+async def write(title: str, fail: bool = False, session: AsyncSession = Depends(get_session)):
+    await session.execute(insert(Course).values(course_title=title, author="test", course_categories="test",
+                                               num_lessons=0))
+    if fail:
+        # Метод, упавший после записи, помечает единицу работы
+        await rollback(session)
+    return {"success": True}
+
+
+@router.get("/read")
+async def read(title: str):
+    # Отдельная сессия: видит только зафиксированные данные
+    async with session_maker() as session:
+        return {"found": (await session.execute(select(Course.id).where(Course.course_title == title))).first()
+                is not None}
+
+
+def test_write_is_committed_before_response_and_failure_is_not_reported_as_success():
+    app = FastAPI()
+    app.include_router(router)
+    with live_client(app) as client:
+        try:
+            assert client.post("/write", params={"title": "uow-ok"}).json() == {"success": True}
+            assert client.get("/read", params={"title": "uow-ok"}).json() == {"found": True}
+            response = client.post("/write", params={"title": "uow-failed", "fail": True})
+            assert response.status_code == 500 and response.json()["detail"]["success"] is False
+            assert client.get("/read", params={"title": "uow-failed"}).json() == {"found": False}
+        finally:
+            async def cleanup():
+                async with session_maker() as session:
+                    await session.execute(delete(Course).where(Course.course_title.in_(["uow-ok", "uow-failed"])))
+                    await session.commit()
+
+            client.portal.call(cleanup)